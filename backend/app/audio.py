@@ -0,0 +1,189 @@
+# audio decoding for the pipeline
+# the media is decoded once into 16kHz mono 16-bit pcm wav (or not at all if it already is one),
+# every later stage (whisperx, whisper, diarization, the mock) reads the samples from that file
+# through a memory map instead of running ffmpeg/librosa again
+
+import asyncio
+import os
+import struct
+from typing import Callable, Dict, Optional, Tuple
+
+import ffmpeg
+import numpy as np
+
+
+SAMPLE_RATE = 16000
+# a transcode that runs longer than this is killed and the job fails
+FFMPEG_TIMEOUT_SECONDS = float(os.getenv("CONTEXTCLIP_FFMPEG_TIMEOUT", "3600"))
+
+
+def probe_audio(input_path: str) -> Optional[Dict]:
+    # ffprobe info of the first audio stream (+ container format), None if there is none / ffprobe fails
+    try:
+        info = ffmpeg.probe(input_path)
+    except Exception as e:
+        print(f"ffprobe failed for {input_path}: {e}")
+        return None
+
+    audio_streams = [s for s in info.get("streams", []) if s.get("codec_type") == "audio"]
+    if not audio_streams:
+        return None
+
+    stream = dict(audio_streams[0])
+    stream["format_name"] = info.get("format", {}).get("format_name", "")
+    duration = stream.get("duration") or info.get("format", {}).get("duration")
+    stream["duration"] = float(duration) if duration else None
+    return stream
+
+
+def is_transcriber_ready(stream: Optional[Dict]) -> bool:
+    # already what the transcriber wants: a wav with one 16kHz channel of s16le pcm
+    if not stream:
+        return False
+    return (
+        "wav" in stream.get("format_name", "")
+        and stream.get("codec_name") == "pcm_s16le"
+        and int(stream.get("sample_rate", 0)) == SAMPLE_RATE
+        and int(stream.get("channels", 0)) == 1
+    )
+
+
+def _wav_data_chunk(path: str) -> Tuple[int, int, Dict]:
+    # walks the RIFF chunks, returns (data offset, data size in bytes, fmt fields)
+    file_size = os.path.getsize(path)
+    fmt = {}
+    with open(path, "rb") as f:
+        riff, _, wave_id = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave_id != b"WAVE":
+            raise ValueError(f"{path} is not a wav file")
+
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"No data chunk in {path}")
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                audio_format, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", f.read(16))
+                fmt = {"audio_format": audio_format, "channels": channels, "sample_rate": sample_rate, "bits": bits}
+                f.seek(chunk_size - 16 + (chunk_size % 2), os.SEEK_CUR)
+            elif chunk_id == b"data":
+                offset = f.tell()
+                # streamed wavs can have a placeholder size, the data then runs to the end of the file
+                if chunk_size == 0 or chunk_size == 0xFFFFFFFF or offset + chunk_size > file_size:
+                    chunk_size = file_size - offset
+                return offset, chunk_size, fmt
+            else:
+                f.seek(chunk_size + (chunk_size % 2), os.SEEK_CUR)
+
+
+def load_pcm_int16(path: str) -> np.ndarray:
+    # the samples of a 16kHz mono s16le wav, memory mapped (nothing is read until it is used)
+    offset, size, fmt = _wav_data_chunk(path)
+    if fmt and (fmt["channels"] != 1 or fmt["sample_rate"] != SAMPLE_RATE or fmt["bits"] != 16):
+        raise ValueError(f"{path} is not 16kHz mono 16-bit pcm: {fmt}")
+    return np.memmap(path, dtype="<i2", mode="r", offset=offset, shape=(size // 2,))
+
+
+def is_pcm_wav(path: str) -> bool:
+    # can load_pcm_int16 map this file
+    try:
+        _, _, fmt = _wav_data_chunk(path)
+    except (OSError, ValueError, struct.error):
+        return False
+    return fmt.get("channels") == 1 and fmt.get("sample_rate") == SAMPLE_RATE and fmt.get("bits") == 16
+
+
+def load_pcm(path: str) -> np.ndarray:
+    # float32 in [-1, 1], the same thing whisperx.load_audio / whisper would decode the file to
+    return load_pcm_int16(path).astype(np.float32) / 32768.0
+
+
+def wav_duration(path: str) -> float:
+    # from the header only, so just for uncompressed wavs (pcm / float)
+    _, size, fmt = _wav_data_chunk(path)
+    if fmt.get("audio_format", 1) not in (1, 3, 0xFFFE):
+        raise ValueError(f"{path} is a compressed wav (format {fmt['audio_format']:#x})")
+    channels = fmt.get("channels", 1) or 1
+    bits = fmt.get("bits", 16) or 16
+    sample_rate = fmt.get("sample_rate", SAMPLE_RATE) or SAMPLE_RATE
+    return size / (channels * (bits // 8) * sample_rate)
+
+
+def audio_duration(path: str) -> float:
+    # seconds of audio in any file: the wav header when there is a usable one, ffprobe otherwise
+    try:
+        return wav_duration(path)
+    except (OSError, ValueError, struct.error):
+        pass
+    stream = probe_audio(path)
+    if not stream or not stream.get("duration"):
+        raise ValueError(f"Could not get the duration of {path}")
+    return stream["duration"]
+
+
+async def _stop_process(process: asyncio.subprocess.Process) -> None:
+    # SIGTERM first so ffmpeg can exit on its own, SIGKILL if it doesnt
+    if process.returncode is not None:
+        return
+    try:
+        process.terminate()
+        await asyncio.wait_for(process.wait(), timeout=5)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+    except ProcessLookupError:
+        pass
+
+
+async def decode_to_wav(
+    input_path: str,
+    output_path: str,
+    duration: Optional[float] = None,
+    on_progress: Optional[Callable[[float], None]] = None,
+    timeout: Optional[float] = FFMPEG_TIMEOUT_SECONDS
+) -> None:
+    # transcode anything ffmpeg reads into 16kHz mono s16le wav, without blocking the event loop
+    # ffmpeg reports its position with -progress on stdout, which is turned into a 0-1 fraction of duration
+    # on timeout or when the awaiting task is cancelled the ffmpeg process is stopped and the partial file removed
+    cmd = [
+        "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+        "-i", input_path,
+        "-vn",
+        "-acodec", "pcm_s16le",  # 16-bit PCM
+        "-ac", "1",              # Mono
+        "-ar", str(SAMPLE_RATE), # 16kHz sample rate
+        "-progress", "pipe:1", "-nostats",
+        output_path
+    ]
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+
+    async def read_progress():
+        async for raw_line in process.stdout:
+            key, _, value = raw_line.decode(errors="ignore").strip().partition("=")
+            if not on_progress:
+                continue
+            # out_time_ms is in microseconds as well (old ffmpeg naming bug)
+            if key in ("out_time_us", "out_time_ms") and value.isdigit() and duration:
+                on_progress(min(1.0, int(value) / 1_000_000 / duration))
+            elif key == "progress" and value == "end":
+                on_progress(1.0)
+        await process.wait()
+
+    stderr_task = asyncio.ensure_future(process.stderr.read())
+    try:
+        await asyncio.wait_for(read_progress(), timeout=timeout)
+    except BaseException:
+        # timeout, cancellation or anything else: dont leave ffmpeg running or half a wav behind
+        await _stop_process(process)
+        stderr_task.cancel()
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+
+    stderr = (await stderr_task).decode(errors="ignore").strip()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with code {process.returncode}: {stderr}")
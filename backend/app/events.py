@@ -0,0 +1,176 @@
+# job progress events, pushed to the client instead of it polling GET /job/{job_id}
+# process_job publishes stage changes, progress, artifacts that became ready and the final status as small dicts.
+# in a worker process they go through a multiprocessing queue (owned by the WorkerPool) to the api process, where
+# a relay thread hands them to the open /job/{job_id}/events streams of that job.
+# events are best effort, the job row stays the source of truth: a stream starts with the row as it is and reads
+# it again when nothing arrived for a while (workers started on their own with `python -m app.jobqueue` have no
+# queue to the api, their jobs are followed that way)
+
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+
+
+# seconds without an event after which a stream reads the job row itself
+EVENTS_FALLBACK_INTERVAL = float(os.getenv("CONTEXTCLIP_EVENTS_FALLBACK_INTERVAL", "10"))
+SUBSCRIBER_QUEUE_SIZE = 256
+TERMINAL_STATUSES = ("done", "error", "cancelled")
+
+# worker side: where publish() puts events
+_publish_queue = None
+
+# api side: the event loop of the streams and the queues of the subscribers per job
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_subscribers: Dict[str, Set[asyncio.Queue]] = {}
+_relay_thread: Optional[threading.Thread] = None
+_relay_source = None
+
+
+def set_publish_queue(publish_queue) -> None:
+    # called in the worker processes, from then on events go to the api process
+    global _publish_queue
+    _publish_queue = publish_queue
+
+
+def publish(job_id: str, event_type: str, **data) -> None:
+    # never raises, a lost event must not fail a job
+    event = {"type": event_type, "job_id": job_id, "time": time.time(), **data}
+    if _publish_queue is not None:
+        try:
+            _publish_queue.put_nowait(event)
+        except Exception as e:
+            print(f"Could not publish {event_type} event of job {job_id}: {e}")
+        return
+    dispatch(event)
+
+
+def dispatch(event: Dict) -> None:
+    # hands an event to the subscribers of its job, safe to call from any thread of the api process
+    loop = _loop
+    if loop is None or loop.is_closed() or not _subscribers.get(event["job_id"]):
+        return
+    try:
+        loop.call_soon_threadsafe(_deliver, event)
+    except RuntimeError:
+        # loop closed in the meantime (shutdown)
+        pass
+
+
+def _deliver(event: Dict) -> None:
+    for subscriber in list(_subscribers.get(event["job_id"], ())):
+        if subscriber.full():
+            # a client that doesnt keep up loses its oldest events, not the newest (those carry the final status)
+            subscriber.get_nowait()
+        subscriber.put_nowait(event)
+
+
+def subscribe(job_id: str) -> asyncio.Queue:
+    # call from the event loop, pair with unsubscribe
+    global _loop
+    _loop = asyncio.get_running_loop()
+    subscriber: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    _subscribers.setdefault(job_id, set()).add(subscriber)
+    return subscriber
+
+
+def unsubscribe(job_id: str, subscriber: asyncio.Queue) -> None:
+    subscribers = _subscribers.get(job_id)
+    if subscribers is not None:
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del _subscribers[job_id]
+
+
+def _relay(source) -> None:
+    while True:
+        try:
+            event = source.get()
+        except (EOFError, OSError):
+            return
+        if event is None:
+            return
+        dispatch(event)
+
+
+def start_relay(loop: asyncio.AbstractEventLoop, source) -> None:
+    # api process: forwards what the workers put in source to the streams on loop
+    global _loop, _relay_thread, _relay_source
+    _loop = loop
+    _relay_source = source
+    _relay_thread = threading.Thread(target=_relay, args=(source,), name="contextclip-events", daemon=True)
+    _relay_thread.start()
+
+
+def stop_relay() -> None:
+    global _relay_thread, _relay_source
+    if _relay_thread is None:
+        return
+    try:
+        _relay_source.put(None)
+    except Exception:
+        pass
+    _relay_thread.join(timeout=2.0)
+    _relay_thread = None
+    _relay_source = None
+
+
+def format_event(event_type: str, data: Dict) -> str:
+    # one server-sent event
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+async def job_event_stream(job_id: str, load_state: Callable[[], Awaitable[Optional[Dict]]]) -> AsyncIterator[str]:
+    # the sse body of /job/{job_id}/events: a "status" event with the current state, then the events of the job
+    # until it is done, failed or cancelled. load_state reads {"status", "stage", "progress", "artifacts"} from
+    # the job row
+    subscriber = subscribe(job_id)
+    try:
+        # subscribed before reading the row, so nothing published in between is missed
+        state = await load_state()
+        if state is None:
+            return
+        yield format_event("status", {"job_id": job_id, **state})
+        if state["status"] in TERMINAL_STATUSES:
+            return
+
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.get(), timeout=EVENTS_FALLBACK_INTERVAL)
+            except asyncio.TimeoutError:
+                event = None
+
+            if event is not None:
+                # the same dict went to every subscriber of the job
+                event = dict(event)
+                event_type = event.pop("type")
+                if event_type in ("stage", "progress"):
+                    state.update({key: event[key] for key in ("stage", "progress") if key in event})
+                elif event_type == "status":
+                    state.update({key: event[key] for key in ("status", "stage", "progress") if key in event})
+                elif event_type == "artifact":
+                    state["artifacts"] = {**(state.get("artifacts") or {}), event["name"]: event["url"]}
+                yield format_event(event_type, event)
+                if event_type == "status" and event.get("status") in TERMINAL_STATUSES:
+                    return
+                continue
+
+            # nothing for a while: look at the row in case the events went elsewhere, otherwise keep the
+            # connection alive (proxies close idle ones)
+            current = await load_state()
+            if current is None:
+                return
+            for name, url in (current.get("artifacts") or {}).items():
+                if name not in (state.get("artifacts") or {}):
+                    yield format_event("artifact", {"job_id": job_id, "name": name, "url": url})
+            if current != state:
+                state = current
+                yield format_event("status", {"job_id": job_id, **state})
+                if state["status"] in TERMINAL_STATUSES:
+                    return
+            else:
+                yield ": keepalive\n\n"
+    finally:
+        unsubscribe(job_id, subscriber)
@@ -0,0 +1,156 @@
+# serving job files straight from disk
+# /files/{job_id}/{path} answers with a FileResponse: streamed in chunks (or handed to the server with the
+# pathsend extension), Range requests for seeking in media, ETag + Last-Modified for conditional requests.
+# json / csv / txt artifacts get gzip and brotli copies next to them (transcript.json.gz, .br), written by the
+# workers when a stage finishes or on the first request that could use them, and served as they are to clients
+# that accept the encoding - no compression per request
+
+import gzip
+import mimetypes
+import os
+import tempfile
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+
+COMPRESSIBLE_EXTENSIONS = (".json", ".csv", ".txt")
+# below this compression costs more than it saves
+COMPRESS_MIN_BYTES = 1024
+# (content-encoding, suffix of the file), preferred first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+MEDIA_TYPES = {
+    ".json": "application/json",
+    ".csv": "text/csv",
+    ".txt": "text/plain",
+    ".arrow": "application/vnd.apache.arrow.file",
+}
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def resolve_job_path(storage_root: str, job_id: str, relative_path: str) -> Optional[str]:
+    # the file inside the job directory, None if the path points anywhere else (.., absolute paths, symlinks out)
+    job_dir = os.path.realpath(os.path.join(storage_root, job_id))
+    path = os.path.realpath(os.path.join(job_dir, relative_path))
+    if os.path.commonpath([job_dir, path]) != job_dir or path == job_dir:
+        return None
+    return path
+
+
+def media_type(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    return MEDIA_TYPES.get(extension) or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def is_compressible(path: str) -> bool:
+    return path.lower().endswith(COMPRESSIBLE_EXTENSIONS)
+
+
+def _is_fresh(variant_path: str, source_stat: os.stat_result) -> bool:
+    # a copy made from an older version of the file doesnt count
+    try:
+        return os.stat(variant_path).st_mtime_ns >= source_stat.st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def precompress(path: str) -> List[str]:
+    # writes the missing or outdated .br / .gz copies of path, returns the encodings that have one now
+    if not is_compressible(path) or not os.path.exists(path):
+        return []
+    source_stat = os.stat(path)
+    if source_stat.st_size < COMPRESS_MIN_BYTES:
+        return []
+
+    data = None
+    encodings = []
+    for encoding, suffix in ENCODINGS:
+        variant_path = path + suffix
+        if not _is_fresh(variant_path, source_stat):
+            if encoding == "br":
+                brotli = _brotli()
+                if brotli is None:
+                    continue
+            if data is None:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            if encoding == "br":
+                compressed = brotli.compress(data, quality=9)
+            else:
+                compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            _write_atomic(variant_path, compressed)
+        encodings.append(encoding)
+    return encodings
+
+
+def precompress_job_files(storage_path: str) -> None:
+    # compressed copies of the artifacts at the top of a job directory
+    for filename in os.listdir(storage_path) if os.path.isdir(storage_path) else []:
+        path = os.path.join(storage_path, filename)
+        if os.path.isfile(path) and is_compressible(filename):
+            precompress(path)
+
+
+def _accepted_encodings(accept_encoding: Optional[str]) -> Dict[str, float]:
+    # "gzip, br;q=0.8, *;q=0" -> {"gzip": 1.0, "br": 0.8, "*": 0.0}
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def pick_variant(path: str, accept_encoding: Optional[str]) -> Tuple[str, Optional[str]]:
+    # (file to send, content-encoding) - a fresh compressed copy the client accepts, otherwise the file itself
+    if not is_compressible(path):
+        return path, None
+    accepted = _accepted_encodings(accept_encoding)
+    source_stat = os.stat(path)
+    for encoding, suffix in ENCODINGS:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0 and _is_fresh(path + suffix, source_stat):
+            return path + suffix, encoding
+    return path, None
+
+
+def is_not_modified(request_headers, etag: str, last_modified: str) -> bool:
+    # conditional GET: If-None-Match wins over If-Modified-Since (RFC 9110 13.2.2)
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
@@ -0,0 +1,353 @@
+# job queue on top of the jobs table
+# the api only marks a job as "queued", a pool of worker processes claims queued jobs and runs process_job
+# claiming gives the worker a lease that it keeps extending while it works, if the worker dies the lease
+# runs out and another worker picks the job up again
+
+import asyncio
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import and_, func, or_, update
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal, Job
+from . import events
+
+
+WORKER_COUNT = int(os.getenv("CONTEXTCLIP_WORKERS", "2"))
+# whether the api process starts the workers itself. fine for a single api process, with several
+# (uvicorn --workers N, gunicorn) every one of them would start WORKER_COUNT workers: set it to 0 there and run
+# the workers once with `python -m app.jobqueue`, the api then only queues jobs
+START_WORKERS = os.getenv("CONTEXTCLIP_START_WORKERS", "1") != "0"
+LEASE_SECONDS = int(os.getenv("CONTEXTCLIP_LEASE_SECONDS", "60"))
+POLL_INTERVAL = float(os.getenv("CONTEXTCLIP_POLL_INTERVAL", "2"))
+MAX_ATTEMPTS = int(os.getenv("CONTEXTCLIP_MAX_ATTEMPTS", "3"))
+# wall clock limit for a whole job (all stages, both branches), 0 turns it off
+# the ffmpeg / ocr / libreoffice timeouts only bound one call each
+JOB_TIMEOUT_SECONDS = float(os.getenv("CONTEXTCLIP_JOB_TIMEOUT_SECONDS", "14400"))
+
+
+def enqueue_job(db: Session, job: Job) -> None:
+    # put the job in the queue, a worker will pick it up on its next poll
+    job.status = "queued"
+    job.queued_at = datetime.utcnow()
+    job.claimed_by = None
+    job.lease_expires_at = None
+    job.attempts = 0
+    job.cancel_requested = False
+    job.stage = None
+    job.progress = 0.0
+    db.commit()
+    events.publish(job.id, "status", status=job.status, stage=None, progress=0.0)
+
+
+def _claimable(now: datetime):
+    # queued jobs, or jobs whose worker stopped renewing its lease (unless someone asked to cancel them)
+    return or_(
+        Job.status == "queued",
+        and_(
+            Job.status == "processing",
+            Job.lease_expires_at < now,
+            func.coalesce(Job.cancel_requested, False) == False,  # noqa: E712
+        ),
+    )
+
+
+def fail_exhausted_jobs(db: Session) -> int:
+    # jobs that already crashed their worker MAX_ATTEMPTS times are not retried again,
+    # abandoned jobs that were asked to cancel are just cancelled
+    now = datetime.utcnow()
+    db.execute(
+        update(Job)
+        .where(
+            Job.status == "processing",
+            Job.lease_expires_at < now,
+            func.coalesce(Job.cancel_requested, False) == True,  # noqa: E712
+        )
+        .values(status="cancelled", claimed_by=None, lease_expires_at=None)
+    )
+    result = db.execute(
+        update(Job)
+        .where(
+            Job.status == "processing",
+            Job.lease_expires_at < now,
+            func.coalesce(Job.attempts, 0) >= MAX_ATTEMPTS,
+        )
+        .values(status="error", claimed_by=None, lease_expires_at=None)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def claim_next_job(db: Session, worker_id: str) -> Optional[str]:
+    # picks the oldest claimable job and takes it with a conditional update
+    # if another worker got there first the update matches nothing and we try the next candidate
+    fail_exhausted_jobs(db)
+
+    now = datetime.utcnow()
+    candidates = (
+        db.query(Job.id)
+        .filter(_claimable(now))
+        .order_by(Job.queued_at, Job.created_at)
+        .limit(5)
+        .all()
+    )
+
+    for (job_id,) in candidates:
+        result = db.execute(
+            update(Job)
+            .where(Job.id == job_id, _claimable(now))
+            .values(
+                status="processing",
+                claimed_by=worker_id,
+                lease_expires_at=now + timedelta(seconds=LEASE_SECONDS),
+                attempts=func.coalesce(Job.attempts, 0) + 1,
+            )
+        )
+        db.commit()
+        if result.rowcount == 1:
+            return job_id
+
+    return None
+
+
+def renew_lease(db: Session, job_id: str, worker_id: str) -> bool:
+    # returns False if the job is not ours anymore (lease ran out and someone else claimed it)
+    result = db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.claimed_by == worker_id)
+        .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=LEASE_SECONDS))
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def is_cancel_requested(db: Session, job_id: str) -> bool:
+    return bool(db.query(Job.cancel_requested).filter(Job.id == job_id).scalar())
+
+
+def request_cancel(db: Session, job: Job) -> None:
+    # jobs that no worker has yet are cancelled right here, running ones are stopped by their worker
+    if job.status in ("pending", "queued"):
+        job.status = "cancelled"
+        job.claimed_by = None
+        job.lease_expires_at = None
+    job.cancel_requested = True
+    db.commit()
+    if job.status == "cancelled":
+        events.publish(job.id, "status", status=job.status, stage=None, progress=job.progress)
+
+
+def release_job(db: Session, job_id: str, worker_id: str) -> None:
+    # called once process_job returned, the job status itself is set by process_job
+    db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.claimed_by == worker_id)
+        .values(claimed_by=None, lease_expires_at=None)
+    )
+    db.commit()
+
+
+def fail_timed_out_job(db: Session, job_id: str, worker_id: str) -> None:
+    # the job ran longer than JOB_TIMEOUT_SECONDS, it would most likely do the same again so it is not retried
+    result = db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.claimed_by == worker_id, Job.status == "processing")
+        .values(status="error", stage=None)
+    )
+    db.commit()
+    if result.rowcount == 1:
+        events.publish(job_id, "status", status="error", stage=None, error=f"job timed out after {JOB_TIMEOUT_SECONDS:.0f}s")
+
+
+def expire_worker_leases(db: Session, worker_id: str) -> None:
+    # worker process died, let its job be claimed right away instead of waiting for the lease
+    db.execute(
+        update(Job)
+        .where(Job.claimed_by == worker_id, Job.status == "processing")
+        .values(lease_expires_at=datetime.utcnow())
+    )
+    db.commit()
+
+
+class _LeaseHeartbeat(threading.Thread):
+    # process_job blocks for long stretches (whisper, ocr), so the lease is renewed from a thread
+    # it also watches for cancel requests and calls on_cancel when the job should stop
+
+    def __init__(self, job_id: str, worker_id: str, on_cancel: Callable[[], None]):
+        super().__init__(daemon=True)
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.on_cancel = on_cancel
+        self._stopped = threading.Event()
+
+    def run(self):
+        renew_every = max(1.0, LEASE_SECONDS / 3)
+        last_renewal = time.monotonic()
+        while not self._stopped.wait(min(POLL_INTERVAL, renew_every)):
+            db = SessionLocal()
+            try:
+                if is_cancel_requested(db, self.job_id):
+                    print(f"Cancel requested for job {self.job_id}")
+                    self.on_cancel()
+                    return
+                if time.monotonic() - last_renewal >= renew_every:
+                    if not renew_lease(db, self.job_id, self.worker_id):
+                        # someone else runs it now, stop our copy
+                        print(f"Worker {self.worker_id} lost the lease on job {self.job_id}")
+                        self.on_cancel()
+                        return
+                    last_renewal = time.monotonic()
+            except Exception as e:
+                print(f"Lease renewal failed for job {self.job_id}: {e}")
+            finally:
+                db.close()
+
+    def stop(self):
+        self._stopped.set()
+
+
+def run_worker(worker_id: str, stop_event, events_queue=None) -> None:
+    # main loop of one worker process, job events go to the api process through events_queue (see events.py)
+    from .model_registry import registry
+    from .workers import process_job, warm_up_models
+
+    if events_queue is not None:
+        events.set_publish_queue(events_queue)
+    print(f"Worker {worker_id} started (pid {os.getpid()})")
+    warm_up_models()
+
+    while not stop_event.is_set():
+        db = SessionLocal()
+        try:
+            job_id = claim_next_job(db, worker_id)
+        except Exception as e:
+            print(f"Worker {worker_id} could not claim a job: {e}")
+            job_id = None
+        finally:
+            db.close()
+
+        if not job_id:
+            stop_event.wait(POLL_INTERVAL)
+            continue
+
+        print(f"Worker {worker_id} claimed job {job_id}")
+        # the job runs as a task so the heartbeat thread can cancel it
+        loop = asyncio.new_event_loop()
+        task = loop.create_task(process_job(job_id))
+        heartbeat = _LeaseHeartbeat(job_id, worker_id, on_cancel=lambda: loop.call_soon_threadsafe(task.cancel))
+        heartbeat.start()
+        try:
+            # wait_for cancels the task when the time is up, the stages stop like on a cancel request
+            loop.run_until_complete(asyncio.wait_for(task, JOB_TIMEOUT_SECONDS if JOB_TIMEOUT_SECONDS > 0 else None))
+        except asyncio.TimeoutError:
+            print(f"Worker {worker_id} gave up on job {job_id} after {JOB_TIMEOUT_SECONDS:.0f}s")
+            db = SessionLocal()
+            try:
+                fail_timed_out_job(db, job_id, worker_id)
+            finally:
+                db.close()
+        except asyncio.CancelledError:
+            print(f"Worker {worker_id} stopped job {job_id}")
+        except Exception as e:
+            print(f"Worker {worker_id} crashed on job {job_id}: {e}")
+        finally:
+            heartbeat.stop()
+            # the asyncio.to_thread work of the job (hashing, indexing) is short, let it finish before closing
+            loop.run_until_complete(loop.shutdown_default_executor())
+            loop.close()
+            db = SessionLocal()
+            try:
+                release_job(db, job_id, worker_id)
+            finally:
+                db.close()
+            print(f"Worker {worker_id} model registry: {registry.stats()}")
+
+    print(f"Worker {worker_id} stopped")
+
+
+class WorkerPool:
+    # keeps `size` worker processes alive, restarting the ones that die
+
+    def __init__(self, size: int = WORKER_COUNT, relay_events: bool = True):
+        self.size = size
+        # spawn instead of fork, torch/whisper dont like being forked after they are imported
+        self._ctx = multiprocessing.get_context("spawn")
+        self._stop_event = self._ctx.Event()
+        # progress events of the workers, relayed to the /job/{job_id}/events streams by the api process
+        # (nobody would read them without an api in this process)
+        self.events = self._ctx.Queue() if relay_events else None
+        self._processes: Dict[str, multiprocessing.Process] = {}
+        self._supervisor: Optional[threading.Thread] = None
+
+    def _spawn(self) -> None:
+        worker_id = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        # not daemonic, workers may start their own process pools
+        process = self._ctx.Process(
+            target=run_worker,
+            args=(worker_id, self._stop_event, self.events),
+            name=f"contextclip-worker-{worker_id}",
+        )
+        process.start()
+        self._processes[worker_id] = process
+
+    def _supervise(self) -> None:
+        while not self._stop_event.wait(POLL_INTERVAL):
+            for worker_id, process in list(self._processes.items()):
+                if process.is_alive():
+                    continue
+                print(f"Worker {worker_id} exited with code {process.exitcode}, restarting")
+                del self._processes[worker_id]
+                db = SessionLocal()
+                try:
+                    expire_worker_leases(db, worker_id)
+                except Exception as e:
+                    print(f"Could not expire leases of worker {worker_id}: {e}")
+                finally:
+                    db.close()
+                self._spawn()
+
+    def start(self) -> None:
+        if self.size <= 0:
+            print("Job workers disabled, run them with `python -m app.jobqueue`")
+            return
+        for _ in range(self.size):
+            self._spawn()
+        self._supervisor = threading.Thread(target=self._supervise, daemon=True)
+        self._supervisor.start()
+        print(f"Started {self.size} job workers")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        # workers finish the current loop iteration, anything still running after the timeout is terminated
+        # (a terminated job gets its lease expired so the next worker picks it up again)
+        self._stop_event.set()
+        deadline = time.monotonic() + timeout
+        for process in self._processes.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+        for worker_id, process in self._processes.items():
+            if process.is_alive():
+                process.terminate()
+                process.join()
+                db = SessionLocal()
+                try:
+                    expire_worker_leases(db, worker_id)
+                finally:
+                    db.close()
+        self._processes.clear()
+
+
+if __name__ == "__main__":
+    # run workers on their own, e.g. with CONTEXTCLIP_WORKERS=0 on the api
+    pool = WorkerPool(size=max(1, WORKER_COUNT), relay_events=False)
+    pool.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pool.stop()
@@ -1,16 +1,22 @@
-from fastapi import FastAPI, UploadFile, File, Form, Depends, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, Depends, HTTPException, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse, FileResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
+import asyncio
+import base64
 import uuid
 import os
 import shutil
 from datetime import datetime
 
-from .database import get_db, create_tables, Job
-from .workers import process_job
-from .summarize import summarize_meeting
+from .database import get_db, get_async_db, get_async_sessionmaker, dispose_async_engine, create_tables, Job
+from .jobqueue import START_WORKERS, WORKER_COUNT, WorkerPool, enqueue_job, request_cancel
+from .summarize import summarize_meeting, preload_summarizers
+from . import uploads, search_index, semantic_index, segments_store, manifest, events, file_serving
 
 
 # make the app
@@ -37,6 +43,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# worker processes that run the queued jobs, unless they run on their own (CONTEXTCLIP_START_WORKERS=0)
+worker_pool = WorkerPool(size=WORKER_COUNT if START_WORKERS else 0, relay_events=START_WORKERS)
+
 # creating tables whn we start
 # this req- makes the fun run even before req are received
 @app.on_event("startup")
@@ -44,6 +53,18 @@ async def startup_event():
     create_tables()
     # Ensure storage directory exists
     os.makedirs("storage", exist_ok=True)
+    # job events of the workers go to the /job/{job_id}/events streams of this process
+    if worker_pool.events is not None:
+        events.start_relay(asyncio.get_running_loop(), worker_pool.events)
+    worker_pool.start()
+    # optional, CONTEXTCLIP_PRELOAD_SUMMARIZERS loads the summary models before the first request
+    await run_in_threadpool(preload_summarizers)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    worker_pool.stop()
+    events.stop_relay()
+    await dispose_async_engine()
 
 @app.get("/")
 async def root():
@@ -53,6 +74,31 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "contextclip-api"}
 
+def save_slides(job: Job, slides: List[UploadFile], slides_original_dir: str, slides_images_dir: str) -> int:
+    # saves the uploaded slide files and records them on the job, returns the number of slide images
+    slides_pdf_path = None
+    slides_ppt_path = None
+    image_count = 0
+    for slide in slides:
+        ext = os.path.splitext(slide.filename)[1].lower()
+        save_path = f"{slides_original_dir}/{slide.filename}"
+        with open(save_path, "wb") as buffer:
+            shutil.copyfileobj(slide.file, buffer)
+        if ext == ".pdf":
+            slides_pdf_path = save_path
+        elif ext in [".ppt", ".pptx"]:
+            slides_ppt_path = save_path
+        elif ext in [".png", ".jpg", ".jpeg", ".bmp", ".tiff"]:
+            # Copy image to images dir as well
+            shutil.copy(save_path, f"{slides_images_dir}/{slide.filename}")
+            image_count += 1
+
+    job.slides_pdf_path = slides_pdf_path
+    job.slides_ppt_path = slides_ppt_path
+    job.slides_image_dir = slides_images_dir
+    job.slides_count = image_count
+    return image_count
+
 # the upload request
 @app.post("/upload")
 async def upload_files(
@@ -94,29 +140,10 @@ async def upload_files(
             shutil.copyfileobj(media.file, buffer)
 
         # Save slides
-        slides_pdf_path = None
-        slides_ppt_path = None
-        image_count = 0
-        for slide in slides:
-            ext = os.path.splitext(slide.filename)[1].lower()
-            save_path = f"{slides_original_dir}/{slide.filename}"
-            with open(save_path, "wb") as buffer:
-                shutil.copyfileobj(slide.file, buffer)
-            if ext == ".pdf":
-                slides_pdf_path = save_path
-            elif ext in [".ppt", ".pptx"]:
-                slides_ppt_path = save_path
-            elif ext in [".png", ".jpg", ".jpeg", ".bmp", ".tiff"]:
-                # Copy image to images dir as well
-                shutil.copy(save_path, f"{slides_images_dir}/{slide.filename}")
-                image_count += 1
+        image_count = save_slides(job, slides, slides_original_dir, slides_images_dir)
 
         # Update job record
         job.media_path = media_path
-        job.slides_pdf_path = slides_pdf_path
-        job.slides_ppt_path = slides_ppt_path
-        job.slides_image_dir = slides_images_dir
-        job.slides_count = image_count
         db.commit()
 
         return JSONResponse(
@@ -138,19 +165,165 @@ async def upload_files(
         except:
             pass
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+# resumable uploads, for big recordings: initiate -> PUT parts at offsets -> complete
+# a failed part is just sent again, GET tells which ranges already arrived
+
+def _upload_status(job_id: str, state: dict) -> dict:
+    return {
+        "job_id": job_id,
+        "filename": state["filename"],
+        "size": state["size"],
+        "received": state["received"],
+        "received_bytes": uploads.received_bytes(state),
+        "contiguous_bytes": uploads.contiguous_bytes(state),
+        "missing": uploads.missing_ranges(state),
+        "complete": uploads.is_complete(state)
+    }
+
+def _get_upload(job_id: str, db: Session):
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    state = uploads.load_upload_state(f"storage/{job_id}/media")
+    if state is None:
+        raise HTTPException(status_code=404, detail="No upload in progress for this job")
+    return job, state
+
+@app.post("/uploads")
+async def initiate_upload(
+    filename: str = Form(...),
+    size: int = Form(...),
+    db: Session = Depends(get_db)
+):
+    if size <= 0:
+        raise HTTPException(status_code=400, detail="size must be positive")
+
+    job = Job(
+        status="pending",
+        created_at=datetime.utcnow(),
+        slides_count=0
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    job_id = job.id
+
+    job_storage_path = f"storage/{job_id}"
+    os.makedirs(f"{job_storage_path}/slides/original", exist_ok=True)
+    os.makedirs(f"{job_storage_path}/slides/images", exist_ok=True)
+
+    try:
+        state = uploads.init_upload(f"{job_storage_path}/media", filename, size)
+    except Exception as e:
+        shutil.rmtree(job_storage_path, ignore_errors=True)
+        db.delete(job)
+        db.commit()
+        raise HTTPException(status_code=500, detail=f"Could not start upload: {str(e)}")
+
+    return JSONResponse(
+        status_code=201,
+        content={
+            **_upload_status(job_id, state),
+            "upload_url": f"/uploads/{job_id}",
+            "created_at": job.created_at.isoformat()
+        }
+    )
+
+@app.get("/uploads/{job_id}")
+async def get_upload_status(job_id: str, db: Session = Depends(get_db)):
+    _, state = _get_upload(job_id, db)
+    return _upload_status(job_id, state)
+
+@app.put("/uploads/{job_id}")
+async def upload_part(
+    job_id: str,
+    request: Request,
+    offset: int = 0,
+    x_checksum_sha256: Optional[str] = Header(default=None),
+    db: Session = Depends(get_db)
+):
+    # the body is the raw bytes of the part, written at offset as it streams in
+    _, state = _get_upload(job_id, db)
+    if offset < 0 or offset > state["size"]:
+        raise HTTPException(status_code=400, detail="offset is outside the file")
+
+    try:
+        written, checksum = await uploads.write_part(state["media_path"], offset, request.stream(), state["size"])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if x_checksum_sha256 and x_checksum_sha256.lower() != checksum:
+        # the bytes are on disk but the range is not marked as received, the client resends the part
+        raise HTTPException(status_code=400, detail="Checksum mismatch, resend the part")
+
+    # other parts may have been recorded while this one streamed in, the state is reloaded under a lock
+    state = await run_in_threadpool(uploads.record_received_range, f"storage/{job_id}/media", offset, offset + written)
+    if state is None:
+        raise HTTPException(status_code=404, detail="No upload in progress for this job")
+
+    return {
+        **_upload_status(job_id, state),
+        "part": {"offset": offset, "length": written, "sha256": checksum}
+    }
+
+@app.post("/uploads/{job_id}/complete")
+async def complete_upload(
+    job_id: str,
+    slides: List[UploadFile] = File(default=[]),
+    db: Session = Depends(get_db)
+):
+    job, state = _get_upload(job_id, db)
+    if not uploads.is_complete(state):
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Upload is missing parts", "missing": uploads.missing_ranges(state)}
+        )
+
+    job_storage_path = f"storage/{job_id}"
+    try:
+        image_count = save_slides(job, slides, f"{job_storage_path}/slides/original", f"{job_storage_path}/slides/images")
+        job.media_path = state["media_path"]
+        db.commit()
+        uploads.finish_upload(f"{job_storage_path}/media")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Completing upload failed: {str(e)}")
+
+    return JSONResponse(
+        status_code=200,
+        content={
+            "job_id": job_id,
+            "status": job.status,
+            "media_filename": state["filename"],
+            "slides_count": image_count,
+            "created_at": job.created_at.isoformat()
+        }
+    )
     
 @app.get("/job/{job_id}")
-async def get_job_status(job_id: str, db: Session = Depends(get_db)):
+async def get_job_status(job_id: str, db: AsyncSession = Depends(get_async_db)):
     # this is to get details about the job:
-    job = db.query(Job).filter(Job.id == job_id).first()
+    job = await db.get(Job, job_id)
     
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    # basic info
+    # jobs finished before the manifest existed get it built once from their files
+    if job.artifacts is None and job.status == "done":
+        await run_in_threadpool(manifest.refresh_manifest, job, f"storage/{job_id}")
+        await db.commit()
+    
+    summary = job.summary or {}
+    meeting_duration = summary.get("meeting_duration")
+    if not meeting_duration and job.duration is not None:
+        meeting_duration = f"{job.duration:.1f} seconds"
+    
+    # basic info, everything comes from the job row (see manifest.py)
     job_data = {
         "job_id": job.id,
         "status": job.status,
+        "stage": job.stage,
+        "progress": job.progress or 0.0,
         "created_at": job.created_at.isoformat(),
         "media_path": job.media_path,
         "slides_count": job.slides_count,
@@ -159,81 +332,69 @@ async def get_job_status(job_id: str, db: Session = Depends(get_db)):
             "summary": None,
             "segments": None,
             "slide_texts": None,
-            "linked_segments": None
+            "linked_segments": None,
+            **(job.artifacts or {})
         },
-        "action_items": [],
-        "slide_links": [],
-        "summary": None,
-        "meeting_duration": None,
-        "speakers": []
+        "action_items": summary.get("action_items", []),
+        "slide_links": job.slide_links or [],
+        "summary": summary.get("meeting_summary"),
+        "meeting_duration": meeting_duration,
+        "speakers": job.speakers or []
     }
     
-    # other urls
-    
-    job_storage_path = f"storage/{job_id}"
-
-    transcript_file = f"{job_storage_path}/transcript.json"
-    if os.path.exists(transcript_file):
-        job_data["urls"]["transcript"] = f"/files/{job_id}/transcript.json"
-    
-    summary_file = f"{job_storage_path}/summary.json"
-    if os.path.exists(summary_file):
-        job_data["urls"]["summary"] = f"/files/{job_id}/summary.json"
-        try:
-            import json
-            with open(summary_file, 'r', encoding='utf-8') as f:
-                summary_data = json.load(f)
-            
-            job_data["summary"] = summary_data.get("meeting_summary", [])
-            job_data["action_items"] = summary_data.get("action_items", [])
-            job_data["meeting_duration"] = summary_data.get("meeting_duration", None)
-        except Exception as e:
-            print(f"Error loading summary: {e}")
-    
-    segments_file = f"{job_storage_path}/segments.csv"
-    if os.path.exists(segments_file):
-        job_data["urls"]["segments"] = f"/files/{job_id}/segments.csv"
-        try:
-            import pandas as pd
-            segments_df = pd.read_csv(segments_file)
-            job_data["speakers"] = list(segments_df['speaker'].unique())
-            if not job_data["meeting_duration"]:
-                job_data["meeting_duration"] = f"{segments_df['end'].max():.1f} seconds"
-        except Exception as e:
-            print(f"Error loading segments: {e}")
-
-    slide_texts_file = f"{job_storage_path}/slide_texts.json"
-    if os.path.exists(slide_texts_file):
-        job_data["urls"]["slide_texts"] = f"/files/{job_id}/slide_texts.json"
-    
-    linked_segments_file = f"{job_storage_path}/linked_segments.csv"
-    if os.path.exists(linked_segments_file):
-        job_data["urls"]["linked_segments"] = f"/files/{job_id}/linked_segments.csv"
-        try:
-            import pandas as pd
-            linked_df = pd.read_csv(linked_segments_file)
-            
-            # Extract slide links (segments that are linked to slides)
-            slide_links = []
-            for _, row in linked_df.iterrows():
-                if pd.notna(row.get('linked_slide')):
-                    slide_links.append({
-                        "slide": row['linked_slide'],
-                        "timestamp": f"{int(row['start']//60):02d}:{int(row['start']%60):02d}",
-                        "speaker": row['speaker'],
-                        "text": row['text'][:100] + "..." if len(row['text']) > 100 else row['text'],
-                        "confidence": row.get('confidence', 0)
-                    })
-            
-            job_data["slide_links"] = slide_links
-        except Exception as e:
-            print(f"Error loading linked segments: {e}")
-    
     return JSONResponse(
         status_code=200,
         content=job_data
     )
 
+async def _job_event_state(job_id: str) -> Optional[dict]:
+    # what a job event stream starts from, and falls back to when no events arrive (see events.py)
+    # own session: the stream outlives the request scoped one
+    async with get_async_sessionmaker()() as db:
+        row = (await db.execute(
+            select(Job.status, Job.stage, Job.progress, Job.artifacts).where(Job.id == job_id)
+        )).first()
+    if row is None:
+        return None
+    return {
+        "status": row.status,
+        "stage": row.stage,
+        "progress": row.progress or 0.0,
+        "artifacts": row.artifacts or {}
+    }
+
+@app.get("/job/{job_id}/events")
+async def job_events(job_id: str):
+    # server-sent events with the progress of a job, instead of polling GET /job/{job_id}
+    # "status" (status, stage, progress, artifacts) first, then "stage", "progress", "artifact" and "status"
+    # events as they happen, the stream ends once the job is done, failed or cancelled
+    if await _job_event_state(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return StreamingResponse(
+        events.job_event_stream(job_id, lambda: _job_event_state(job_id)),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # nginx would buffer the stream otherwise
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+@app.get("/job/{job_id}/segments.csv")
+async def get_segments_csv(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    # the segments in the old csv layout, built from segments.arrow (or the csv of jobs not migrated yet)
+    job = await db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    job_storage_path = f"storage/{job_id}"
+    if not segments_store.has_segments(job_storage_path):
+        raise HTTPException(status_code=404, detail="Segments not found")
+    
+    content = await run_in_threadpool(segments_store.segments_csv, job_storage_path)
+    return Response(content=content, media_type="text/csv")
+
 @app.post("/job/{job_id}/process")
 async def start_job_processing(job_id: str, db: Session = Depends(get_db)):
     # to start the job processing
@@ -242,18 +403,53 @@ async def start_job_processing(job_id: str, db: Session = Depends(get_db)):
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    if job.status != "pending":
+    # finished/failed jobs can be resubmitted, stages whose inputs didnt change are skipped
+    if job.status in ("queued", "processing"):
         raise HTTPException(status_code=400, detail=f"Job is already {job.status}")
     
-    # Start processing from the wokers
-    await process_job(job_id)
+    # queue it, one of the worker processes picks it up
+    enqueue_job(db, job)
     
-    return {"message": f"Started processing job {job_id}"}
+    return JSONResponse(
+        status_code=202,
+        content={
+            "message": f"Queued job {job_id} for processing",
+            "job_id": job_id,
+            "status": job.status
+        }
+    )
+
+@app.post("/job/{job_id}/cancel")
+async def cancel_job(job_id: str, db: Session = Depends(get_db)):
+    # queued jobs are cancelled right away, a running one is stopped by its worker within a few seconds
+    job = db.query(Job).filter(Job.id == job_id).first()
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if job.status not in ("pending", "queued", "processing"):
+        raise HTTPException(status_code=400, detail=f"Job is already {job.status}")
+    
+    request_cancel(db, job)
+    
+    return JSONResponse(
+        status_code=202,
+        content={
+            "message": f"Cancellation requested for job {job_id}",
+            "job_id": job_id,
+            "status": job.status
+        }
+    )
+
+def _refresh_summary_manifest(job: Job, db: Session) -> None:
+    manifest.refresh_manifest(job, f"storage/{job.id}", ("artifacts", "summary"))
+    db.commit()
 
 @app.post("/job/{job_id}/summarize")
 async def generate_summary(
     job_id: str, 
     model_type: str = "huggingface",
+    model_name: Optional[str] = None,
     openai_api_key: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
@@ -264,21 +460,25 @@ async def generate_summary(
         raise HTTPException(status_code=404, detail="Job not found")
     
     # we need to process first, and get the segements file, then this
-    segments_path = f"storage/{job_id}/segments.csv"
-    if not os.path.exists(segments_path):
+    if not segments_store.has_segments(f"storage/{job_id}"):
         raise HTTPException(
             status_code=400, 
             detail="Transcript segments not found. Process the job first."
         )
     
     try:
-        # calling the summaeize fun
-        summary_data = summarize_meeting(
+        # calling the summaeize fun, in the threadpool so generation doesnt block the event loop
+        summary_data = await run_in_threadpool(
+            summarize_meeting,
             job_id=job_id,
             model_type=model_type,
-            openai_api_key=openai_api_key
+            openai_api_key=openai_api_key,
+            model_name=model_name
         )
         
+        # the summary shows up in GET /job/{job_id} through the manifest (reads the files, writes the row)
+        await run_in_threadpool(_refresh_summary_manifest, job, db)
+        
         return JSONResponse(
             status_code=200,
             content={
@@ -322,187 +522,160 @@ async def get_summary(job_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Failed to load summary: {str(e)}")
 
 @app.get("/search")
-async def search_transcripts(q: str, db: Session = Depends(get_db)):
+async def search_transcripts(q: str):
     # search for the transcripts of all jobs tht hv been completed
     if not q or len(q.strip()) < 2:
         raise HTTPException(status_code=400, detail="Query must be at least 2 characters long")
     
-    query = q.strip().lower()
-    results = []
-    
     try:
-        #get all completed ones
-        jobs = db.query(Job).filter(Job.status == "completed").all()
-        
-        for job in jobs:
-            job_storage_path = f"storage/{job.id}"
-            
-            # n check for segements file
-            segments_file = f"{job_storage_path}/segments.csv"
-            if os.path.exists(segments_file):
-                try:
-                    import pandas as pd
-                    segments_df = pd.read_csv(segments_file)
-                    
-                    # Search in transcript text
-                    matching_segments = []
-                    for _, segment in segments_df.iterrows():
-                        text = segment['text'].lower()
-                        if query in text:
-                            # Calculate simple relevance score based on query position and frequency
-                            score = text.count(query)
-                            if text.startswith(query):
-                                score += 5  # Boost for beginning matches
-                            if query in text.split()[:3]:  # First few words
-                                score += 3
-                            
-                            matching_segments.append({
-                                "timestamp": f"{int(segment['start']//60):02d}:{int(segment['start']%60):02d}",
-                                "speaker": segment['speaker'],
-                                "text": segment['text'],
-                                "score": score,
-                                "start_time": segment['start']
-                            })
-                    
-                    if matching_segments:
-                        # Sort by relevance score
-                        matching_segments.sort(key=lambda x: x['score'], reverse=True)
-                        
-                        # Calculate overall job relevance
-                        total_score = sum(seg['score'] for seg in matching_segments)
-                        
-                        results.append({
-                            "job_id": job.id,
-                            "created_at": job.created_at.isoformat(),
-                            "score": total_score,
-                            "matching_segments": matching_segments[:5],  # Top 5 matches per job
-                            "total_matches": len(matching_segments),
-                            "meeting_duration": f"{segments_df['end'].max():.1f} seconds" if len(segments_df) > 0 else None
-                        })
-                        
-                except Exception as e:
-                    print(f"Error searching job {job.id}: {e}")
-                    continue
-            
-            # Search in slide texts
-            slide_texts_file = f"{job_storage_path}/slide_texts.json"
-            if os.path.exists(slide_texts_file):
-                try:
-                    import json
-                    with open(slide_texts_file, 'r', encoding='utf-8') as f:
-                        slide_data = json.load(f)
-                    
-                    matching_slides = []
-                    for slide in slide_data:
-                        text = slide['text'].lower()
-                        if query in text:
-                            score = text.count(query) * 2  # Boost slide matches
-                            matching_slides.append({
-                                "filename": slide['filename'],
-                                "text": slide['text'],
-                                "score": score
-                            })
-                    
-                    if matching_slides:
-                        # Add slide matches to existing job result or create new one
-                        existing_result = next((r for r in results if r['job_id'] == job.id), None)
-                        if existing_result:
-                            existing_result['matching_slides'] = matching_slides
-                            existing_result['score'] += sum(s['score'] for s in matching_slides)
-                        else:
-                            results.append({
-                                "job_id": job.id,
-                                "created_at": job.created_at.isoformat(),
-                                "score": sum(s['score'] for s in matching_slides),
-                                "matching_slides": matching_slides,
-                                "matching_segments": [],
-                                "total_matches": 0
-                            })
-                            
-                except Exception as e:
-                    print(f"Error searching slides for job {job.id}: {e}")
-                    continue
-        
-        # Sort results by overall score
-        results.sort(key=lambda x: x['score'], reverse=True)
+        # finished jobs are in the full text index (see search_index), bm25 ranked with snippets
+        results = await run_in_threadpool(search_index.search, q.strip(), 20)
         
         return JSONResponse(
             status_code=200,
             content={
                 "query": q,
                 "total_results": len(results),
-                "results": results[:20]  # Return top 20 results
+                "results": results  # top 20 results
             }
         )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
-@app.get("/files/{job_id}/{filename}")
-async def serve_job_file(job_id: str, filename: str, db: Session = Depends(get_db)):
-    # serves files form the dir
-    # verify if job exists
-    job = db.query(Job).filter(Job.id == job_id).first()
-    if not job:
-        raise HTTPException(status_code=404, detail="Job not found")
-    
-    # construct its file path
-    file_path = f"storage/{job_id}/{filename}"
-    
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="File not found")
+@app.get("/search/semantic")
+async def semantic_search(q: str, k: int = 10, hybrid: bool = False):
+    # nearest transcript segments by meaning, hybrid=true fuses them with the keyword ranking of /search
+    if not q or len(q.strip()) < 2:
+        raise HTTPException(status_code=400, detail="Query must be at least 2 characters long")
+    if not semantic_index.is_available():
+        raise HTTPException(status_code=503, detail="Semantic search needs sentence-transformers and faiss-cpu")
     
-    # content type 
-    if filename.endswith('.json'):
-        media_type = "application/json"
-    elif filename.endswith('.csv'):
-        media_type = "text/csv"
-    elif filename.endswith('.txt'):
-        media_type = "text/plain"
-    else:
-        media_type = "application/octet-stream"
-    
-    # return
+    k = max(1, min(k, 100))
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        results = await run_in_threadpool(semantic_index.semantic_search, q.strip(), k, hybrid)
         
         return JSONResponse(
             status_code=200,
-            content=content if filename.endswith('.json') else {"content": content},
-            media_type=media_type
+            content={
+                "query": q,
+                "hybrid": hybrid,
+                "total_results": len(results),
+                "results": results
+            }
         )
+        
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading file: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Semantic search failed: {str(e)}")
+
+@app.get("/files/{job_id}/{filename:path}")
+async def serve_job_file(job_id: str, filename: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    # serves files of the job dir as they are on disk, with range requests, 304s and precompressed copies
+    # (see file_serving.py)
+    job = await db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    # only whats inside storage/{job_id}
+    file_path = file_serving.resolve_job_path("storage", job_id, filename)
+    if file_path is None or not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    headers = {"Cache-Control": "no-cache"}
+    accept_encoding = request.headers.get("accept-encoding")
+    if file_serving.is_compressible(file_path):
+        headers["Vary"] = "Accept-Encoding"
+        if accept_encoding:
+            # artifacts the worker didnt compress (older jobs, summary.json) are compressed on first use
+            await run_in_threadpool(file_serving.precompress, file_path)
+    send_path, encoding = file_serving.pick_variant(file_path, accept_encoding)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    
+    response = FileResponse(
+        send_path,
+        media_type=file_serving.media_type(file_path),
+        headers=headers,
+        stat_result=os.stat(send_path)
+    )
+    if file_serving.is_not_modified(request.headers, response.headers["etag"], response.headers["last-modified"]):
+        return Response(
+            status_code=304,
+            headers={key: response.headers[key] for key in ("etag", "last-modified", "cache-control", "vary") if key in response.headers}
+        )
+    return response
+
+JOBS_PAGE_SIZE = 50
+JOBS_MAX_PAGE_SIZE = 500
+
+def _encode_jobs_cursor(created_at: datetime, job_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{job_id}".encode()).decode()
+
+def _decode_jobs_cursor(cursor: str):
+    try:
+        created_at, job_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), job_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @app.get("/jobs")
-async def list_jobs(status: Optional[str] = None, db: Session = Depends(get_db)):
-    # returning all jobs + there is status filter optional
-    query = db.query(Job)
+async def list_jobs(
+    status: Optional[str] = None,
+    limit: int = JOBS_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    # jobs newest first, one page at a time - pass next_cursor back as cursor for the next page
+    # keyset pagination on (created_at, id), so every page is one range scan of ix_jobs_(status_)created_at
+    limit = max(1, min(limit, JOBS_MAX_PAGE_SIZE))
+    query = select(
+        Job.id, Job.status, Job.created_at, Job.slides_count, Job.artifacts,
+        Job.has_transcript, Job.has_summary, Job.has_slides
+    )
     
     if status:
-        query = query.filter(Job.status == status)
+        query = query.where(Job.status == status)
+    if cursor:
+        cursor_created_at, cursor_id = _decode_jobs_cursor(cursor)
+        # the <= is redundant but gives the planner a range on created_at to seek to
+        query = query.where(
+            Job.created_at <= cursor_created_at,
+            or_(Job.created_at < cursor_created_at, Job.id < cursor_id)
+        )
+    
+    rows = (await db.execute(query.order_by(Job.created_at.desc(), Job.id.desc()).limit(limit + 1))).all()
+    next_cursor = _encode_jobs_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None
+    rows = rows[:limit]
     
-    jobs = query.order_by(Job.created_at.desc()).all()
+    # finished jobs from before the manifest get it built once (see get_job_status), at most one page of them
+    flags = {}
+    legacy_ids = [row.id for row in rows if row.artifacts is None and row.status == "done"]
+    if legacy_ids:
+        legacy_jobs = (await db.execute(select(Job).where(Job.id.in_(legacy_ids)))).scalars().all()
+        for job in legacy_jobs:
+            await run_in_threadpool(manifest.refresh_manifest, job, f"storage/{job.id}")
+            flags[job.id] = (job.has_transcript, job.has_summary, job.has_slides)
+        await db.commit()
     
     job_list = []
-    for job in jobs:
-        job_data = {
-            "job_id": job.id,
-            "status": job.status,
-            "created_at": job.created_at.isoformat(),
-            "slides_count": job.slides_count,
-            "has_transcript": os.path.exists(f"storage/{job.id}/segments.csv"),
-            "has_summary": os.path.exists(f"storage/{job.id}/summary.json"),
-            "has_slides": os.path.exists(f"storage/{job.id}/slide_texts.json")
-        }
-        job_list.append(job_data)
+    for row in rows:
+        has_transcript, has_summary, has_slides = flags.get(row.id, (row.has_transcript, row.has_summary, row.has_slides))
+        job_list.append({
+            "job_id": row.id,
+            "status": row.status,
+            "created_at": row.created_at.isoformat(),
+            "slides_count": row.slides_count,
+            "has_transcript": bool(has_transcript),
+            "has_summary": bool(has_summary),
+            "has_slides": bool(has_slides)
+        })
     
     return JSONResponse(
         status_code=200,
         content={
             "total_jobs": len(job_list),
-            "jobs": job_list
+            "jobs": job_list,
+            "next_cursor": next_cursor
         }
     )
 
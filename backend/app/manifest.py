@@ -0,0 +1,88 @@
+# the per job manifest: facts derived from the pipeline outputs (speakers, duration, which artifacts exist,
+# slide links, the summary) kept in columns of the job row. stages refresh their part when they finish, so
+# GET /job/{job_id} - which the frontend polls - is one primary key lookup and never opens a file
+
+import json
+import os
+import re
+from typing import Dict, List, Optional, Sequence
+
+from . import segments_store
+from .database import Job
+
+
+ALL_PARTS = ("artifacts", "segments", "slide_links", "summary")
+
+
+def artifact_urls(job_id: str, storage_path: str) -> Dict[str, str]:
+    urls = {}
+    for name, filename in (
+        ("transcript", "transcript.json"),
+        ("summary", "summary.json"),
+        ("slide_texts", "slide_texts.json"),
+        ("slide_links", "slide_links.json"),
+    ):
+        if os.path.exists(os.path.join(storage_path, filename)):
+            urls[name] = f"/files/{job_id}/{filename}"
+    if segments_store.has_segments(storage_path):
+        # csv for the existing clients, the arrow file for everything that can read it
+        urls["segments"] = f"/job/{job_id}/segments.csv"
+        if os.path.exists(segments_store.segments_path(storage_path)):
+            urls["segments_arrow"] = f"/files/{job_id}/{segments_store.SEGMENTS_FILE}"
+    return urls
+
+
+def _slide_number(slide_id: str) -> Optional[int]:
+    match = re.search(r"(\d+)$", slide_id)
+    return int(match.group(1)) if match else None
+
+
+def slide_link_entries(slide_links_path: str) -> List[Dict]:
+    # linked slides from slide_links.json in the shape the results page reads
+    if not os.path.exists(slide_links_path):
+        return []
+    with open(slide_links_path, 'r', encoding='utf-8') as f:
+        slide_links = json.load(f)
+    entries = []
+    for slide_id, link in slide_links.items():
+        if link.get("timestamp") is None:
+            continue
+        entries.append({
+            "slide": slide_id,
+            "slide_number": _slide_number(slide_id),
+            "timestamp": link["timestamp"],
+            "end_timestamp": link.get("range_end", link.get("end_timestamp")),
+            "speaker": link.get("speaker"),
+            "matched_text": link.get("matched_transcript", ""),
+            "confidence": (link.get("confidence_score") or 0) / 100
+        })
+    return sorted(entries, key=lambda entry: entry["timestamp"])
+
+
+def summary_facts(summary_path: str) -> Optional[Dict]:
+    if not os.path.exists(summary_path):
+        return None
+    with open(summary_path, 'r', encoding='utf-8') as f:
+        summary_data = json.load(f)
+    return {
+        "meeting_summary": summary_data.get("meeting_summary", []),
+        "action_items": summary_data.get("action_items", []),
+        "meeting_duration": summary_data.get("meeting_duration")
+    }
+
+
+def refresh_manifest(job: Job, storage_path: str, parts: Sequence[str] = ALL_PARTS) -> None:
+    # recomputes the given parts from the files on disk, the caller commits
+    # the json columns are always assigned new objects, so sqlalchemy sees the change
+    if "artifacts" in parts:
+        job.artifacts = artifact_urls(job.id, storage_path)
+        job.has_transcript = "segments" in job.artifacts
+        job.has_summary = "summary" in job.artifacts
+        job.has_slides = "slide_texts" in job.artifacts
+    if "segments" in parts and segments_store.has_segments(storage_path):
+        job.speakers = segments_store.speakers(storage_path)
+        job.duration = segments_store.duration(storage_path)
+    if "slide_links" in parts:
+        job.slide_links = slide_link_entries(os.path.join(storage_path, "slide_links.json"))
+    if "summary" in parts:
+        job.summary = summary_facts(os.path.join(storage_path, "summary.json"))
@@ -0,0 +1,128 @@
+# process wide cache of loaded models (whisper, alignment, diarization...)
+# every worker process keeps its own registry, models are keyed by (model name, device, compute_type, language)
+# and the least recently used ones get dropped when the total goes over the memory budget
+
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("CONTEXTCLIP_MODEL_MEMORY_MB", "6000"))
+
+
+def estimate_model_size_mb(model: Any) -> Optional[float]:
+    # sums torch parameters/buffers if its a torch module (or wraps one), None if we cant tell
+    try:
+        if isinstance(model, (tuple, list)):
+            # e.g. whisperx.load_align_model returns (model, metadata)
+            sizes = [estimate_model_size_mb(part) for part in model]
+            sizes = [size for size in sizes if size is not None]
+            return sum(sizes) if sizes else None
+        if hasattr(model, "parameters") and callable(model.parameters):
+            total = sum(p.numel() * p.element_size() for p in model.parameters())
+            if hasattr(model, "buffers") and callable(model.buffers):
+                total += sum(b.numel() * b.element_size() for b in model.buffers())
+            return total / (1024 * 1024)
+        for attr in ("model", "_model", "generator"):
+            inner = getattr(model, attr, None)
+            if inner is not None and inner is not model:
+                return estimate_model_size_mb(inner)
+    except Exception:
+        pass
+    return None
+
+
+class ModelRegistry:
+
+    def __init__(self, memory_budget_mb: float = MODEL_MEMORY_BUDGET_MB):
+        self.memory_budget_mb = memory_budget_mb
+        self._models: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (model, size_mb)
+        self._lock = threading.RLock()
+        # one lock per key so two threads asking for the same model dont both load it
+        self._load_locks: Dict[Hashable, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+    def get(self, key: Hashable, loader: Callable[[], Any], size_mb: Optional[float] = None) -> Any:
+        # returns the cached model for key, loading it with loader() on a miss
+        # size_mb is used when the size cant be measured (e.g. ctranslate2 models of faster-whisper)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return self._models[key][0]
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    self.hits += 1
+                    return self._models[key][0]
+                self.misses += 1
+
+            print(f"Model registry miss, loading {key}")
+            started = time.monotonic()
+            model = loader()
+            elapsed = time.monotonic() - started
+
+            measured = estimate_model_size_mb(model)
+            size = measured if measured is not None else (size_mb or 0.0)
+
+            with self._lock:
+                self.load_seconds += elapsed
+                self._models[key] = (model, size)
+                self._evict(keep=key)
+            print(f"Loaded {key} in {elapsed:.1f}s (~{size:.0f} MB)")
+            return model
+
+    def memory_mb(self) -> float:
+        with self._lock:
+            return sum(size for _, size in self._models.values())
+
+    def _evict(self, keep: Hashable) -> None:
+        # drop least recently used models until we are under budget, never the one just loaded
+        evicted = False
+        while self.memory_mb() > self.memory_budget_mb:
+            victim = next((k for k in self._models if k != keep), None)
+            if victim is None:
+                break
+            self._models.pop(victim)
+            self.evictions += 1
+            evicted = True
+            print(f"Model registry evicted {victim}")
+
+        if evicted:
+            gc.collect()
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+            except ImportError:
+                pass
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+        gc.collect()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "load_seconds": round(self.load_seconds, 1),
+                "memory_mb": round(self.memory_mb(), 1),
+                "memory_budget_mb": self.memory_budget_mb,
+                "loaded": [repr(key) for key in self._models],
+            }
+
+
+# the registry of this process
+registry = ModelRegistry()
@@ -0,0 +1,172 @@
+# slide ocr on a process pool
+# each page is turned grayscale, downscaled and binarized before tesseract sees it (smaller input, cleaner text),
+# pages are spread over the pool and the results come back in slide order as soon as they are ready
+
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from . import slide_cache
+from .pipeline import hash_file
+
+
+OCR_WORKERS = int(os.getenv("CONTEXTCLIP_OCR_WORKERS", "0"))  # 0 = one per core
+OCR_TIMEOUT_SECONDS = float(os.getenv("CONTEXTCLIP_OCR_TIMEOUT", "60"))
+OCR_MAX_WIDTH = int(os.getenv("CONTEXTCLIP_OCR_MAX_WIDTH", "2000"))
+OCR_BINARIZE = os.getenv("CONTEXTCLIP_OCR_BINARIZE", "1") != "0"
+TESSERACT_CONFIG = '--psm 6'
+
+
+def _otsu_threshold(histogram) -> int:
+    # threshold that best separates the two gray levels of the page (text / background)
+    total = sum(histogram)
+    if not total:
+        return 128
+    weighted_total = sum(i * count for i, count in enumerate(histogram))
+    background_weight, background_sum = 0, 0.0
+    best_threshold, best_variance = 128, -1.0
+    for level, count in enumerate(histogram):
+        background_weight += count
+        if background_weight == 0:
+            continue
+        foreground_weight = total - background_weight
+        if foreground_weight == 0:
+            break
+        background_sum += level * count
+        background_mean = background_sum / background_weight
+        foreground_mean = (weighted_total - background_sum) / foreground_weight
+        variance = background_weight * foreground_weight * (background_mean - foreground_mean) ** 2
+        if variance > best_variance:
+            best_variance, best_threshold = variance, level
+    return best_threshold
+
+
+def prepare_image(image):
+    # grayscale -> downscale -> binarize
+    from PIL import Image
+
+    image = image.convert("L")
+    if OCR_MAX_WIDTH and image.width > OCR_MAX_WIDTH:
+        height = max(1, int(image.height * OCR_MAX_WIDTH / image.width))
+        image = image.resize((OCR_MAX_WIDTH, height), Image.LANCZOS)
+    if OCR_BINARIZE:
+        threshold = _otsu_threshold(image.histogram())
+        image = image.point(lambda p: 255 if p > threshold else 0)
+    return image
+
+
+def ocr_image(image_path: str) -> Optional[str]:
+    # runs in the pool processes, None if tesseract timed out
+    import pytesseract
+    from PIL import Image
+
+    with Image.open(image_path) as image:
+        prepared = prepare_image(image)
+    try:
+        text = pytesseract.image_to_string(prepared, config=TESSERACT_CONFIG, timeout=OCR_TIMEOUT_SECONDS)
+    except RuntimeError as e:
+        # pytesseract raises RuntimeError when the timeout kills tesseract
+        print(f"OCR timed out on {image_path}: {e}")
+        return None
+    return text.strip()
+
+
+def _init_ocr_process() -> None:
+    # the pool already gives us the parallelism, tesseracts own threads would only fight over the cores
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _pool_size() -> int:
+    return OCR_WORKERS if OCR_WORKERS > 0 else (os.cpu_count() or 1)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    # kept for the life of the worker process
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=_pool_size(),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_ocr_process
+        )
+        atexit.register(_pool.shutdown, cancel_futures=True)
+    return _pool
+
+
+# pages submitted while they were rendered, by path and content so a re-rendered page is not mistaken for them
+# iter_ocr takes them out again, what a job leaves behind (ocr stage skipped, failed or cancelled) is dropped by
+# discard_prefetched when the job ends
+_prefetched: Dict[tuple, Future] = {}
+_prefetched_lock = threading.Lock()
+
+
+def _file_key(image_path: str) -> tuple:
+    return (os.path.abspath(image_path), hash_file(image_path))
+
+
+def ocr_cache_key(image_path: str) -> str:
+    # the image content and every setting that changes what tesseract returns for it
+    return slide_cache.cache_key("ocr", hash_file(image_path), TESSERACT_CONFIG, OCR_MAX_WIDTH, OCR_BINARIZE)
+
+
+def _cached(text: str) -> Future:
+    future = Future()
+    future.set_result(text)
+    return future
+
+
+def prefetch_ocr(image_path: str) -> None:
+    # start recognizing a page now, the next iter_ocr over it takes the result instead of submitting it again
+    if slide_cache.get_text(ocr_cache_key(image_path)) is not None:
+        return
+    key = _file_key(image_path)
+    with _prefetched_lock:
+        if key not in _prefetched:
+            _prefetched[key] = _get_pool().submit(ocr_image, image_path)
+
+
+def discard_prefetched(directory: str) -> int:
+    # cancels / forgets the prefetched pages below directory (a job directory), returns how many there were
+    directory = os.path.join(os.path.abspath(directory), "")
+    with _prefetched_lock:
+        keys = [key for key in _prefetched if key[0].startswith(directory)]
+        futures = [_prefetched.pop(key) for key in keys]
+    for future in futures:
+        future.cancel()
+    return len(futures)
+
+
+def _submit(image_path: str) -> Tuple[Future, bool]:
+    # (future of the text, whether it came from the cache)
+    text = slide_cache.get_text(ocr_cache_key(image_path))
+    if text is not None:
+        return _cached(text), True
+    key = _file_key(image_path)
+    with _prefetched_lock:
+        future = _prefetched.pop(key, None)
+    return future or _get_pool().submit(ocr_image, image_path), False
+
+
+def iter_ocr(image_paths: Iterable[str]) -> Iterator[Tuple[str, Optional[str]]]:
+    # (path, text) in the order of image_paths, a page that failed gives (path, None) and the rest carry on
+    # an image that was ocr'd before (in any job) comes straight from the slide cache
+    image_paths = list(image_paths)
+    if not image_paths:
+        return
+    submitted = [_submit(path) for path in image_paths]
+    for path, (future, from_cache) in zip(image_paths, submitted):
+        try:
+            text = future.result()
+        except Exception as e:
+            print(f"OCR failed for {path}: {e}")
+            text = None
+        if text is not None and not from_cache:
+            slide_cache.put_text(ocr_cache_key(path), text)
+        yield path, text
+    slide_cache.trim()
@@ -0,0 +1,132 @@
+# checkpointed pipeline stages
+# every stage declares the files it reads and writes, before running it we hash the inputs and look at the
+# stored record in job_stages: if the stage finished before with the same input hash and its outputs are
+# still there unchanged, it is skipped. so a job that failed in ocr resumes there instead of redoing whisper
+
+import asyncio
+import hashlib
+import inspect
+import json
+import os
+from datetime import datetime
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+from sqlalchemy.orm import Session
+
+from .database import JobStage
+
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# (path, size, mtime) -> sha256, the same file is often the output of one stage and the input of the next
+_file_hash_cache: Dict[tuple, str] = {}
+
+
+def hash_file(path: str) -> str:
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _file_hash_cache:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        _file_hash_cache[key] = digest.hexdigest()
+    return _file_hash_cache[key]
+
+
+def hash_paths(paths: Iterable[str], params: Optional[Dict[str, Any]] = None) -> str:
+    # one hash over the contents of all paths (in order) and the stage parameters
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        digest.update(hash_file(path).encode() if os.path.isfile(path) else b"missing")
+    if params:
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+PathList = Union[List[str], Callable[[], List[str]]]
+
+
+def _resolve(paths: PathList) -> List[str]:
+    # outputs that are only known after the stage ran (e.g. slide images) are given as a callable
+    return list(paths()) if callable(paths) else list(paths)
+
+
+class StageRunner:
+
+    def __init__(self, db: Session, job_id: str):
+        self.db = db
+        self.job_id = job_id
+
+    def _record(self, name: str) -> JobStage:
+        record = self.db.get(JobStage, (self.job_id, name))
+        if record is None:
+            record = JobStage(job_id=self.job_id, name=name, status="pending")
+            self.db.add(record)
+        return record
+
+    @staticmethod
+    def _outputs_unchanged(stored: Optional[tuple], input_hash: str, output_paths: List[str]) -> bool:
+        # stored is (status, input_hash, output_hash) of the last run
+        if stored is None or stored[0] != "done" or stored[1] != input_hash:
+            return False
+        if not output_paths or not all(os.path.exists(path) for path in output_paths):
+            return False
+        return stored[2] == hash_paths(output_paths)
+
+    async def run(
+        self,
+        name: str,
+        inputs: PathList,
+        outputs: PathList,
+        fn: Callable[[], Any],
+        params: Optional[Dict[str, Any]] = None,
+        executor: Optional[Executor] = None
+    ) -> bool:
+        # runs fn unless the stage is current, returns True if it ran
+        # with an executor fn runs there (blocking work), otherwise in the loop (fn may return a coroutine)
+        # hashing big files happens in a thread so a concurrent branch of the job keeps going
+        input_hash = await asyncio.to_thread(hash_paths, _resolve(inputs), params)
+        # plain values, the session itself stays in this thread
+        record = self.db.get(JobStage, (self.job_id, name))
+        stored = (record.status, record.input_hash, record.output_hash) if record else None
+        if await asyncio.to_thread(self._outputs_unchanged, stored, input_hash, _resolve(outputs)):
+            print(f"Stage {name}: inputs unchanged, skipping")
+            return False
+
+        record = self._record(name)
+        record.status = "running"
+        record.input_hash = input_hash
+        record.output_hash = None
+        record.error = None
+        record.updated_at = datetime.utcnow()
+        self.db.commit()
+
+        try:
+            if executor is not None:
+                await asyncio.get_running_loop().run_in_executor(executor, fn)
+            else:
+                result = fn()
+                if inspect.isawaitable(result):
+                    await result
+        except BaseException as e:
+            record.status = "error"
+            record.error = str(e) or e.__class__.__name__
+            record.updated_at = datetime.utcnow()
+            self.db.commit()
+            raise
+
+        record.status = "done"
+        record.output_hash = await asyncio.to_thread(hash_paths, _resolve(outputs))
+        record.updated_at = datetime.utcnow()
+        self.db.commit()
+        print(f"Stage {name}: done")
+        return True
+
+    def statuses(self) -> Dict[str, str]:
+        return {
+            record.name: record.status
+            for record in self.db.query(JobStage).filter(JobStage.job_id == self.job_id).all()
+        }
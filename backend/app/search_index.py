@@ -0,0 +1,313 @@
+# full text search index for transcripts and slides
+# a separate sqlite file next to contextclip.db with an fts5 index over every transcript segment and slide text
+# of finished jobs. a job is (re)indexed when it finishes, so /search is one bm25 ranked index lookup instead of
+# reading every jobs files on every query
+#
+#   python -m app.search_index     reindexes every finished job (e.g. after upgrading an existing install)
+
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .database import DB_PATH
+from . import segments_store
+
+
+SEARCH_DB_PATH = os.getenv("CONTEXTCLIP_SEARCH_DB", str(DB_PATH.with_name("contextclip_search.db")))
+# best hits looked at per query, grouped into at most max_jobs results
+SEARCH_MAX_HITS = int(os.getenv("CONTEXTCLIP_SEARCH_MAX_HITS", "500"))
+
+# autoincrement: the ids are also the vector ids of semantic_index, a deleted id must never come back as another row
+DOCUMENTS_TABLE = """
+CREATE TABLE IF NOT EXISTS {name} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    kind TEXT NOT NULL,          -- segment / slide
+    speaker TEXT,
+    start REAL,
+    end REAL,
+    ref TEXT,                    -- slide filename
+    text TEXT NOT NULL
+);
+"""
+
+SCHEMA = DOCUMENTS_TABLE.format(name="documents") + """
+CREATE INDEX IF NOT EXISTS ix_documents_job_id ON documents (job_id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    text,
+    content='documents',
+    content_rowid='id',
+    tokenize='porter unicode61 remove_diacritics 2'
+);
+
+-- keeps the fts index in step with the documents table
+CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+    INSERT INTO documents_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+
+CREATE TABLE IF NOT EXISTS indexed_jobs (
+    job_id TEXT PRIMARY KEY,
+    created_at TEXT,
+    duration REAL,
+    indexed_at TEXT
+);
+"""
+
+_schema_ready = False
+
+
+def _migrate_documents_autoincrement(conn: sqlite3.Connection) -> None:
+    # search dbs made before the documents ids were autoincrement: copy the rows (ids kept, so the fts index and
+    # the vectors stay valid) into a table created from SCHEMA
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'documents'").fetchone()
+    if row is None or "AUTOINCREMENT" in row["sql"].upper():
+        return
+    print("Migrating search index documents table to autoincrement ids")
+    # dropping the old table drops its index and triggers too, SCHEMA recreates them after the copy
+    conn.executescript(
+        "BEGIN;"
+        + DOCUMENTS_TABLE.format(name="documents_new")
+        + """
+        INSERT INTO documents_new SELECT id, job_id, kind, speaker, start, end, ref, text FROM documents;
+        DROP TABLE documents;
+        ALTER TABLE documents_new RENAME TO documents;
+        COMMIT;
+        """
+    )
+
+
+def connect() -> sqlite3.Connection:
+    global _schema_ready
+    conn = sqlite3.connect(SEARCH_DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    if not _schema_ready:
+        conn.execute("PRAGMA journal_mode=WAL")
+        _migrate_documents_autoincrement(conn)
+        conn.executescript(SCHEMA)
+        _schema_ready = True
+    return conn
+
+
+def load_job_documents(storage_path: str) -> List[Dict]:
+    # segments and slide texts of a finished job, as rows for the documents table
+    documents = []
+    if segments_store.has_segments(storage_path):
+        segments = segments_store.read_segments(storage_path).to_pydict()
+        for start, end, speaker, text in zip(segments["start"], segments["end"], segments["speaker"], segments["text"]):
+            if text and text.strip():
+                documents.append({
+                    "kind": "segment",
+                    "speaker": speaker,
+                    "start": start,
+                    "end": end,
+                    "ref": None,
+                    "text": text
+                })
+
+    slide_texts_path = os.path.join(storage_path, "slide_texts.json")
+    if os.path.exists(slide_texts_path):
+        with open(slide_texts_path, 'r', encoding='utf-8') as f:
+            for slide in json.load(f):
+                if slide.get("text", "").strip():
+                    documents.append({
+                        "kind": "slide",
+                        "speaker": None,
+                        "start": None,
+                        "end": None,
+                        "ref": slide.get("filename"),
+                        "text": slide["text"]
+                    })
+    return documents
+
+
+def index_job(job_id: str, created_at: Optional[datetime], documents: List[Dict]) -> None:
+    # replaces whatever was indexed for the job before, in one transaction
+    durations = [doc["end"] for doc in documents if doc["kind"] == "segment" and doc["end"] is not None]
+    conn = connect()
+    try:
+        with conn:
+            conn.execute("DELETE FROM documents WHERE job_id = ?", (job_id,))
+            conn.executemany(
+                "INSERT INTO documents (job_id, kind, speaker, start, end, ref, text) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(job_id, doc["kind"], doc["speaker"], doc["start"], doc["end"], doc["ref"], doc["text"]) for doc in documents]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO indexed_jobs (job_id, created_at, duration, indexed_at) VALUES (?, ?, ?, ?)",
+                (job_id, created_at.isoformat() if created_at else None, max(durations) if durations else None, datetime.utcnow().isoformat())
+            )
+    finally:
+        conn.close()
+
+
+def index_job_files(job_id: str, created_at: Optional[datetime], storage_path: str) -> int:
+    documents = load_job_documents(storage_path)
+    index_job(job_id, created_at, documents)
+    return len(documents)
+
+
+def document_ids(job_id: str, kind: Optional[str] = None) -> List[int]:
+    # ids of a jobs documents in insertion order (= segment order), used as vector ids by semantic_index
+    conn = connect()
+    try:
+        if kind:
+            rows = conn.execute("SELECT id FROM documents WHERE job_id = ? AND kind = ? ORDER BY id", (job_id, kind))
+        else:
+            rows = conn.execute("SELECT id FROM documents WHERE job_id = ? ORDER BY id", (job_id,))
+        return [row["id"] for row in rows]
+    finally:
+        conn.close()
+
+
+def get_documents(ids: List[int]) -> Dict[int, sqlite3.Row]:
+    if not ids:
+        return {}
+    conn = connect()
+    try:
+        placeholders = ",".join("?" * len(ids))
+        rows = conn.execute(
+            f"""
+            SELECT d.*, j.created_at AS job_created_at FROM documents d
+            LEFT JOIN indexed_jobs j ON j.job_id = d.job_id
+            WHERE d.id IN ({placeholders})
+            """,
+            list(ids)
+        )
+        return {row["id"]: row for row in rows}
+    finally:
+        conn.close()
+
+
+def remove_job(job_id: str) -> None:
+    # takes the job out of the full text index and its segment vectors out of the semantic index
+    from . import semantic_index  # imports this module
+
+    segment_ids = document_ids(job_id, kind="segment")
+    conn = connect()
+    try:
+        with conn:
+            conn.execute("DELETE FROM documents WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM indexed_jobs WHERE job_id = ?", (job_id,))
+    finally:
+        conn.close()
+    semantic_index.remove_vectors(segment_ids)
+
+
+def build_match_query(query: str) -> Optional[str]:
+    # user input -> fts5 query: every word has to appear, as a prefix (closest to the old substring search)
+    # quoting each token keeps fts5 syntax characters in the input from being interpreted
+    tokens = re.findall(r"\w+", query.lower())
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def format_timestamp(seconds: float) -> str:
+    return f"{int(seconds // 60):02d}:{int(seconds % 60):02d}"
+
+
+def search_documents(match: str, limit: int, kind: Optional[str] = None, conn: Optional[sqlite3.Connection] = None) -> List[sqlite3.Row]:
+    # best bm25 hits for an fts5 match query (see build_match_query), with a highlighted snippet each
+    own_conn = conn is None
+    conn = conn or connect()
+    try:
+        return conn.execute(
+            f"""
+            SELECT d.id, d.job_id, d.kind, d.speaker, d.start, d.ref, d.text,
+                   snippet(documents_fts, 0, '<mark>', '</mark>', '…', 16) AS snippet,
+                   bm25(documents_fts) AS rank
+            FROM documents_fts
+            JOIN documents d ON d.id = documents_fts.rowid
+            WHERE documents_fts MATCH ? {"AND d.kind = ?" if kind else ""}
+            ORDER BY rank
+            LIMIT ?
+            """,
+            (match, kind, limit) if kind else (match, limit)
+        ).fetchall()
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def search(query: str, max_jobs: int = 20, max_hits: int = SEARCH_MAX_HITS) -> List[Dict]:
+    # bm25 ranked hits, grouped per job in the shape /search always returned
+    match = build_match_query(query)
+    if not match:
+        return []
+
+    conn = connect()
+    try:
+        rows = search_documents(match, max_hits, conn=conn)
+
+        results: Dict[str, Dict] = {}
+        for row in rows:
+            result = results.get(row["job_id"])
+            if result is None:
+                result = results[row["job_id"]] = {
+                    "job_id": row["job_id"],
+                    "score": 0.0,
+                    "matching_segments": [],
+                    "total_matches": 0
+                }
+            # bm25() is lower = better
+            score = -row["rank"]
+            if row["kind"] == "segment":
+                result["score"] += score
+                result["total_matches"] += 1
+                result["matching_segments"].append({
+                    "timestamp": format_timestamp(row["start"] or 0.0),
+                    "speaker": row["speaker"],
+                    "text": row["text"],
+                    "snippet": row["snippet"],
+                    "score": score,
+                    "start_time": row["start"]
+                })
+            else:
+                score *= 2  # Boost slide matches
+                result["score"] += score
+                result.setdefault("matching_slides", []).append({
+                    "filename": row["ref"],
+                    "text": row["text"],
+                    "snippet": row["snippet"],
+                    "score": score
+                })
+
+        ranked = sorted(results.values(), key=lambda r: r["score"], reverse=True)[:max_jobs]
+        if not ranked:
+            return []
+
+        job_ids = [r["job_id"] for r in ranked]
+        placeholders = ",".join("?" * len(job_ids))
+        jobs_info = {
+            row["job_id"]: row for row in conn.execute(
+                f"SELECT job_id, created_at, duration FROM indexed_jobs WHERE job_id IN ({placeholders})", job_ids
+            )
+        }
+        for result in ranked:
+            info = jobs_info.get(result["job_id"])
+            result["created_at"] = info["created_at"] if info else None
+            if info and info["duration"] is not None:
+                result["meeting_duration"] = f"{info['duration']:.1f} seconds"
+            result["matching_segments"] = result["matching_segments"][:5]  # Top 5 matches per job
+        return ranked
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    from .database import SessionLocal, Job
+
+    db = SessionLocal()
+    try:
+        jobs = db.query(Job).filter(Job.status == "done").all()
+        for job in jobs:
+            count = index_job_files(job.id, job.created_at, f"storage/{job.id}")
+            print(f"Indexed job {job.id}: {count} documents")
+    finally:
+        db.close()
@@ -0,0 +1,140 @@
+# columnar storage of transcript segments
+# segments are kept as an arrow ipc file (storage/{job_id}/segments.arrow): start/end float64, speaker dictionary
+# encoded (a meeting has a handful of speakers repeated over thousands of rows), text utf8. readers memory map the
+# file and only touch the columns they ask for, so the status endpoint reading speaker + end doesnt parse any text.
+# segments.csv is still accepted for jobs from before and served by /job/{job_id}/segments.csv for old clients
+#
+#   python -m app.segments_store [--remove-csv]     converts the segments.csv of every existing job
+
+import io
+import os
+import sys
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+SEGMENTS_FILE = "segments.arrow"
+LEGACY_SEGMENTS_FILE = "segments.csv"
+
+SCHEMA = pa.schema([
+    ("start", pa.float64()),
+    ("end", pa.float64()),
+    ("speaker", pa.dictionary(pa.int32(), pa.string())),
+    ("text", pa.string()),
+])
+
+
+def segments_path(storage_path: str) -> str:
+    return os.path.join(storage_path, SEGMENTS_FILE)
+
+
+def has_segments(storage_path: str) -> bool:
+    return (
+        os.path.exists(os.path.join(storage_path, SEGMENTS_FILE))
+        or os.path.exists(os.path.join(storage_path, LEGACY_SEGMENTS_FILE))
+    )
+
+
+def segments_table(segments: List[Dict]) -> pa.Table:
+    # segments = [{"start", "end", "speaker", "text"}, ...]
+    return pa.table({
+        "start": pa.array([float(s.get("start", 0.0)) for s in segments], type=pa.float64()),
+        "end": pa.array([float(s.get("end", 0.0)) for s in segments], type=pa.float64()),
+        "speaker": pa.array([str(s.get("speaker", "SPEAKER_00")) for s in segments], type=pa.string()).dictionary_encode(),
+        "text": pa.array([str(s.get("text", "")) for s in segments], type=pa.string()),
+    }).cast(SCHEMA)
+
+
+def _table_from_dataframe(segments_df: pd.DataFrame) -> pa.Table:
+    segments_df = segments_df.reindex(columns=["start", "end", "speaker", "text"])
+    segments_df = segments_df.fillna({"start": 0.0, "end": 0.0, "speaker": "SPEAKER_00", "text": ""})
+    return segments_table(segments_df.to_dict("records"))
+
+
+def write_segments_table(table: pa.Table, path: str) -> None:
+    # write + rename, a reader never maps half a file
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def write_segments_dataframe(segments_df: pd.DataFrame, path: str) -> None:
+    write_segments_table(_table_from_dataframe(segments_df), path)
+
+
+def read_segments(storage_path: str, columns: Optional[Sequence[str]] = None) -> pa.Table:
+    # memory mapped, zero copy: only the requested columns are ever paged in
+    path = os.path.join(storage_path, SEGMENTS_FILE)
+    if os.path.exists(path):
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        return table.select(list(columns)) if columns else table
+
+    legacy_path = os.path.join(storage_path, LEGACY_SEGMENTS_FILE)
+    if os.path.exists(legacy_path):
+        table = _table_from_dataframe(pd.read_csv(legacy_path))
+        return table.select(list(columns)) if columns else table
+
+    raise FileNotFoundError(f"No segments in {storage_path}")
+
+
+def read_segments_df(storage_path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    # plain dataframe (speaker as strings, not categorical) for code written against the old csv
+    segments_df = read_segments(storage_path, columns).to_pandas()
+    if "speaker" in segments_df.columns:
+        segments_df["speaker"] = segments_df["speaker"].astype(str)
+    return segments_df
+
+
+def speakers(storage_path: str) -> List[str]:
+    # from the dictionary of the speaker column, in order of first appearance
+    column = read_segments(storage_path, ["speaker"]).column("speaker")
+    return [speaker for speaker in pc.unique(column.cast(pa.string())).to_pylist() if speaker is not None]
+
+
+def duration(storage_path: str) -> Optional[float]:
+    return pc.max(read_segments(storage_path, ["end"]).column("end")).as_py()
+
+
+def segments_csv(storage_path: str) -> bytes:
+    # the old segments.csv layout, for clients that still parse csv
+    buffer = io.StringIO()
+    read_segments_df(storage_path).to_csv(buffer, index=False)
+    return buffer.getvalue().encode("utf-8")
+
+
+def migrate_job(storage_path: str, remove_csv: bool = False) -> bool:
+    # segments.csv -> segments.arrow, True if something was converted
+    legacy_path = os.path.join(storage_path, LEGACY_SEGMENTS_FILE)
+    path = os.path.join(storage_path, SEGMENTS_FILE)
+    if not os.path.exists(legacy_path):
+        return False
+    converted = False
+    if not os.path.exists(path):
+        write_segments_dataframe(pd.read_csv(legacy_path), path)
+        converted = True
+    if remove_csv:
+        os.remove(legacy_path)
+    return converted
+
+
+if __name__ == "__main__":
+    remove_csv = "--remove-csv" in sys.argv[1:]
+    storage_root = "storage"
+    converted = 0
+    for job_id in sorted(os.listdir(storage_root)) if os.path.isdir(storage_root) else []:
+        job_path = os.path.join(storage_root, job_id)
+        if job_id.startswith(".") or not os.path.isdir(job_path):
+            continue
+        try:
+            if migrate_job(job_path, remove_csv=remove_csv):
+                converted += 1
+                print(f"Converted segments of job {job_id}")
+        except Exception as e:
+            print(f"Failed to convert segments of job {job_id}: {e}")
+    print(f"Converted {converted} jobs")
@@ -0,0 +1,238 @@
+# semantic search over transcript segments
+# segments are embedded on cpu with sentence-transformers after transcription (the "embeddings" stage writes
+# storage/{job_id}/embeddings.npy as float16) and added to one faiss index on disk when the job finishes.
+# vector ids are the row ids of the segments in the full text index (search_index.documents), so a hit maps
+# straight back to job, speaker and time and a job can be replaced or removed by its ids.
+#
+# small collections live in a flat fp16 index (exact search, no training), once it grows past IVF_MIN_VECTORS
+# it is rebuilt as an int8 IVF index. workers change the index under a file lock and write it back with a rename,
+# the api process memory maps it read only and reopens it when the file changes
+
+import fcntl
+import math
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .database import DB_PATH
+from . import search_index
+from .model_registry import registry
+
+
+EMBEDDING_MODEL_NAME = os.getenv("CONTEXTCLIP_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_MODEL_SIZE_MB = 100
+EMBED_BATCH_SIZE = int(os.getenv("CONTEXTCLIP_EMBED_BATCH_SIZE", "64"))
+VECTOR_INDEX_PATH = os.getenv("CONTEXTCLIP_VECTOR_INDEX", str(DB_PATH.with_name("contextclip_vectors.faiss")))
+IVF_MIN_VECTORS = int(os.getenv("CONTEXTCLIP_IVF_MIN_VECTORS", "100000"))
+IVF_NPROBE = int(os.getenv("CONTEXTCLIP_IVF_NPROBE", "16"))
+# reciprocal rank fusion constant for hybrid search
+RRF_K = 60
+
+
+def is_available() -> bool:
+    try:
+        import faiss  # noqa: F401
+        import sentence_transformers  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_embedder():
+    def load():
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
+    return registry.get(("embedder", EMBEDDING_MODEL_NAME), load, size_mb=EMBEDDING_MODEL_SIZE_MB)
+
+
+def embed_texts(texts: Sequence[str]) -> np.ndarray:
+    # unit length float32 vectors, so inner product = cosine similarity
+    if not texts:
+        return np.zeros((0, get_embedder().get_sentence_embedding_dimension()), dtype=np.float32)
+    vectors = get_embedder().encode(
+        list(texts),
+        batch_size=EMBED_BATCH_SIZE,
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False
+    )
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def write_embeddings(texts: Sequence[str], embeddings_path: str) -> None:
+    # float16 on disk, half the size and plenty for cosine similarity
+    vectors = embed_texts(texts).astype(np.float16)
+    tmp_path = f"{embeddings_path}.tmp.npy"
+    np.save(tmp_path, vectors)
+    os.replace(tmp_path, embeddings_path)
+
+
+# --- writer side (worker processes) ---
+
+@contextmanager
+def _index_lock():
+    os.makedirs(os.path.dirname(VECTOR_INDEX_PATH) or ".", exist_ok=True)
+    with open(f"{VECTOR_INDEX_PATH}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _flat_index(dim: int):
+    import faiss
+    return faiss.IndexIDMap2(faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT))
+
+
+def _ivf_index(vectors: np.ndarray, ids: np.ndarray):
+    import faiss
+    dim = vectors.shape[1]
+    nlist = max(1, int(4 * math.sqrt(len(vectors))))
+    quantizer = faiss.IndexFlatIP(dim)
+    index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    index.train(vectors)
+    index.add_with_ids(vectors, ids)
+    return index
+
+
+def _all_vectors(index) -> Tuple[np.ndarray, np.ndarray]:
+    # (vectors, ids) of the flat index
+    import faiss
+    ids = faiss.vector_to_array(index.id_map).astype(np.int64)
+    vectors = index.index.reconstruct_n(0, index.index.ntotal)
+    return vectors, ids
+
+
+def _is_ivf(index) -> bool:
+    import faiss
+    return isinstance(index, faiss.IndexIVF)
+
+
+def update_job(old_ids: Sequence[int], new_ids: Sequence[int], vectors: Optional[np.ndarray]) -> int:
+    # replaces the vectors of a job: old_ids are removed, the rows of vectors are added as new_ids
+    # returns the number of vectors in the index
+    import faiss
+
+    if vectors is not None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if len(vectors) != len(new_ids):
+            raise ValueError(f"Got {len(vectors)} vectors for {len(new_ids)} ids")
+        if len(vectors) == 0:
+            vectors = None
+
+    with _index_lock():
+        index = faiss.read_index(VECTOR_INDEX_PATH) if os.path.exists(VECTOR_INDEX_PATH) else None
+        if index is None and vectors is None:
+            return 0
+        if index is None:
+            index = _flat_index(vectors.shape[1])
+
+        if old_ids:
+            index.remove_ids(np.asarray(old_ids, dtype=np.int64))
+        if vectors is not None:
+            index.add_with_ids(vectors, np.asarray(new_ids, dtype=np.int64))
+
+        if not _is_ivf(index) and index.ntotal >= IVF_MIN_VECTORS:
+            print(f"Vector index reached {index.ntotal} vectors, rebuilding it as IVF")
+            index = _ivf_index(*_all_vectors(index))
+
+        tmp_path = f"{VECTOR_INDEX_PATH}.tmp"
+        faiss.write_index(index, tmp_path)
+        os.replace(tmp_path, VECTOR_INDEX_PATH)
+        return index.ntotal
+
+
+def remove_vectors(ids: Sequence[int]) -> int:
+    # drops the vectors of a removed job, returns the number of vectors left in the index
+    if not ids or not os.path.exists(VECTOR_INDEX_PATH):
+        return 0
+    return update_job(ids, [], None)
+
+
+# --- reader side (api process) ---
+
+_reader = None
+_reader_mtime = None
+_reader_lock = threading.Lock()
+
+
+def _get_reader():
+    # the index memory mapped read only, reopened when a worker replaced the file
+    global _reader, _reader_mtime
+    import faiss
+
+    if not os.path.exists(VECTOR_INDEX_PATH):
+        return None
+    mtime = os.stat(VECTOR_INDEX_PATH).st_mtime_ns
+    with _reader_lock:
+        if _reader is None or mtime != _reader_mtime:
+            try:
+                _reader = faiss.read_index(VECTOR_INDEX_PATH, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                # index types without mmap support are read into memory
+                _reader = faiss.read_index(VECTOR_INDEX_PATH)
+            if _is_ivf(_reader):
+                _reader.nprobe = IVF_NPROBE
+            _reader_mtime = mtime
+        return _reader
+
+
+def search_vectors(query: str, k: int) -> List[Tuple[int, float]]:
+    # (document id, cosine similarity) of the k nearest segments
+    index = _get_reader()
+    if index is None or index.ntotal == 0:
+        return []
+    scores, ids = index.search(embed_texts([query]), k)
+    return [(int(doc_id), float(score)) for doc_id, score in zip(ids[0], scores[0]) if doc_id != -1]
+
+
+def fuse_rankings(rankings: Dict[str, List[int]], k: int = RRF_K) -> List[Tuple[int, float]]:
+    # reciprocal rank fusion: every ranking adds 1 / (k + rank) for each document in it
+    fused: Dict[int, float] = {}
+    for ranking in rankings.values():
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def semantic_search(query: str, k: int = 10, hybrid: bool = False) -> List[Dict]:
+    # top k segments by meaning, with hybrid the vector ranking is fused with the bm25 ranking of search_index
+    candidates = k * 4 if hybrid else k
+    vector_hits = search_vectors(query, candidates)
+    semantic_scores = dict(vector_hits)
+    keyword_scores: Dict[int, float] = {}
+
+    if hybrid:
+        rankings = {"semantic": [doc_id for doc_id, _ in vector_hits]}
+        match = search_index.build_match_query(query)
+        if match:
+            rows = search_index.search_documents(match, candidates, kind="segment")
+            rankings["keyword"] = [row["id"] for row in rows]
+            keyword_scores = {row["id"]: -row["rank"] for row in rows}
+        ranked = fuse_rankings(rankings)[:k]
+    else:
+        ranked = vector_hits[:k]
+
+    documents = search_index.get_documents([doc_id for doc_id, _ in ranked])
+    results = []
+    for doc_id, score in ranked:
+        doc = documents.get(doc_id)
+        if doc is None:
+            # the job was reindexed after the index file we are reading was written
+            continue
+        results.append({
+            "job_id": doc["job_id"],
+            "created_at": doc["job_created_at"],
+            "timestamp": search_index.format_timestamp(doc["start"] or 0.0),
+            "start_time": doc["start"],
+            "speaker": doc["speaker"],
+            "text": doc["text"],
+            "score": score,
+            "semantic_score": semantic_scores.get(doc_id),
+            "keyword_score": keyword_scores.get(doc_id)
+        })
+    return results
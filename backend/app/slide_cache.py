@@ -0,0 +1,158 @@
+# content addressed cache for slide work, shared by all jobs (and worker processes) on this machine
+# the same deck gets uploaded for meeting after meeting, so the native text of a deck, its rendered pages and
+# the ocr text of an image are kept under the sha256 of what they were made from (+ the settings that matter).
+# entries are plain files, written to a temp name and renamed into place, reads touch the mtime so trim()
+# can drop the least recently used ones once the cache is over its size limit.
+# rendered pages are hard linked into the job directories, an image that a job still links to takes no space
+# of its own: the limit bounds what only the cache holds, those images dont count and are not evicted (removing
+# the cache name wouldnt free anything). they count again once their jobs are deleted
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Any, Optional
+
+
+CACHE_DIR = os.getenv("CONTEXTCLIP_CACHE_DIR", os.path.join("storage", ".cache"))
+# disk space held only by the cache, see above for files shared with jobs
+CACHE_MAX_MB = float(os.getenv("CONTEXTCLIP_CACHE_MAX_MB", "2048"))
+CACHE_ENABLED = os.getenv("CONTEXTCLIP_CACHE", "1") != "0"
+
+
+def cache_key(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _entry_path(kind: str, key: str, suffix: str) -> str:
+    return os.path.join(CACHE_DIR, kind, key[:2], key + suffix)
+
+
+def _touch(path: str) -> None:
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def _write_atomic(path: str, write) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _link_or_copy(src: str, dest: str) -> None:
+    # a hard link costs nothing, both names are only ever replaced and never written in place
+    if os.path.exists(dest):
+        os.remove(dest)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+def get_text(key: str) -> Optional[str]:
+    if not CACHE_ENABLED:
+        return None
+    path = _entry_path("ocr", key, ".txt")
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+    except FileNotFoundError:
+        return None
+    _touch(path)
+    return text
+
+
+def put_text(key: str, text: str) -> None:
+    if CACHE_ENABLED:
+        _write_atomic(_entry_path("ocr", key, ".txt"), lambda f: f.write(text.encode('utf-8')))
+
+
+def get_json(key: str) -> Optional[Any]:
+    if not CACHE_ENABLED:
+        return None
+    path = _entry_path("json", key, ".json")
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            value = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    _touch(path)
+    return value
+
+
+def put_json(key: str, value: Any) -> None:
+    if CACHE_ENABLED:
+        _write_atomic(_entry_path("json", key, ".json"), lambda f: f.write(json.dumps(value).encode('utf-8')))
+
+
+def has_image(key: str) -> bool:
+    return CACHE_ENABLED and os.path.exists(_entry_path("images", key, ".png"))
+
+
+def get_image(key: str, dest_path: str) -> bool:
+    # puts the cached image at dest_path, False on a miss
+    if not CACHE_ENABLED:
+        return False
+    path = _entry_path("images", key, ".png")
+    try:
+        _link_or_copy(path, dest_path)
+    except FileNotFoundError:
+        return False
+    _touch(path)
+    return True
+
+
+def put_image(key: str, image_path: str) -> None:
+    if not CACHE_ENABLED:
+        return
+    path = _entry_path("images", key, ".png")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    _link_or_copy(image_path, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def trim(max_mb: float = CACHE_MAX_MB) -> None:
+    # drops least recently used entries until the cache fits in max_mb, entries linked into a job are left alone
+    if not CACHE_ENABLED or not os.path.isdir(CACHE_DIR):
+        return
+    entries = []
+    total = 0
+    for root, _, filenames in os.walk(CACHE_DIR):
+        for filename in filenames:
+            if filename.endswith(".tmp"):
+                continue
+            path = os.path.join(root, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if stat.st_nlink > 1:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+    limit = max_mb * 1024 * 1024
+    if total <= limit:
+        return
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    print(f"Slide cache trimmed: removed {removed} entries, {total / (1024 * 1024):.0f}MB left")
@@ -0,0 +1,101 @@
+# native text of slide decks
+# most pdfs have a text layer and pptx slides keep their text in the shapes, reading that is far cheaper and
+# more accurate than rendering the page and running tesseract on it. only pages that come back (nearly) empty
+# (scanned pdfs, slides that are just a screenshot) need the render + ocr path
+
+import os
+import re
+import subprocess
+import tempfile
+from typing import List, Optional
+
+
+# pages with fewer letters/digits than this in their native text are ocr'd instead
+NATIVE_TEXT_MIN_CHARS = int(os.getenv("CONTEXTCLIP_NATIVE_TEXT_MIN_CHARS", "20"))
+LIBREOFFICE_TIMEOUT_SECONDS = float(os.getenv("CONTEXTCLIP_LIBREOFFICE_TIMEOUT", "300"))
+
+
+def needs_ocr(text: Optional[str]) -> bool:
+    if not text:
+        return True
+    return sum(ch.isalnum() for ch in text) < NATIVE_TEXT_MIN_CHARS
+
+
+def _clean(text: str) -> str:
+    # pdftotext -layout pads columns with runs of spaces
+    lines = [re.sub(r"[ \t]+", " ", line).strip() for line in text.splitlines()]
+    return "\n".join(line for line in lines if line)
+
+
+def pdf_page_count(pdf_path: str) -> int:
+    from pdf2image import pdfinfo_from_path
+    return int(pdfinfo_from_path(pdf_path)["Pages"])
+
+
+def extract_pdf_text(pdf_path: str, page_count: int) -> List[str]:
+    # text of every page, one pdftotext run for the whole file, pages are separated by form feeds
+    try:
+        result = subprocess.run(
+            ["pdftotext", "-layout", "-enc", "UTF-8", pdf_path, "-"],
+            check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"pdftotext failed for {pdf_path}, all pages go to ocr: {e}")
+        return [""] * page_count
+
+    pages = [_clean(page) for page in result.stdout.decode("utf-8", errors="ignore").split("\f")]
+    # the output ends with a form feed, so there is one empty piece too many
+    pages = pages[:page_count]
+    return pages + [""] * (page_count - len(pages))
+
+
+def _shape_texts(shapes) -> List[str]:
+    texts = []
+    for shape in shapes:
+        if shape.has_text_frame and shape.text_frame.text:
+            texts.append(shape.text_frame.text)
+        elif getattr(shape, "has_table", False) and shape.has_table:
+            for row in shape.table.rows:
+                texts.append(" ".join(cell.text for cell in row.cells if cell.text))
+        elif hasattr(shape, "shapes"):
+            # group shapes
+            texts.extend(_shape_texts(shape.shapes))
+    return texts
+
+
+def extract_pptx_text(ppt_path: str) -> Optional[List[str]]:
+    # text of every slide, None if python-pptx cant read the file (old binary .ppt)
+    try:
+        from pptx import Presentation
+        presentation = Presentation(ppt_path)
+    except Exception as e:
+        print(f"python-pptx cant read {ppt_path}: {e}")
+        return None
+    # hidden slides are left out, like LibreOffice leaves them out of the pdf
+    return [
+        _clean("\n".join(_shape_texts(slide.shapes)))
+        for slide in presentation.slides
+        if slide._element.get("show") != "0"
+    ]
+
+
+def convert_to_pdf(ppt_path: str, output_dir: str) -> str:
+    # LibreOffice renders the deck to a pdf, which is then handled like an uploaded pdf
+    os.makedirs(output_dir, exist_ok=True)
+    # own profile dir, two soffice instances sharing the default profile block each other
+    with tempfile.TemporaryDirectory(prefix="contextclip-lo-") as profile_dir:
+        cmd = [
+            "libreoffice",
+            f"-env:UserInstallation=file://{profile_dir}",
+            "--headless",
+            "--convert-to",
+            "pdf",
+            "--outdir",
+            output_dir,
+            ppt_path
+        ]
+        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=LIBREOFFICE_TIMEOUT_SECONDS)
+    pdf_path = os.path.join(output_dir, os.path.splitext(os.path.basename(ppt_path))[0] + ".pdf")
+    if not os.path.exists(pdf_path):
+        raise RuntimeError(f"LibreOffice did not produce {pdf_path}")
+    return pdf_path
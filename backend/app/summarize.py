@@ -5,9 +5,14 @@ from typing import Dict, List, Any, Optional
 from datetime import datetime
 import re
 from collections import Counter
+from contextlib import contextmanager
+import threading
 from typing import List
 from transformers import pipeline, AutoTokenizer, AutoModelForCausalLM
 
+from .model_registry import registry
+from . import segments_store
+
 
 try:
     from transformers import pipeline, AutoTokenizer, AutoModelForCausalLM
@@ -24,26 +29,54 @@ except ImportError:
     print("Warning: Transformers not avaible, please install requirements.txt")
 
 
+DEFAULT_MODEL_NAMES = {
+    "huggingface": "facebook/bart-large-cnn",
+    "openai": "gpt-3.5-turbo",
+}
+# how many requests may run generation on the same summarizer at once, the hf pipelines are cpu bound
+SUMMARIZER_CONCURRENCY = int(os.getenv("CONTEXTCLIP_SUMMARIZER_CONCURRENCY", "1"))
+# e.g. "huggingface" or "huggingface:facebook/bart-large-cnn,openai", loaded when the api starts
+PRELOAD_SUMMARIZERS = os.getenv("CONTEXTCLIP_PRELOAD_SUMMARIZERS", "")
+
+# long transcripts are summarized in windows (map) and then the window summaries are summarized (reduce)
+# 0 means derive the window size from the model
+SUMMARY_WINDOW_TOKENS = int(os.getenv("CONTEXTCLIP_SUMMARY_WINDOW_TOKENS", "0"))
+SUMMARY_BATCH_SIZE = int(os.getenv("CONTEXTCLIP_SUMMARY_BATCH_SIZE", "4"))
+MAP_SUMMARY_TOKENS = 200
+MAX_REDUCE_ROUNDS = 4
+# text generation: room for the answer, the prompt template around the transcript is measured (see _prompt_overhead_tokens)
+GENERATION_TOKENS = 300
+OPENAI_CONTEXT_TOKENS = 4096
+OPENAI_GENERATION_TOKENS = 500
+# special tokens, and line joins tokenizing a little differently than the lines on their own
+PROMPT_SAFETY_TOKENS = 32
+MAX_ACTION_ITEMS = 20
+
+
 class MeetingSummarizer:
     def __init__(self, model_type : str= "huggingface", model_name: str= None, open_ai_key: str=None):
         # initialisng the summerizer
         self.model_type = model_type
         self.model_name = model_name
         self.open_ai_key = open_ai_key
+        self._openai_client = None
 
         if model_type == "huggingface":
             if not HF_AVAILABLE:
                 raise ImportError("Transformers not avaiblable, install it using pip install transformers")
             
-            self.model_name = model_name or "facebook/bart-large-cnn"
+            self.model_name = model_name or DEFAULT_MODEL_NAMES["huggingface"]
             self._init_huggingface_model()
 
         elif model_type =="openai":
             if not OPEAI_AVAILABLE:
                 raise ImportError("OpenAI not available, install it using pip install openai")
-            self.model_name= model_name or "gpt-3.5-turbo"
-            if open_ai_key:
-                openai.api_key = open_ai_key
+            self.model_name= model_name or DEFAULT_MODEL_NAMES["openai"]
+            # client for the key the summarizer was made with (or OPENAI_API_KEY), a key sent with a request
+            # gets its own client in _generate_with_openai - never set on the openai module, the summarizers are
+            # shared by concurrent requests
+            if open_ai_key or os.getenv("OPENAI_API_KEY"):
+                self._openai_client = openai.OpenAI(api_key=open_ai_key)
         else:
             raise ValueError("model_type must be 'huggingface' or 'openai' ")
         
@@ -90,16 +123,14 @@ class MeetingSummarizer:
 
         # we give a DataFrame with columns ['start', 'end', 'speaker', 'text'] 
         # returns in a format, extracts the datetime, the speaker id and the text
-        formatted_segments = []
-        
-        for _, row in segments_df.iterrows():
-            timestamp = self._format_timestamp(row['start'])
-            speaker = row['speaker']
-            text = row['text'].strip()
-            
-            formatted_segments.append(f"[{timestamp}] {speaker}: {text}")
-        
-        return "\n".join(formatted_segments)
+        return "\n".join(self._prompt_lines(segments_df))
+    
+    def _prompt_lines(self, segments_df: pd.DataFrame) -> List[str]:
+        # one "[MM:SS] SPEAKER: text" line per segment, exactly as they go into the prompt
+        return [
+            f"[{self._format_timestamp(start)}] {speaker}: {str(text).strip()}"
+            for start, speaker, text in zip(segments_df['start'], segments_df['speaker'], segments_df['text'])
+        ]
     
     def _format_timestamp(self, seconds: float) -> str:
         # returns the formated time stamp for the prev fucn
@@ -169,8 +200,8 @@ class MeetingSummarizer:
         
     
 
-    def _convert_bart_to_structured(self, bart_summary: str, original_prompt: str) -> str:
-        # to convert the bart output to required format,if json was not extractable
+    def _extract_action_items(self, segments_df: pd.DataFrame) -> List[Dict[str, Any]]:
+        # keyword based action items straight from the segments of one window
 
         def extract_assignees(text: str) -> List[str]:
             # extract capitalized words or name patterns from action text as assignees
@@ -185,99 +216,283 @@ class MeetingSummarizer:
                     assignees.add(c)
             return list(assignees)
 
-        try:
-            action_items = []
-            segments_start = original_prompt.find('[00:')
-            segments_end = original_prompt.find('\n\nPlease analyze')
-            if segments_start != -1 and segments_end != -1:
-                segments_text = original_prompt[segments_start:segments_end]
-                lines = segments_text.split('\n')
-
+        action_keywords = [
+            'prepare', 'schedule', 'coordinate', 'by', 'next', 'demo', 'uat', 'update',
+            'notify', 'handle', 'can you', 'should we', 'action items are', 'prepares',
+            'coordinates', 'plan', 'assign', 'deliver', 'complete', 'review', 'follow up'
+        ]
+
+        action_items = []
+        for start, speaker, content in zip(segments_df['start'], segments_df['speaker'], segments_df['text']):
+            content = str(content).strip()
+            if not content or not any(keyword in content.lower() for keyword in action_keywords):
+                continue
+
+            # Extract assignees dynamically
+            assignees = extract_assignees(content)
+            assignee = assignees[0] if assignees else None
+
+            # Determine priority broadly
+            priority = "medium"
+            if re.search(r'\b(high priority|urgent|asap|immediately|by friday|deadline)\b', content.lower()):
+                priority = "high"
+            elif re.search(r'\b(low|whenever|later|no rush)\b', content.lower()):
+                priority = "low"
+
+            action_items.append({
+                "timestamp": self._format_timestamp(start),
+                "speaker": speaker,
+                "text": content[:150] + "…" if len(content) > 150 else content,
+                "assignee": assignee,
+                "priority": priority
+            })
+
+        return action_items
+
+    def _merge_action_items(self, chunks: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        # action items of all windows in meeting order, the same item said twice is kept once
+        merged = []
+        seen = set()
+        for items in chunks:
+            for item in items:
+                key = re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', '', str(item.get("text", "")).lower())).strip()
+                if not key or key in seen:
+                    continue
+                seen.add(key)
+                merged.append(item)
+        return merged[:MAX_ACTION_ITEMS]
+
+    def _summary_points(self, bart_summary: str) -> List[str]:
+        # Extract summary points by splitting on sentence boundaries
+        summary_points = []
+        if '. ' in bart_summary:
+            sentences = bart_summary.split('. ')
+            for sentence in sentences:
+                clean_sentence = sentence.strip().rstrip('.')
+                if clean_sentence and len(clean_sentence) > 10:
+                    summary_points.append(clean_sentence)
+        else:
+            summary_points = [bart_summary.strip()]
+
+        # If long single summary, break into logical parts by extracting keywords/topics
+        if len(summary_points) == 1 and len(summary_points[0]) > 150:
+            long_summary = summary_points[0]
+            # Extract candidate keywords/topics by simple noun phrases or by most common meaningful words
+            words = re.findall(r'\b\w+\b', long_summary.lower())
+            stopwords = {'and', 'the', 'is', 'in', 'of', 'to', 'with', 'a', 'for', 'on', 'by', 'this', 'are', 'we'}
+            filtered_words = [w for w in words if w not in stopwords and len(w) > 3]
+            common_words = [word for word, count in Counter(filtered_words).most_common(8)]
+            topics = [w.capitalize() for w in common_words]
             
-                action_keywords = [
-                    'prepare', 'schedule', 'coordinate', 'by', 'next', 'demo', 'uat', 'update',
-                    'notify', 'handle', 'can you', 'should we', 'action items are', 'prepares',
-                    'coordinates', 'plan', 'assign', 'deliver', 'complete', 'review', 'follow up'
-                ]
-
-                for line in lines:
-                    if ':' in line and any(keyword in line.lower() for keyword in action_keywords):
-                        try:
-                            timestamp = line.split(']')[0].replace('[', '') if '[' in line else "00:00"
-                            parts = line.split(':')
-                            if len(parts) >= 2:
-                                speaker_part = parts[0]
-                                if ']' in speaker_part:
-                                    speaker = speaker_part.split(']')[1].strip()
-                                else:
-                                    speaker = "UNKNOWN"
-                                content = ':'.join(parts[1:]).strip()
-                                
-                                # Extract assignees dynamically
-                                assignees = extract_assignees(content)
-                                assignee = assignees[0] if assignees else None
-
-                                # Determine priority broadly
-                                priority = "medium"
-                                if re.search(r'\b(high priority|urgent|asap|immediately|by friday|deadline)\b', content.lower()):
-                                    priority = "high"
-                                elif re.search(r'\b(low|whenever|later|no rush)\b', content.lower()):
-                                    priority = "low"
-
-                                action_items.append({
-                                    "timestamp": timestamp,
-                                    "speaker": speaker,
-                                    "text": content[:150] + "…" if len(content) > 150 else content,
-                                    "assignee": assignee,
-                                    "priority": priority
-                                })
-                        except Exception:
-                            continue
-
-            # Extract summary points by splitting on sentence boundaries
-            summary_points = []
-            if '. ' in bart_summary:
-                sentences = bart_summary.split('. ')
-                for sentence in sentences:
-                    clean_sentence = sentence.strip().rstrip('.')
-                    if clean_sentence and len(clean_sentence) > 10:
-                        summary_points.append(clean_sentence)
+            if topics:
+                summary_points = [f"Discussion covering: {topic}" for topic in topics]
             else:
-                summary_points = [bart_summary.strip()]
-
-            # If long single summary, break into logical parts by extracting keywords/topics
-            if len(summary_points) == 1 and len(summary_points[0]) > 150:
-                long_summary = summary_points[0]
-                # Extract candidate keywords/topics by simple noun phrases or by most common meaningful words
-                words = re.findall(r'\b\w+\b', long_summary.lower())
-                stopwords = {'and', 'the', 'is', 'in', 'of', 'to', 'with', 'a', 'for', 'on', 'by', 'this', 'are', 'we'}
-                filtered_words = [w for w in words if w not in stopwords and len(w) > 3]
-                common_words = [word for word, count in Counter(filtered_words).most_common(8)]
-                topics = [w.capitalize() for w in common_words]
-                
-                if topics:
-                    summary_points = [f"Discussion covering: {topic}" for topic in topics]
-                else:
-                    # fallback split by common conjunctions
-                    if ' and ' in long_summary:
-                        parts = [part.strip() for part in long_summary.split(' and ')]
-                        summary_points = [part for part in parts if len(part) > 20][:6]            
+                # fallback split by common conjunctions
+                if ' and ' in long_summary:
+                    parts = [part.strip() for part in long_summary.split(' and ')]
+                    summary_points = [part for part in parts if len(part) > 20][:6]            
+
+        # Limit number of summary points
+        return summary_points[:8]
+
+    # --- chunking, so long meetings are covered completely instead of truncated at the model window ---
+
+    def _count_tokens(self, texts: List[str]) -> List[int]:
+        # token counts with the model tokenizer, ~4 characters per token when we dont have one (openai)
+        tokenizer = getattr(self.generator, "tokenizer", None) if getattr(self, "generator", None) is not None else None
+        if tokenizer is None or not texts:
+            return [max(1, len(text) // 4) for text in texts]
+        return [len(ids) for ids in tokenizer(list(texts), add_special_tokens=False)["input_ids"]]
+
+    def _prompt_overhead_tokens(self) -> int:
+        # tokens of the prompt template without any transcript in it, measured once
+        if getattr(self, "_prompt_overhead", None) is None:
+            self._prompt_overhead = self._count_tokens([self._build_prompt("")])[0] + PROMPT_SAFETY_TOKENS
+        return self._prompt_overhead
+
+    def _window_tokens(self) -> int:
+        # how many transcript tokens go into one window
+        if SUMMARY_WINDOW_TOKENS:
+            return SUMMARY_WINDOW_TOKENS
+        if self.model_type == "openai":
+            return max(128, OPENAI_CONTEXT_TOKENS - self._prompt_overhead_tokens() - OPENAI_GENERATION_TOKENS)
+
+        model_limit = 1024
+        config = getattr(getattr(self.generator, "model", None), "config", None)
+        if config is not None and getattr(config, "max_position_embeddings", None):
+            model_limit = config.max_position_embeddings
+
+        if getattr(self, "model_type_pipeline", None) == "summarization":
+            return model_limit - 64
+        # text generation has to fit the prompt around the transcript and the generated tokens
+        return max(128, model_limit - self._prompt_overhead_tokens() - GENERATION_TOKENS)
+
+    def _window_lines(self, segments_df: pd.DataFrame) -> List[str]:
+        # the text of every segment as it will be sent to the model, so windows are measured on what is sent
+        if getattr(self, "model_type_pipeline", None) == "summarization":
+            return [str(text).strip() for text in segments_df['text']]
+        return self._prompt_lines(segments_df)
+
+    def _split_into_windows(self, segments_df: pd.DataFrame, max_tokens: int) -> List[pd.DataFrame]:
+        # packs whole speaker turns (consecutive segments of one speaker) into windows of at most max_tokens,
+        # a turn thats bigger than a window on its own is split between its segments
+        if len(segments_df) == 0:
+            return []
 
-            # Limit number of summary points and action items
-            summary_points = summary_points[:8]
-            action_items = action_items[:5]
+        # +1 for the newline between lines
+        line_tokens = [tokens + 1 for tokens in self._count_tokens(self._window_lines(segments_df))]
+
+        speakers = segments_df['speaker'].tolist()
+        turns = []  # (first row, last row + 1, tokens)
+        turn_start = 0
+        for i in range(1, len(speakers) + 1):
+            if i == len(speakers) or speakers[i] != speakers[turn_start]:
+                turns.append((turn_start, i, sum(line_tokens[turn_start:i])))
+                turn_start = i
+
+        windows = []
+        window_start, window_tokens = 0, 0
+        for first, last, tokens in turns:
+            if window_tokens and window_tokens + tokens > max_tokens:
+                windows.append((window_start, first))
+                window_start, window_tokens = first, 0
+
+            if tokens <= max_tokens:
+                window_tokens += tokens
+                continue
+
+            # oversized turn, cut it at segment boundaries
+            for row in range(first, last):
+                if window_tokens and window_tokens + line_tokens[row] > max_tokens:
+                    windows.append((window_start, row))
+                    window_start, window_tokens = row, 0
+                window_tokens += line_tokens[row]
+
+        windows.append((window_start, len(segments_df)))
+        return [segments_df.iloc[start:end] for start, end in windows if end > start]
+
+    def _window_plain_text(self, window_df: pd.DataFrame) -> str:
+        # bart gets plain sentences, timestamps and speaker ids only confuse it
+        return "\n".join(str(text).strip() for text in window_df['text'])
+
+    def _summarize_texts(self, texts: List[str], max_length: int, min_length: int) -> List[str]:
+        # one batched call through the summarization pipeline for all texts
+        results = self.generator(
+            texts,
+            max_length=max_length,
+            min_length=min_length,
+            do_sample=False,
+            length_penalty=0.8,  # Encourage longer summaries
+            num_beams=4,         # Better quality with beam search
+            truncation=True,
+            batch_size=SUMMARY_BATCH_SIZE
+        )
+        return [result['summary_text'] for result in results]
+
+    def _pack_texts(self, texts: List[str], max_tokens: int) -> List[str]:
+        # joins consecutive texts into groups that fit one window
+        groups = []
+        current, current_tokens = [], 0
+        for text, tokens in zip(texts, self._count_tokens(texts)):
+            if current and current_tokens + tokens > max_tokens:
+                groups.append("\n".join(current))
+                current, current_tokens = [], 0
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            groups.append("\n".join(current))
+        return groups
+
+    def _summarize_final(self, text: str) -> str:
+        # Calculate dynamic lengths for minimum 50% compression
+        input_token_count = self._count_tokens([text])[0]
+        min_summary_length = max(50, int(input_token_count * 0.5))
+        max_summary_length = max(min_summary_length + 50, int(input_token_count * 0.8))
+
+        # Ensure we don't exceed model limits
+        min_summary_length = min(min_summary_length, 400)
+        max_summary_length = min(max_summary_length, 600)
+
+        print(f"Final summary from {input_token_count} tokens, range: {min_summary_length}-{max_summary_length} tokens")
+        return self._summarize_texts([text], max_length=max_summary_length, min_length=min_summary_length)[0]
+
+    def _summarize_map_reduce_bart(self, windows: List[pd.DataFrame]) -> Dict[str, Any]:
+        max_tokens = self._window_tokens()
+        window_texts = [self._window_plain_text(window) for window in windows]
+
+        if len(windows) == 1:
+            # the whole meeting fits one window: a single pass with the full summary length, the short map
+            # summaries are only for windows that get reduced afterwards
+            final_text = self._summarize_final(window_texts[0])
+        else:
+            # map: every window summarized in one batch
+            window_lengths = self._count_tokens(window_texts)
+            map_max = max(64, min(MAP_SUMMARY_TOKENS, max(window_lengths) // 2))
+            summaries = self._summarize_texts(window_texts, max_length=map_max, min_length=min(30, map_max // 2))
+            print(f"Summarized {len(windows)} windows, reducing...")
+
+            # reduce: summarize the summaries until they fit one window
+            for _ in range(MAX_REDUCE_ROUNDS):
+                if len(summaries) == 1 or sum(self._count_tokens(summaries)) <= max_tokens:
+                    break
+                groups = self._pack_texts(summaries, max_tokens)
+                if len(groups) >= len(summaries):
+                    break
+                summaries = self._summarize_texts(groups, max_length=map_max, min_length=min(30, map_max // 2))
+
+            final_text = self._summarize_final("\n".join(summaries))
+
+        return {
+            "meeting_summary": self._summary_points(final_text),
+            "action_items": self._merge_action_items([self._extract_action_items(window) for window in windows])
+        }
 
-            structured_data = {
-                "meeting_summary": summary_points,
-                "action_items": action_items
-            }
+    def _summarize_map_reduce_prompted(self, windows: List[pd.DataFrame], open_ai_key: str = None) -> Dict[str, Any]:
+        # causal lm / openai: the json prompt per window, then bullets of all windows condensed in one more call
+        bullets = []
+        action_chunks = []
+        for window in windows:
+            prompt = self._build_prompt(self._format_segments_for_prompt(window))
+            parsed = self._parse_llm_response(self._generate(prompt, open_ai_key))
+            if not isinstance(parsed, dict):
+                parsed = {}
+            bullets.extend(point for point in parsed.get("meeting_summary", []) if isinstance(point, str))
+            items = parsed.get("action_items") or self._extract_action_items(window)
+            action_chunks.append([item for item in items if isinstance(item, dict)])
+
+        if len(windows) > 1 and len(bullets) > 8:
+            reduce_prompt = self._build_reduce_prompt(bullets)
+            reduced = self._parse_llm_response(self._generate(reduce_prompt, open_ai_key))
+            if isinstance(reduced, dict) and reduced.get("meeting_summary"):
+                bullets = reduced["meeting_summary"]
+
+        return {
+            "meeting_summary": bullets[:8],
+            "action_items": self._merge_action_items(action_chunks)
+        }
 
-            return json.dumps(structured_data, indent=2)
+    def _build_reduce_prompt(self, bullets: List[str]) -> str:
+        points = "\n".join(f"- {point}" for point in bullets)
+        return f"""The following bullet points summarize consecutive parts of one meeting:
+
+            {points}
+
+            Combine them into 3-5 concise bullet points covering the whole meeting.
+            Format your response as JSON with this structure:
+            {{
+                "meeting_summary": [
+                    "bullet point 1",
+                    "bullet point 2"
+                ]
+            }}
+
+            Response:"""
+
+    def _generate(self, prompt: str, open_ai_key: str = None) -> str:
+        if self.model_type == "huggingface":
+            return self._generate_with_huggingface(prompt)
+        return self._generate_with_openai(prompt, open_ai_key)
 
-        except Exception as e:
-            print(f"Error converting BART output: {e}")
-            return f'{{"meeting_summary": ["{bart_summary}"], "action_items": []}}'
-    
     def _generate_with_huggingface(self, prompt: str) -> str:
 
         # we already defined generator using the pipeline method, and now just using it if it exists
@@ -285,73 +500,50 @@ class MeetingSummarizer:
             return self._create_mock_summary_from_transcript(prompt)
         
         try:
-            if getattr(self, 'model_type_pipeline', 'text-generation') == "summarization":
-                # Use BART for summarization
-                # Extract just the transcript content for BART
-                segments_start = prompt.find('[00:')
-                segments_end = prompt.find('\n\nPlease analyze')
-                if segments_start != -1 and segments_end != -1:
-                    transcript_text = prompt[segments_start:segments_end]
-                    # Convert to plain text for BART
-                    plain_text = transcript_text.replace('[', '').replace(']', '').replace('SPEAKER_00:', '').replace('SPEAKER_01:', '').replace('SPEAKER_02:', '')
-                else:
-                    plain_text = prompt[:500]  # Fallback
-                
-                # Calculate dynamic lengths for minimum 50% compression
-                input_word_count = len(plain_text.split())
-                min_summary_length = max(50, int(input_word_count * 0.5))  # Minimum 50% of original length
-                max_summary_length = max(min_summary_length + 50, int(input_word_count * 0.8))  # Up to 80% for detailed summaries
-                
-                # Ensure we don't exceed model limits
-                min_summary_length = min(min_summary_length, 400)
-                max_summary_length = min(max_summary_length, 600)
-                
-                print(f"Input length: {input_word_count} words, Summary range: {min_summary_length}-{max_summary_length} words")
-                
-                # Generate summary with BART using dynamic lengths
-                summary_result = self.generator(
-                    plain_text, 
-                    max_length=max_summary_length, 
-                    min_length=min_summary_length, 
-                    do_sample=False,
-                    length_penalty=0.8,  # Encourage longer summaries
-                    num_beams=4         # Better quality with beam search
-                )
-                bart_summary = summary_result[0]['summary_text']
-                
-                # Convert BART output to our JSON format
-                return self._convert_bart_to_structured(bart_summary, prompt)
+            # Use text generation, the window already keeps the prompt inside the model limit
+            outputs = self.generator(
+                prompt,
+                max_new_tokens=GENERATION_TOKENS,
+                num_return_sequences=1,
+                temperature=0.7,
+                do_sample=True,
+                return_full_text=False
+            )
             
-            else:
-                # Use text generation
-                outputs = self.generator(
-                    prompt,
-                    max_length=len(prompt) + 200,
-                    num_return_sequences=1,
-                    temperature=0.7,
-                    do_sample=True
-                )
-                
-                # Extract generated text (remove the input prompt)
-                generated_text = outputs[0]['generated_text']
-                response = generated_text[len(prompt):].strip()
-                
-                return response
+            # only the generated part, the prompt is not returned
+            return outputs[0]['generated_text'].strip()
             
         except Exception as e:
             print(f"Error generating with Hugging Face model: {e}")
             return self._create_mock_summary_from_transcript(prompt)
     
-    def _generate_with_openai(self, prompt: str) -> str:
+    def _create_mock_summary_from_transcript(self, prompt: str) -> str:
+        # no model, or generation failed (e.g. the prompt didnt fit): an answer in the json shape the prompt asks for,
+        # the longest statements of the transcript in the prompt as bullet points. action items are left empty,
+        # the callers fill them in with the keyword extraction
+        statements = re.findall(r"^\s*\[\d+:\d{2}\] [^:\n]+: (.+)$", prompt, flags=re.MULTILINE)
+        longest = sorted(range(len(statements)), key=lambda i: len(statements[i]), reverse=True)[:5]
+        bullets = []
+        for i in sorted(longest):
+            sentence = re.split(r"(?<=[.!?])\s", statements[i].strip(), maxsplit=1)[0]
+            if sentence:
+                bullets.append(sentence)
+        return json.dumps({"meeting_summary": bullets, "action_items": []})
+    
+    def _generate_with_openai(self, prompt: str, open_ai_key: str = None) -> str:
         """Generate response using OpenAI API."""
         try:
-            response = openai.ChatCompletion.create(
+            # summarizers are shared between requests, so the key comes with the call
+            client = openai.OpenAI(api_key=open_ai_key) if open_ai_key else self._openai_client
+            if client is None:
+                raise ValueError("No OpenAI API key, pass openai_api_key or set OPENAI_API_KEY")
+            response = client.chat.completions.create(
                 model=self.model_name,
                 messages=[
                     {"role": "system", "content": "You are a helpful assistant that analyzes meeting transcripts and provides concise summaries and action items."},
                     {"role": "user", "content": prompt}
                 ],
-                max_tokens=500,
+                max_tokens=OPENAI_GENERATION_TOKENS,
                 temperature=0.7
             )
             
@@ -359,26 +551,29 @@ class MeetingSummarizer:
             
         except Exception as e:
             print(f"Error generating with OpenAI: {e}")
-            return "Error: Could not generate summary with OpenAI API."
+            return self._create_mock_summary_from_transcript(prompt)
         
-    def summarize_transcript(self, segments_df: pd.DataFrame) -> Dict[str, Any]:
+    def summarize_transcript(self, segments_df: pd.DataFrame, open_ai_key: str = None) -> Dict[str, Any]:
         # generate summary
         print(f"Generating summary using {self.model_type} model...")
         
-        # Format segments for prompt
-        segments_text = self._format_segments_for_prompt(segments_df)
-        
-        # Build complete prompt
-        prompt = self._build_prompt(segments_text)
-        
-        # Generate response based on model type
-        if self.model_type == "huggingface":
-            response = self._generate_with_huggingface(prompt)
-        else:  # openai
-            response = self._generate_with_openai(prompt)
-        
-        # Parse response
-        summary_data = self._parse_llm_response(response)
+        if self.model_type == "huggingface" and self.generator is None:
+            # mock path, no model to chunk for
+            prompt = self._build_prompt(self._format_segments_for_prompt(segments_df))
+            summary_data = self._parse_llm_response(self._generate_with_huggingface(prompt))
+            if not isinstance(summary_data, dict):
+                summary_data = {}
+            if not summary_data.get("action_items"):
+                summary_data["action_items"] = self._extract_action_items(segments_df)
+        else:
+            # windows that fit the model, summarized separately and then combined (map-reduce)
+            windows = self._split_into_windows(segments_df, self._window_tokens())
+            print(f"Split {len(segments_df)} segments into {len(windows)} windows")
+            
+            if getattr(self, "model_type_pipeline", None) == "summarization":
+                summary_data = self._summarize_map_reduce_bart(windows)
+            else:
+                summary_data = self._summarize_map_reduce_prompted(windows, open_ai_key)
         
         # Add metadata
         summary_data.update({
@@ -391,29 +586,59 @@ class MeetingSummarizer:
         
         return summary_data
     
-def summarize_meeting(job_id: str, model_type: str = "huggingface", openai_api_key: str = None) -> Dict[str, Any]:
+# summarizers are kept in the model registry so the pipeline is loaded once per process,
+# each one gets a semaphore so concurrent requests queue up instead of fighting over the cpu
+_summarizer_slots: Dict[tuple, threading.BoundedSemaphore] = {}
+_summarizer_slots_lock = threading.Lock()
+
+def _summarizer_key(model_type: str, model_name: Optional[str]) -> tuple:
+    if model_type not in DEFAULT_MODEL_NAMES:
+        raise ValueError("model_type must be 'huggingface' or 'openai' ")
+    return ("summarizer", model_type, model_name or DEFAULT_MODEL_NAMES[model_type])
+
+def get_summarizer(model_type: str = "huggingface", model_name: str = None) -> MeetingSummarizer:
+    # lazily loads the summarizer the first time its asked for, then reuses it
+    key = _summarizer_key(model_type, model_name)
+    return registry.get(key, lambda: MeetingSummarizer(model_type=model_type, model_name=key[2]))
+
+@contextmanager
+def summarizer_slot(model_type: str = "huggingface", model_name: str = None):
+    key = _summarizer_key(model_type, model_name)
+    with _summarizer_slots_lock:
+        slot = _summarizer_slots.setdefault(key, threading.BoundedSemaphore(max(1, SUMMARIZER_CONCURRENCY)))
+    with slot:
+        yield
+
+def preload_summarizers(spec: str = PRELOAD_SUMMARIZERS) -> None:
+    # spec is a comma separated list of model_type or model_type:model_name
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        model_type, _, model_name = entry.partition(":")
+        try:
+            get_summarizer(model_type, model_name or None)
+        except Exception as e:
+            print(f"Could not preload summarizer {entry}: {e}")
+
+def summarize_meeting(job_id: str, model_type: str = "huggingface", openai_api_key: str = None, model_name: str = None) -> Dict[str, Any]:
         
         # Main function to generate meeting summary for a job.
         
         # Path to segments file
-        segments_path = f"storage/{job_id}/segments.csv"
+        job_storage_path = f"storage/{job_id}"
         summary_path = f"storage/{job_id}/summary.json"
         
-        if not os.path.exists(segments_path):
-            raise FileNotFoundError(f"Segments file not found: {segments_path}")
+        if not segments_store.has_segments(job_storage_path):
+            raise FileNotFoundError(f"Segments file not found in {job_storage_path}")
         
         # Load transcript segments
-        print(f"Loading transcript segments from: {segments_path}")
-        segments_df = pd.read_csv(segments_path)
+        print(f"Loading transcript segments from: {job_storage_path}")
+        segments_df = segments_store.read_segments_df(job_storage_path)
         
-        # Initialize summarizer
-        summarizer = MeetingSummarizer(
-            model_type=model_type,
-            openai_api_key=openai_api_key
-        )
+        # shared summarizer, loaded on first use
+        summarizer = get_summarizer(model_type, model_name)
         
         # Generate summary
-        summary_data = summarizer.summarize_transcript(segments_df)
+        with summarizer_slot(model_type, model_name):
+            summary_data = summarizer.summarize_transcript(segments_df, open_ai_key=openai_api_key)
         
         # Save summary to file
         print(f"Saving summary to: {summary_path}")
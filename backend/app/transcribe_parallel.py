@@ -0,0 +1,166 @@
+# chunked transcription for long recordings on cpu
+# the preprocessed wav is cut at quiet spots (simple energy based voice activity detection), the chunks are
+# transcribed by a pool of processes that each hold their own cpu int8 whisper model, and the segments are
+# stitched back together with the chunk offsets added to their timestamps
+# alignment and diarization still run once on the merged result (see workers.transcribe_with_whisperx)
+
+import atexit
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .audio import SAMPLE_RATE, load_pcm_int16
+
+
+# "auto" = only on cpu for recordings longer than CHUNKED_MIN_SECONDS, "1" = always, "0" = never
+CHUNKED_TRANSCRIPTION = os.getenv("CONTEXTCLIP_CHUNKED_TRANSCRIPTION", "auto")
+CHUNKED_MIN_SECONDS = float(os.getenv("CONTEXTCLIP_CHUNKED_MIN_SECONDS", "600"))
+CHUNK_TARGET_SECONDS = float(os.getenv("CONTEXTCLIP_CHUNK_SECONDS", "300"))
+# how far around the target cut we look for a pause (at most a quarter of the target, see find_chunk_boundaries)
+CHUNK_SEARCH_SECONDS = 30.0
+# threads each transcription process gives ctranslate2, processes = cores / threads unless set
+TRANSCRIBE_THREADS = int(os.getenv("CONTEXTCLIP_TRANSCRIBE_THREADS", "2"))
+TRANSCRIBE_PROCS = int(os.getenv("CONTEXTCLIP_TRANSCRIBE_PROCS", "0"))
+
+FRAME_MS = 30
+# smoothing of the frame energy, so a cut lands in a real pause and not between two syllables
+SMOOTH_MS = 300
+
+
+def use_chunked_transcription(device: str, duration: float) -> bool:
+    if CHUNKED_TRANSCRIPTION == "1":
+        return True
+    if CHUNKED_TRANSCRIPTION == "0":
+        return False
+    return device == "cpu" and duration >= CHUNKED_MIN_SECONDS and _pool_size() > 1
+
+
+def _pool_size() -> int:
+    if TRANSCRIBE_PROCS > 0:
+        return TRANSCRIBE_PROCS
+    return max(1, (os.cpu_count() or 1) // max(1, TRANSCRIBE_THREADS))
+
+
+def _frame_energy(samples: np.ndarray, frame_len: int) -> np.ndarray:
+    # mean square energy per frame, computed in blocks so a long memmapped file isnt converted at once
+    frame_count = len(samples) // frame_len
+    energy = np.empty(frame_count, dtype=np.float32)
+    block_frames = 20000
+    for first in range(0, frame_count, block_frames):
+        last = min(frame_count, first + block_frames)
+        block = np.asarray(samples[first * frame_len:last * frame_len], dtype=np.float32)
+        energy[first:last] = np.mean(block.reshape(-1, frame_len) ** 2, axis=1)
+    return energy
+
+
+def find_chunk_boundaries(
+    samples: np.ndarray,
+    target_seconds: float = CHUNK_TARGET_SECONDS,
+    search_seconds: float = CHUNK_SEARCH_SECONDS,
+    sample_rate: int = SAMPLE_RATE
+) -> List[Tuple[int, int]]:
+    # (start sample, end sample) of every chunk, cut in the quietest spot near each multiple of target_seconds
+    if target_seconds <= 0:
+        raise ValueError(f"Chunk target must be positive, got {target_seconds}s (CONTEXTCLIP_CHUNK_SECONDS)")
+    # a search window wider than the target could put a cut before the previous one
+    search_seconds = min(search_seconds, target_seconds / 4)
+    total = len(samples)
+    frame_len = sample_rate * FRAME_MS // 1000
+    if total <= (target_seconds + search_seconds) * sample_rate or total < frame_len:
+        return [(0, total)]
+
+    energy = _frame_energy(samples, frame_len)
+    smooth_frames = max(1, SMOOTH_MS // FRAME_MS)
+    smoothed = np.convolve(energy, np.ones(smooth_frames, dtype=np.float32) / smooth_frames, mode="same")
+
+    frames_per_second = 1000 / FRAME_MS
+    target_frames = max(1, int(target_seconds * frames_per_second))
+    search_frames = min(int(search_seconds * frames_per_second), target_frames // 4)
+
+    cuts = []
+    position = 0
+    while position + target_frames + search_frames < len(smoothed):
+        # low > position, so every cut moves forward and the loop ends
+        low = position + target_frames - search_frames
+        high = position + target_frames + search_frames
+        cut = low + int(np.argmin(smoothed[low:high + 1]))
+        cuts.append(cut * frame_len)
+        position = cut
+
+    bounds = [0] + cuts + [total]
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+# --- runs inside the transcription processes ---
+
+def _init_chunk_process(threads: int) -> None:
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    # load the model now, so the first chunk doesnt pay for it
+    from .workers import get_whisperx_model
+    get_whisperx_model("cpu", "int8", threads=threads)
+
+
+def _transcribe_chunk(audio_path: str, start: int, end: int, batch_size: int) -> Tuple[List[Dict], Optional[str]]:
+    from .workers import get_whisperx_model, WHISPERX_TRANSCRIBE_OPTIONS
+
+    model = get_whisperx_model("cpu", "int8", threads=TRANSCRIBE_THREADS)
+    # only this chunk is read from the memory map
+    audio = np.asarray(load_pcm_int16(audio_path)[start:end], dtype=np.float32) / 32768.0
+    result = model.transcribe(audio, batch_size=batch_size, **WHISPERX_TRANSCRIBE_OPTIONS)
+
+    offset = start / SAMPLE_RATE
+    segments = []
+    for segment in result.get("segments", []):
+        segment = dict(segment)
+        segment["start"] = segment.get("start", 0.0) + offset
+        segment["end"] = segment.get("end", 0.0) + offset
+        segments.append(segment)
+    return segments, result.get("language")
+
+
+# --- parent side ---
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    # kept for the life of the worker process, so the chunk models are loaded once and not per job
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=_pool_size(),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_chunk_process,
+            initargs=(TRANSCRIBE_THREADS,)
+        )
+        atexit.register(_pool.shutdown, cancel_futures=True)
+    return _pool
+
+
+def transcribe_chunked(audio_path: str, batch_size: int = 16) -> Dict:
+    # same shape as model.transcribe(): {"segments": [...], "language": ...}
+    samples = load_pcm_int16(audio_path)
+    chunks = find_chunk_boundaries(samples)
+    print(f"Transcribing {len(samples) / SAMPLE_RATE:.0f}s of audio in {len(chunks)} chunks on {_pool_size()} processes")
+
+    pool = _get_pool()
+    futures = [pool.submit(_transcribe_chunk, audio_path, start, end, batch_size) for start, end in chunks]
+
+    segments = []
+    languages = Counter()
+    for future in futures:
+        chunk_segments, language = future.result()
+        segments.extend(chunk_segments)
+        if language:
+            languages[language] += len(chunk_segments) or 1
+
+    language = languages.most_common(1)[0][0] if languages else "en"
+    return {"segments": segments, "language": language}
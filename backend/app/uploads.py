@@ -0,0 +1,162 @@
+# resumable chunked uploads for big media files
+# initiate creates the job and preallocates the media file, parts are PUT at an offset and written
+# straight into that file, the received byte ranges are kept in a small state file next to it so a
+# client can ask what arrived and resend only the missing parts
+
+import fcntl
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+
+UPLOAD_STATE_FILE = ".upload.json"
+
+
+def _state_path(media_dir: str) -> str:
+    return os.path.join(media_dir, UPLOAD_STATE_FILE)
+
+
+def media_filename(filename: str) -> str:
+    # the client's file name without directories, renamed if it would be the state file (or its .tmp) or
+    # not a file name at all
+    filename = os.path.basename(filename)
+    if filename in ("", ".", ".."):
+        return "media"
+    if filename.startswith(UPLOAD_STATE_FILE):
+        return f"media{filename}"
+    return filename
+
+
+def init_upload(media_dir: str, filename: str, size: int) -> Dict:
+    # creates the (preallocated) target file and the upload state
+    os.makedirs(media_dir, exist_ok=True)
+    filename = media_filename(filename)
+    media_path = os.path.join(media_dir, filename)
+
+    fd = os.open(media_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if size > 0:
+            try:
+                # reserves the blocks up front, so parts dont fragment the file and a full disk fails now
+                os.posix_fallocate(fd, 0, size)
+            except (AttributeError, OSError):
+                os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+    state = {
+        "filename": filename,
+        "media_path": media_path,
+        "size": size,
+        "received": []  # sorted, non overlapping [start, end) ranges
+    }
+    save_upload_state(media_dir, state)
+    return state
+
+
+def load_upload_state(media_dir: str) -> Optional[Dict]:
+    path = _state_path(media_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_upload_state(media_dir: str, state: Dict) -> None:
+    # write + rename so a crash never leaves half a state file behind
+    path = _state_path(media_dir)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def _state_lock(media_dir: str):
+    # parts of one upload arrive in parallel (and maybe in different api processes), the state is only changed
+    # under this lock
+    with open(f"{_state_path(media_dir)}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def record_received_range(media_dir: str, start: int, end: int) -> Optional[Dict]:
+    # marks [start, end) as received, reading the state again inside the lock so ranges recorded by other parts
+    # in the meantime are kept. returns the new state, None if the upload is gone
+    with _state_lock(media_dir):
+        state = load_upload_state(media_dir)
+        if state is not None and end > start:
+            add_received_range(state, start, end)
+            save_upload_state(media_dir, state)
+        return state
+
+
+def add_received_range(state: Dict, start: int, end: int) -> None:
+    ranges = sorted(state["received"] + [[start, end]])
+    merged: List[List[int]] = []
+    for range_start, range_end in ranges:
+        if merged and range_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], range_end)
+        else:
+            merged.append([range_start, range_end])
+    state["received"] = merged
+
+
+def received_bytes(state: Dict) -> int:
+    return sum(end - start for start, end in state["received"])
+
+
+def contiguous_bytes(state: Dict) -> int:
+    # how much of the file is there from the beginning, i.e. what a reader could already consume
+    ranges = state["received"]
+    if ranges and ranges[0][0] == 0:
+        return ranges[0][1]
+    return 0
+
+
+def missing_ranges(state: Dict) -> List[List[int]]:
+    missing = []
+    position = 0
+    for start, end in state["received"]:
+        if start > position:
+            missing.append([position, start])
+        position = max(position, end)
+    if position < state["size"]:
+        missing.append([position, state["size"]])
+    return missing
+
+
+def is_complete(state: Dict) -> bool:
+    return contiguous_bytes(state) >= state["size"]
+
+
+async def write_part(media_path: str, offset: int, chunks: AsyncIterator[bytes], size: int) -> tuple:
+    # writes the incoming chunks at offset without buffering the part in memory
+    # returns (bytes written, sha256 hex of the part)
+    digest = hashlib.sha256()
+    written = 0
+    fd = os.open(media_path, os.O_WRONLY)
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            if offset + written + len(chunk) > size:
+                raise ValueError("Part goes past the declared file size")
+            os.pwrite(fd, chunk, offset + written)
+            digest.update(chunk)
+            written += len(chunk)
+    finally:
+        os.close(fd)
+    return written, digest.hexdigest()
+
+
+def finish_upload(media_dir: str) -> None:
+    path = _state_path(media_dir)
+    for leftover in (path, f"{path}.lock"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
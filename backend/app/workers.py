@@ -5,18 +5,97 @@ import time
 import os
 import json
 import pandas as pd
-import ffmpeg
 from sqlalchemy.orm import Session
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Callable
 from pathlib import Path
 import subprocess
+import re
+import tempfile
 
 
 from .database import SessionLocal, Job
+from .model_registry import registry
+from .audio import SAMPLE_RATE, probe_audio, is_transcriber_ready, decode_to_wav, load_pcm, is_pcm_wav, audio_duration
+from .transcribe_parallel import use_chunked_transcription, transcribe_chunked
+from .ocr import iter_ocr, prefetch_ocr, discard_prefetched
+from .slide_text import NATIVE_TEXT_MIN_CHARS, needs_ocr, pdf_page_count, extract_pdf_text, extract_pptx_text, convert_to_pdf
+from .pipeline import StageRunner, hash_file
+from . import slide_cache, search_index, semantic_index, segments_store, manifest, events, file_serving
+from concurrent.futures import ThreadPoolExecutor
+
+
+WHISPER_MODEL_NAME = os.getenv("CONTEXTCLIP_WHISPER_MODEL", "small")
+# rough sizes for models the registry cant measure itself (ctranslate2 / pyannote)
+WHISPERX_MODEL_SIZE_MB = 1000
+DIARIZATION_MODEL_SIZE_MB = 500
+# passed to model.transcribe for whole files and for chunks alike
+WHISPERX_TRANSCRIBE_OPTIONS = dict(
+    multilingual=True,
+    max_new_tokens=128,
+    clip_timestamps=None,
+    hallucination_silence_threshold=0.1,
+    hotwords=None
+)
+
+
+# the audio branch (whisper) and the slide branch (rendering + ocr) of a job run at the same time, each on its own
+# executor. threads are enough here, the heavy parts (ctranslate2/torch, tesseract, poppler) dont hold the GIL.
+# the executors belong to one job: cancelling the job cant stop a whisper/ocr call already running in a thread,
+# so the next job gets new threads instead of queueing behind what the cancelled one left running
+def make_job_executors(job_id: str):
+    audio_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"contextclip-audio-{job_id[:8]}")
+    slides_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"contextclip-slides-{job_id[:8]}")
+    return audio_executor, slides_executor
+
+# pdf rendering: pages per pdftoppm call and pdftoppm processes per call, memory stays flat with the deck size
+PDF_DPI = 200
+PDF_BATCH_PAGES = int(os.getenv("CONTEXTCLIP_PDF_BATCH_PAGES", "8"))
+PDF_RENDER_THREADS = int(os.getenv("CONTEXTCLIP_PDF_RENDER_THREADS", "2"))
+
+
+def set_stage(db: Session, job: Job, stage: str, progress: float = 0.0) -> None:
+    job.stage = stage
+    job.progress = progress
+    db.commit()
+    events.publish(job.id, "stage", stage=stage, progress=progress)
+
+def publish_new_artifacts(job: Job, before) -> None:
+    # an "artifact" event for everything in job.artifacts that wasnt in before
+    for name, url in (job.artifacts or {}).items():
+        if name not in before:
+            events.publish(job.id, "artifact", name=name, url=url)
+
+def update_manifest(db: Session, job: Job, job_storage_path: str, parts) -> None:
+    # a stage finished, make what it produced visible to the status endpoint (and the event streams)
+    before = dict(job.artifacts or {})
+    manifest.refresh_manifest(job, job_storage_path, parts)
+    db.commit()
+    publish_new_artifacts(job, before)
+
+class ProgressReporter:
+    # turns a 0-1 fraction of the current stage into job.progress, throttled so we dont commit on every ffmpeg line
+
+    def __init__(self, db: Session, job: Job, start: float, end: float, min_interval: float = 1.0):
+        self.db = db
+        self.job = job
+        self.start = start
+        self.end = end
+        self.min_interval = min_interval
+        self._last_report = 0.0
+
+    def __call__(self, fraction: float) -> None:
+        now = time.monotonic()
+        if fraction < 1.0 and now - self._last_report < self.min_interval:
+            return
+        self._last_report = now
+        self.job.progress = round(self.start + (self.end - self.start) * fraction, 3)
+        self.db.commit()
+        events.publish(self.job.id, "progress", stage=self.job.stage, progress=self.job.progress)
 
 
 async def process_job(job_id: str):
     db= SessionLocal()
+    audio_executor, slides_executor = make_job_executors(job_id)
     try:
 
         job = db.query(Job).filter(Job.id == job_id).first()
@@ -27,72 +106,69 @@ async def process_job(job_id: str):
         print(f"Starting processing for job {job_id}")
         job.status = "processing"
         db.commit()
+        events.publish(job_id, "status", status=job.status, stage=job.stage, progress=job.progress or 0.0)
         
-        # Processing the audio file
-        if job.media_path:
+        # every step is a checkpointed stage, a resubmitted job skips what is already done (see pipeline.py)
+        stages = StageRunner(db, job_id)
+        job_storage_path = f"storage/{job_id}"
+        processed_audio_path = f"{job_storage_path}/processed_audio.wav"
+        transcript_path = f"{job_storage_path}/transcript.json"
+        segments_path = segments_store.segments_path(job_storage_path)
+        slide_texts_path = f"{job_storage_path}/slide_texts.json"
+        slide_links_path = f"{job_storage_path}/slide_links.json"
+        embeddings_path = f"{job_storage_path}/embeddings.npy"
+        
+        async def audio_branch():
+            # extract audio -> preprocess it -> transcribe + diarize -> segments
+            if not job.media_path:
+                return
             try:
-                # extract audio -> preprocess it -> transcribe + diarize -> give output
                 print(f"Processing media file: {job.media_path}")
-                processed_audio_path = await preprocess_audio(job.media_path, job_id)
-                print(f"Audio preprocessing completed: {processed_audio_path}")
-                
-                transcript_data = await transcribe_and_diarize(processed_audio_path, job_id)
-                print(f"Transcription completed, got {len(transcript_data.get('segments', []))} segments")
-                
-                # saving segments and transcript
-                
-                job_storage_path = f"storage/{job_id}"
-                transcript_path = f"{job_storage_path}/transcript.json"
-                segments_path = f"{job_storage_path}/segments.csv"
-                
-                with open(transcript_path, 'w', encoding='utf-8') as f:
-                    json.dump(transcript_data, f, indent=2, ensure_ascii=False)
-                print(f"Saved transcript to {transcript_path}")
+                set_stage(db, job, "preprocessing", 0.0)
+                await stages.run(
+                    "preprocess_audio",
+                    inputs=[job.media_path],
+                    outputs=[processed_audio_path],
+                    fn=lambda: preprocess_audio(
+                        job.media_path, job_id,
+                        on_progress=ProgressReporter(db, job, 0.0, 0.2)
+                    )
+                )
+                # preprocessing falls back to the original file if ffmpeg cant handle it
+                audio_path = processed_audio_path if os.path.exists(processed_audio_path) else job.media_path
                 
-                segments_df = create_segments_dataframe(transcript_data)
-                segments_df.to_csv(segments_path, index=False)
-                print(f"Saved segments to {segments_path}")
+                set_stage(db, job, "transcribing", 0.2)
+                await stages.run(
+                    "transcribe",
+                    inputs=[audio_path],
+                    outputs=[transcript_path],
+                    fn=lambda: run_transcription(audio_path, job_id, transcript_path),
+                    params={"model": WHISPER_MODEL_NAME},
+                    executor=audio_executor
+                )
+                await stages.run(
+                    "segments",
+                    inputs=[transcript_path],
+                    outputs=[segments_path],
+                    fn=lambda: write_segments(transcript_path, segments_path),
+                    executor=audio_executor
+                )
                 
-                slides_images_dir = job.slides_image_dir
-                os.makedirs(slides_images_dir, exist_ok=True)
-                if job.slides_pdf_path:
-                    print(f"Extracting images from PDF: {job.slides_pdf_path}")
-                    convert_pdf_to_images(job.slides_pdf_path, slides_images_dir)
-                if job.slides_ppt_path:
-                    print(f"Extracting images from PPT: {job.slides_ppt_path}")
-                    convert_ppt_to_images(job.slides_ppt_path, slides_images_dir)
-                if os.path.exists(slides_images_dir):
-                    print(f"Processing slides in {slides_images_dir}...")
-                    slide_texts = process_slides(slides_images_dir)
-                    
-                    if slide_texts:
-                        # Link slides to transcript timestamps
-                        slide_links = link_slides_to_transcript(
-                            slide_texts, 
-                            transcript_data.get('segments', [])
-                        )
-                        
-                        # Save slide links
-                        slide_links_path = f"{job_storage_path}/slide_links.json"
-                        with open(slide_links_path, 'w', encoding='utf-8') as f:
-                            json.dump(slide_links, f, indent=2, ensure_ascii=False)
-                        print(f"Saved slide links to {slide_links_path}")
-                        
-                        print(f"Slide processing summary:")
-                        for slide_id, link_info in slide_links.items():
-                            timestamp = link_info.get('timestamp')
-                            if timestamp is not None:
-                                print(f"  Slide {slide_id}: {timestamp:.1f}s (confidence: {link_info.get('confidence_score', 0):.1f})")
-                            else:
-                                print(f"  Slide {slide_id}: No timestamp match found")
+                if semantic_index.is_available():
+                    set_stage(db, job, "embedding", 0.75)
+                    await stages.run(
+                        "embeddings",
+                        inputs=[segments_path],
+                        outputs=[embeddings_path],
+                        fn=lambda: run_embeddings(job_storage_path, embeddings_path),
+                        params={"model": semantic_index.EMBEDDING_MODEL_NAME},
+                        executor=audio_executor
+                    )
                 
                 # Update job with transcript path
-                job.media_path = processed_audio_path  # Update to processed audio
                 job.transcript_path = transcript_path
-                db.commit()
-                
-                print(f"First 5 segments:")
-                print(segments_df.head().to_string())
+                update_manifest(db, job, job_storage_path, ("artifacts", "segments"))
+                set_stage(db, job, "transcribed", 0.8)
                 
             except Exception as e:
                 print(f"Error in media processing: {str(e)}")
@@ -100,12 +176,84 @@ async def process_job(job_id: str):
                 traceback.print_exc()
                 raise
         
-        # Mark as completed
+        async def slides_branch():
+            # pdf/ppt -> native text, images -> ocr text, doesnt need the transcript
+            slides_images_dir = job.slides_image_dir or f"{job_storage_path}/slides/images"
+            os.makedirs(slides_images_dir, exist_ok=True)
+            slide_pages_path = f"{job_storage_path}/slides/pages.json"
+            slide_sources = [path for path in (job.slides_pdf_path, job.slides_ppt_path) if path]
+            if slide_sources:
+                await stages.run(
+                    "slide_text",
+                    inputs=slide_sources,
+                    outputs=lambda: [slide_pages_path] + list_slide_images(slides_images_dir),
+                    fn=lambda: extract_slide_pages(job.slides_pdf_path, job.slides_ppt_path, slides_images_dir, slide_pages_path),
+                    params={"min_chars": NATIVE_TEXT_MIN_CHARS},
+                    executor=slides_executor
+                )
+            if os.path.exists(slide_pages_path) or list_slide_images(slides_images_dir):
+                await stages.run(
+                    "ocr",
+                    inputs=lambda: [path for path in [slide_pages_path] if os.path.exists(path)] + list_slide_images(slides_images_dir),
+                    outputs=[slide_texts_path],
+                    fn=lambda: run_ocr(slides_images_dir, slide_pages_path, slide_texts_path),
+                    executor=slides_executor
+                )
+                update_manifest(db, job, job_storage_path, ("artifacts",))
+        
+        # both branches always run to the end, so a failing one doesnt throw away the other ones checkpoint
+        results = await asyncio.gather(audio_branch(), slides_branch(), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        
+        # Link slides to transcript timestamps, needs both branches
+        if os.path.exists(transcript_path) and os.path.exists(slide_texts_path):
+            set_stage(db, job, "linking", 0.9)
+            await stages.run(
+                "link_slides",
+                inputs=[transcript_path, slide_texts_path],
+                outputs=[slide_links_path],
+                fn=lambda: run_slide_linking(transcript_path, slide_texts_path, slide_links_path)
+            )
+            update_manifest(db, job, job_storage_path, ("artifacts", "slide_links"))
+        
+        # make the job findable in /search and /search/semantic, a broken index shouldnt fail a finished job
+        try:
+            await asyncio.to_thread(index_job_for_search, job_id, job.created_at, job_storage_path)
+        except Exception as e:
+            print(f"Search indexing failed for job {job_id}: {e}")
+        
+        # gzip/brotli copies of the json + csv artifacts, served as they are by /files (see file_serving.py)
+        try:
+            await asyncio.to_thread(file_serving.precompress_job_files, job_storage_path)
+        except Exception as e:
+            print(f"Precompressing the files of job {job_id} failed: {e}")
+        
+        # Mark as completed, with the whole manifest recomputed (stages skipped on a resume dont refresh theirs)
+        artifacts_before = dict(job.artifacts or {})
+        manifest.refresh_manifest(job, job_storage_path)
         job.status = "done"
+        job.stage = None
+        job.progress = 1.0
         db.commit()
+        publish_new_artifacts(job, artifacts_before)
+        events.publish(job_id, "status", status="done", stage=None, progress=1.0)
         
         print(f"Job {job_id} completed successfully")
         
+    except asyncio.CancelledError:
+        # cancelled by the worker (cancel request, or it lost the lease to another worker)
+        db.rollback()
+        job = db.query(Job).filter(Job.id == job_id).first()
+        if job and job.cancel_requested:
+            print(f"Job {job_id} cancelled")
+            job.status = "cancelled"
+            job.stage = None
+            db.commit()
+            events.publish(job_id, "status", status="cancelled", stage=None, progress=job.progress or 0.0)
+        raise
+        
     except Exception as e:
         print(f"Error processing job {job_id}: {str(e)}")
         
@@ -114,79 +262,293 @@ async def process_job(job_id: str):
         if job:
             job.status = "error"
             db.commit()
+            events.publish(job_id, "status", status="error", stage=job.stage, progress=job.progress or 0.0, error=str(e))
     
     finally:
+        # queued stages are dropped, a call still running finishes in its thread and its result is ignored
+        audio_executor.shutdown(wait=False, cancel_futures=True)
+        slides_executor.shutdown(wait=False, cancel_futures=True)
+        # ocr started while rendering that the ocr stage never picked up
+        discard_prefetched(f"storage/{job_id}")
         db.close()
 
 
+# stage bodies, each one reads its inputs from and writes its outputs to the job directory
+
+def run_transcription(audio_path: str, job_id: str, transcript_path: str) -> None:
+    transcript_data = transcribe_and_diarize(audio_path, job_id)
+    print(f"Transcription completed, got {len(transcript_data.get('segments', []))} segments")
+    
+    with open(transcript_path, 'w', encoding='utf-8') as f:
+        json.dump(transcript_data, f, indent=2, ensure_ascii=False)
+    print(f"Saved transcript to {transcript_path}")
+
+def load_transcript(transcript_path: str) -> Dict:
+    with open(transcript_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def write_segments(transcript_path: str, segments_path: str) -> None:
+    segments_df = create_segments_dataframe(load_transcript(transcript_path))
+    segments_store.write_segments_dataframe(segments_df, segments_path)
+    print(f"Saved segments to {segments_path}")
+    
+    print(f"First 5 segments:")
+    print(segments_df.head().to_string())
+
+def segment_texts_for_search(job_storage_path: str) -> List[str]:
+    # the segments exactly as search_index stores them, so row i of the embeddings is the i-th segment document
+    return [doc["text"] for doc in search_index.load_job_documents(job_storage_path) if doc["kind"] == "segment"]
+
+def run_embeddings(job_storage_path: str, embeddings_path: str) -> None:
+    texts = segment_texts_for_search(job_storage_path)
+    print(f"Embedding {len(texts)} segments with {semantic_index.EMBEDDING_MODEL_NAME}...")
+    semantic_index.write_embeddings(texts, embeddings_path)
+
+def index_job_for_search(job_id: str, created_at, job_storage_path: str) -> None:
+    # full text rows first, their ids are the vector ids
+    old_ids = search_index.document_ids(job_id, kind="segment")
+    document_count = search_index.index_job_files(job_id, created_at, job_storage_path)
+    print(f"Indexed {document_count} documents of job {job_id} for search")
+    
+    if not semantic_index.is_available():
+        return
+    import numpy as np
+    embeddings_path = os.path.join(job_storage_path, "embeddings.npy")
+    vectors = np.load(embeddings_path) if os.path.exists(embeddings_path) else None
+    new_ids = search_index.document_ids(job_id, kind="segment")
+    total = semantic_index.update_job(old_ids, new_ids if vectors is not None else [], vectors)
+    print(f"Vector index updated for job {job_id} ({total} vectors)")
+
+def load_slide_pages(slide_pages_path: str) -> List[Dict]:
+    if not os.path.exists(slide_pages_path):
+        return []
+    with open(slide_pages_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def extract_deck_pages(deck_path: str, slides_images_dir: str, first_slide: int) -> List[Dict]:
+    # native text of every page of a pdf/ppt/pptx, pages without enough of it are rendered for ocr
+    # both come from the slide cache when this deck was seen before
+    ext = os.path.splitext(deck_path)[1].lower()
+    deck_name = os.path.basename(deck_path)
+    deck_hash = hash_file(deck_path)
+    text_key = slide_cache.cache_key("deck_text", deck_hash, NATIVE_TEXT_MIN_CHARS)
+    texts = slide_cache.get_json(text_key)
+    cached_texts = texts is not None
+    if texts is None and ext == ".pptx":
+        texts = extract_pptx_text(deck_path)
+
+    with tempfile.TemporaryDirectory(prefix="contextclip-deck-") as convert_dir:
+        pdf_path = deck_path if ext == ".pdf" else None
+        # a ppt only becomes a pdf when pages have to be rendered that arent cached (or python-pptx cant read it)
+        if pdf_path is None and (texts is None or any(
+            needs_ocr(text) and not slide_cache.has_image(page_cache_key(deck_hash, page))
+            for page, text in enumerate(texts, start=1)
+        )):
+            try:
+                pdf_path = convert_to_pdf(deck_path, convert_dir)
+            except Exception as e:
+                print(f"LibreOffice conversion failed: {e}")
+        if texts is None:
+            if pdf_path is None:
+                return []
+            texts = extract_pdf_text(pdf_path, pdf_page_count(pdf_path))
+        if not cached_texts:
+            slide_cache.put_json(text_key, texts)
+
+        ocr_pages = [page for page, text in enumerate(texts, start=1) if needs_ocr(text)]
+        print(f"{deck_name}: {len(texts) - len(ocr_pages)} of {len(texts)} pages have native text")
+        if ocr_pages:
+            # ocr of each page starts while the next ones are still rendering, run_ocr picks the results up
+            convert_pdf_to_images(
+                pdf_path, slides_images_dir, on_page=prefetch_ocr,
+                pages=ocr_pages, first_slide=first_slide, source_hash=deck_hash
+            )
+
+    pages = []
+    for page, text in enumerate(texts, start=1):
+        slide_number = first_slide + page - 1
+        filename = f"slide_{slide_number}.png"
+        rendered = needs_ocr(text) and os.path.exists(os.path.join(slides_images_dir, filename))
+        pages.append({
+            "slide_id": f"slide_{slide_number}",
+            "deck": deck_name,
+            "page": page,
+            # text None = ocr the rendered image, pages that couldnt be rendered keep what little text they had
+            "filename": filename if rendered else None,
+            "text": None if rendered else text
+        })
+    return pages
+
+def extract_slide_pages(slides_pdf_path: Optional[str], slides_ppt_path: Optional[str], slides_images_dir: str, slide_pages_path: str) -> None:
+    # images this stage rendered last time would otherwise be taken for uploaded images
+    for page in load_slide_pages(slide_pages_path):
+        if page.get("filename"):
+            stale_path = os.path.join(slides_images_dir, page["filename"])
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+    
+    pages = []
+    for deck_path in (slides_pdf_path, slides_ppt_path):
+        if deck_path:
+            print(f"Extracting slide text from: {deck_path}")
+            pages.extend(extract_deck_pages(deck_path, slides_images_dir, first_slide=len(pages) + 1))
+    
+    with open(slide_pages_path, 'w', encoding='utf-8') as f:
+        json.dump(pages, f, indent=2, ensure_ascii=False)
+    slide_cache.trim()
+
+def run_ocr(slides_images_dir: str, slide_pages_path: str, slide_texts_path: str) -> None:
+    deck_pages = load_slide_pages(slide_pages_path)
+    deck_images = {page["filename"] for page in deck_pages if page.get("filename")}
+    # uploaded slide images come after the deck pages, all of them need ocr
+    uploaded = [
+        os.path.basename(path) for path in list_slide_images(slides_images_dir)
+        if os.path.basename(path) not in deck_images
+    ]
+    pages = deck_pages + [
+        {"slide_id": f"slide_{len(deck_pages) + i + 1}", "filename": filename, "text": None}
+        for i, filename in enumerate(uploaded)
+    ]
+    
+    ocr_pages = [page for page in pages if page["text"] is None]
+    print(f"Running OCR on {len(ocr_pages)} of {len(pages)} slides in {slides_images_dir}...")
+    ocr_texts = dict(iter_ocr(os.path.join(slides_images_dir, page["filename"]) for page in ocr_pages))
+    
+    slide_data = []
+    for page in pages:
+        if page["text"] is None:
+            text = ocr_texts.get(os.path.join(slides_images_dir, page["filename"])) or ""
+            source = "ocr"
+        else:
+            text = page["text"]
+            source = "native"
+        slide_data.append({
+            "slide_id": page["slide_id"],
+            "filename": page["filename"] or page["deck"],
+            "page": page.get("page"),
+            "text": text,
+            "source": source
+        })
+    with open(slide_texts_path, 'w', encoding='utf-8') as f:
+        json.dump(slide_data, f, indent=2, ensure_ascii=False)
+    print(f"Saved slide texts to {slide_texts_path}")
+
+def load_slide_texts(slide_texts_path: str) -> Dict[str, str]:
+    with open(slide_texts_path, 'r', encoding='utf-8') as f:
+        return {slide["slide_id"]: slide["text"] for slide in json.load(f)}
+
+def run_slide_linking(transcript_path: str, slide_texts_path: str, slide_links_path: str) -> None:
+    slide_links = link_slides_to_transcript(
+        load_slide_texts(slide_texts_path),
+        load_transcript(transcript_path).get('segments', [])
+    )
+    
+    # Save slide links
+    with open(slide_links_path, 'w', encoding='utf-8') as f:
+        json.dump(slide_links, f, indent=2, ensure_ascii=False)
+    print(f"Saved slide links to {slide_links_path}")
+    
+    print(f"Slide processing summary:")
+    for slide_id, link_info in slide_links.items():
+        timestamp = link_info.get('timestamp')
+        if timestamp is not None:
+            print(f"  Slide {slide_id}: {timestamp:.1f}s (confidence: {link_info.get('confidence_score', 0):.1f})")
+        else:
+            print(f"  Slide {slide_id}: No timestamp match found")
+
+
 # now defining all the functions used
 
-async def preprocess_audio(input_path: str, job_id: str) -> str:
-    # need to convert audio to 16kHz - using ffmpeg
+async def preprocess_audio(input_path: str, job_id: str, on_progress: Optional[Callable[[float], None]] = None) -> str:
+    # need to convert audio to 16kHz mono pcm - using ffmpeg, unless it already is
+    # this is the only decode, later stages memory map the wav (see audio.load_pcm)
+    # ffmpeg runs as a subprocess so the event loop stays free, cancelling the job kills it
 
     try:
         job_storage_path = f"storage/{job_id}"
         output_path = f"{job_storage_path}/processed_audio.wav"
         os.makedirs(job_storage_path, exist_ok=True)
         
+        stream_info = await asyncio.to_thread(probe_audio, input_path)
+        if is_transcriber_ready(stream_info):
+            print(f"Audio is already 16kHz mono PCM, skipping transcode: {input_path}")
+            if on_progress:
+                on_progress(1.0)
+            if os.path.abspath(input_path) == os.path.abspath(output_path):
+                return output_path
+            try:
+                # hard link, so the artifact is there without copying the data
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                os.link(input_path, output_path)
+                return output_path
+            except OSError:
+                return input_path
         
         print(f"Preprocessing audio: {input_path} -> {output_path}")
         
-        # Use ffmpeg-python to convert audio
-        stream = ffmpeg.input(input_path)
-        stream = ffmpeg.output(
-            stream,
-            output_path,
-            acodec='pcm_s16le',  # 16-bit PCM
-            ac=1,                # Mono
-            ar=16000            # 16kHz sample rate
-        )
-        
-        # Run ffmpeg (overwrite output file)
         try:
-            ffmpeg.run(stream, overwrite_output=True, quiet=True)
-        except ffmpeg.Error as e:
-            print('ffmpeg error:', e.stderr.decode())
+            await decode_to_wav(
+                input_path,
+                output_path,
+                duration=stream_info.get("duration") if stream_info else None,
+                on_progress=on_progress
+            )
+        except RuntimeError as e:
+            print('ffmpeg error:', e)
             return input_path
         
         print(f"Audio preprocessing completed: {output_path}")
         return output_path
         
+    except asyncio.TimeoutError:
+        print(f"ffmpeg timed out on {input_path}")
+        raise
     except Exception as e:
         print(f"Error preprocessing audio: {str(e)}")
         # Return original path if preprocessing fails
         return input_path
 
-async def transcribe_and_diarize(audio_path: str, job_id: str) -> Dict:
+def load_audio_samples(audio_path: str):
+    # float32 samples for the models, straight from the preprocessed wav without decoding again
+    # (falls back to ffmpeg decoding through whisper if preprocessing had to return the original file)
+    try:
+        return load_pcm(audio_path)
+    except ValueError:
+        try:
+            import whisperx
+            return whisperx.load_audio(audio_path)
+        except ImportError:
+            import whisper
+            return whisper.load_audio(audio_path)
+
+def transcribe_and_diarize(audio_path: str, job_id: str) -> Dict:
     # transcribing and diarzing 
     try:
         # trying WhisperX first -> if doesnt work using mock
         try:
             import whisperx
             print("Using WhisperX for transcription and diarization")
-            return await transcribe_with_whisperx(audio_path, job_id)
+            return transcribe_with_whisperx(audio_path, job_id)
         except Exception as e:
             print(f"WhisperX failed ({e}), not falling back to OpenAI Whisper for now")
 
             try:
-                return await transcribe_with_openai_whisper(audio_path, job_id)
+                return transcribe_with_openai_whisper(audio_path, job_id)
             except Exception as e:
                 print(f"OpenAI Whisper failed ({e}), using mock transcription")
-                return await transcribe_with_mock(audio_path, job_id)
+                return transcribe_with_mock(audio_path, job_id)
             
     except Exception as e:
         print(f"Error in transcription: {str(e)}")
-        return await transcribe_with_mock(audio_path, job_id)
+        return transcribe_with_mock(audio_path, job_id)
 
-async def transcribe_with_mock(audio_path: str, job_id: str) -> Dict:
+def transcribe_with_mock(audio_path: str, job_id: str) -> Dict:
     # generates fake segments based on audio duration
     try:
-        import librosa
         print("Using mock transcription (for testing)")
-        #audio duration
-        # sr: sample rate (needs to be 16000)
-        audio, sr = librosa.load(audio_path, sr=16000)
-        duration = len(audio) / sr
+        #audio duration, from the wav header - no need to decode anything (ffprobe if it isnt a pcm wav)
+        duration = audio_duration(audio_path)
         print(f"Audio duration: {duration:.2f} seconds")
         
         # random mock segments
@@ -237,77 +599,115 @@ async def transcribe_with_mock(audio_path: str, job_id: str) -> Dict:
             "audio_path": audio_path
         }
     
-async def transcribe_with_whisperx(audio_path: str, job_id: str) -> Dict:
+def get_whisperx_device():
+    # do not inlcude mps for mac, since whisperX doesnt support mps
+    import torch
+
+    if torch.cuda.is_available():
+        return "cuda", "float16"
+    return "cpu", "int8"
+
+# models come from the process wide registry, so a worker only loads them once
+
+def get_whisperx_model(device: str, compute_type: str, threads: Optional[int] = None):
+    import whisperx
+    options = {"threads": threads} if threads else {}
+    return registry.get(
+        ("whisperx", WHISPER_MODEL_NAME, device, compute_type, None),
+        lambda: whisperx.load_model(WHISPER_MODEL_NAME, device, compute_type=compute_type, **options),
+        size_mb=WHISPERX_MODEL_SIZE_MB
+    )
+
+def get_align_model(language: str, device: str):
+    # alignment models are per language, so each detected language gets its own entry
+    import whisperx
+    return registry.get(
+        ("whisperx-align", None, device, None, language),
+        lambda: whisperx.load_align_model(language_code=language, device=device)
+    )
+
+def get_diarization_pipeline(device: str):
+    import whisperx
+    return registry.get(
+        ("whisperx-diarize", None, device, None, None),
+        lambda: whisperx.DiarizationPipeline(use_auth_token=None, device=device),
+        size_mb=DIARIZATION_MODEL_SIZE_MB
+    )
+
+def get_openai_whisper_model():
+    import whisper
+    return registry.get(
+        ("openai-whisper", WHISPER_MODEL_NAME, None, None, None),
+        lambda: whisper.load_model(WHISPER_MODEL_NAME)
+    )
+
+def warm_up_models():
+    # called when a worker starts so the first job doesnt pay for loading whisper
+    if os.getenv("CONTEXTCLIP_WARMUP_MODELS", "1") == "0":
+        return
     try:
-        import whisperx
-        import torch
+        device, compute_type = get_whisperx_device()
+        get_whisperx_model(device, compute_type)
+        default_language = os.getenv("CONTEXTCLIP_WARMUP_LANGUAGE", "en")
+        if default_language:
+            get_align_model(default_language, device)
+        print(f"Warm-up done: {registry.stats()}")
+    except Exception as e:
+        print(f"Model warm-up skipped ({e})")
 
-        # do not inlcude mps for mac, since whisperX doesnt support mps
-        if torch.cuda.is_available():
-            device = "cuda"
-        else:
-            device = "cpu"
+def transcribe_with_whisperx(audio_path: str, job_id: str) -> Dict:
+    try:
+        import whisperx
 
-        if device in ["cuda"]:
-            compute_type = "float16"
-        else:
-            compute_type = "int8"
-        
-        # device = "cuda" if torch.cuda.is_available() else "cpu"
-        # compute_type = "float16" if device == "cuda" else "int8"
+        device, compute_type = get_whisperx_device()
         
         print(f"Loading WhisperX model on {device}")
         
         # 1. Transcribe with Whisper-small
-        model = whisperx.load_model("small", device, compute_type=compute_type)
-        audio = whisperx.load_audio(audio_path)
-        # result = model.transcribe(audio, batch_size=16)
-        result = model.transcribe(
-            audio,
-            batch_size=16,
-            multilingual=True,
-            max_new_tokens=128,
-            clip_timestamps=None,
-            hallucination_silence_threshold=0.1,
-            hotwords=None
-        )
+        audio = load_audio_samples(audio_path)
+        duration = len(audio) / SAMPLE_RATE
+        if is_pcm_wav(audio_path) and use_chunked_transcription(device, duration):
+            # long recording on cpu: chunks at pauses, transcribed in parallel processes
+            result = transcribe_chunked(audio_path, batch_size=16)
+        else:
+            model = get_whisperx_model(device, compute_type)
+            # result = model.transcribe(audio, batch_size=16)
+            result = model.transcribe(audio, batch_size=16, **WHISPERX_TRANSCRIBE_OPTIONS)
         
         
         # 2. Align whisper output
-        model_a, metadata = whisperx.load_align_model(language_code=result["language"], device=device)
+        model_a, metadata = get_align_model(result["language"], device)
         result = whisperx.align(result["segments"], model_a, metadata, audio, device, return_char_alignments=False)
         
         # 3. Assign speaker labels
-        diarize_model = whisperx.DiarizationPipeline(use_auth_token=None, device=device)
-        diarize_segments = diarize_model(audio_path)
+        diarize_model = get_diarization_pipeline(device)
+        diarize_segments = diarize_model(audio)
         result = whisperx.assign_word_speakers(diarize_segments, result)
         
         return {
             "language": result.get("language", "unknown"),
             "segments": result["segments"],
             "job_id": job_id,
-            "model": "whisperx-small",
+            "model": f"whisperx-{WHISPER_MODEL_NAME}",
             "audio_path": audio_path
         }
     except Exception as e:
         print(f"WhisperX failed: {str(e)}")
         raise
-async def transcribe_with_openai_whisper(audio_path: str, job_id: str) -> Dict:
+def transcribe_with_openai_whisper(audio_path: str, job_id: str) -> Dict:
     """
     Use OpenAI Whisper for transcription (local model, no diarization)
     """
     try:
-        import whisper
-        
-        print("Loading OpenAI Whisper model (small)")
+        print(f"Loading OpenAI Whisper model ({WHISPER_MODEL_NAME})")
         
-        # Load the model (downloads on first use, then cached)
-        model = whisper.load_model("small")
+        # Load the model (downloads on first use, then kept in the registry)
+        model = get_openai_whisper_model()
         
         print(f"Transcribing audio: {audio_path}")
         
-        # Transcribe the audio
-        result = model.transcribe(audio_path)
+        # Transcribe the audio, samples from the preprocessed wav
+        result = model.transcribe(load_audio_samples(audio_path))
         
         # Convert to our format
         segments = []
@@ -326,7 +726,7 @@ async def transcribe_with_openai_whisper(audio_path: str, job_id: str) -> Dict:
             "language": result.get("language", "unknown"),
             "segments": segments,
             "job_id": job_id,
-            "model": "openai-whisper-small",
+            "model": f"openai-whisper-{WHISPER_MODEL_NAME}",
             "audio_path": audio_path,
             "full_text": result.get("text", "")
         }
@@ -338,7 +738,7 @@ async def transcribe_with_openai_whisper(audio_path: str, job_id: str) -> Dict:
 
 def create_segments_dataframe(transcript_data: Dict) -> pd.DataFrame:
 
-    #convert segments into csv
+    #convert segments into a dataframe (stored by segments_store)
     segments = []
     for segment in transcript_data.get("segments", []):
         segments.append({
@@ -373,25 +773,86 @@ def extract_slides_from_file(slide_file_or_dir: Optional[str], output_dir: str)
 
 
 
-def convert_pdf_to_images(pdf_path: str, slides_dir: str) -> list:
+def page_cache_key(source_hash: str, page: int) -> str:
+    # a rendered page in the slide cache, source_hash is the sha256 of the uploaded pdf/ppt/pptx
+    return slide_cache.cache_key("page", source_hash, page, PDF_DPI)
+
+def convert_pdf_to_images(
+    pdf_path: Optional[str],
+    slides_dir: str,
+    on_page: Optional[Callable[[str], None]] = None,
+    pages: Optional[List[int]] = None,
+    first_slide: int = 1,
+    source_hash: Optional[str] = None
+) -> list:
     """
-    Converts each page of PDF to a PNG image and saves in slides_dir.
+    Converts pages of PDF (all of them, or the 1-based page numbers in pages) to PNG images and saves
+    them in slides_dir as slide_N.png, page 1 being slide first_slide.
+    Pages in the slide cache (by source_hash, the pdf itself by default) are linked from there, the rest
+    are rendered up to PDF_BATCH_PAGES at a time by pdftoppm straight to disk (never held in memory).
+    pdf_path may be None when every page is cached.
+    on_page gets every slide image path as soon as it is written.
     Returns list of paths to images.
     """
-    from pdf2image import convert_from_path
     import os
+    import tempfile
 
     os.makedirs(slides_dir, exist_ok=True)
-    images = convert_from_path(pdf_path, dpi=200)
-    img_paths = []
+    if pages is None:
+        from pdf2image import pdfinfo_from_path
+        pages = list(range(1, int(pdfinfo_from_path(pdf_path)["Pages"]) + 1))
+    source_hash = source_hash or hash_file(pdf_path)
+
+    def slide_path(page: int) -> str:
+        return os.path.join(slides_dir, f"slide_{first_slide + page - 1}.png")
+
+    img_paths = {}
+    missing = []
+    for page in sorted(set(pages)):
+        if slide_cache.get_image(page_cache_key(source_hash, page), slide_path(page)):
+            img_paths[page] = slide_path(page)
+            if on_page:
+                on_page(img_paths[page])
+        else:
+            missing.append(page)
+    cached_count = len(img_paths)
+    if missing and not pdf_path:
+        print(f"No pdf to render pages {missing} from")
+        missing = []
 
-    for i, img in enumerate(images):
-        img_path = os.path.join(slides_dir, f"slide_{i+1}.png")
-        img.save(img_path, "PNG")
-        img_paths.append(img_path)
+    # runs of consecutive pages, at most PDF_BATCH_PAGES long, each one is a single pdftoppm call
+    batches = []
+    for page in missing:
+        if batches and page == batches[-1][-1] + 1 and len(batches[-1]) < PDF_BATCH_PAGES:
+            batches[-1].append(page)
+        else:
+            batches.append([page])
+
+    # rendered into a scratch dir in slides_dir (same filesystem, so the rename is free)
+    with tempfile.TemporaryDirectory(dir=slides_dir, prefix=".render-") as render_dir:
+        for batch in batches:
+            from pdf2image import convert_from_path
+            rendered = convert_from_path(
+                pdf_path,
+                dpi=PDF_DPI,
+                first_page=batch[0],
+                last_page=batch[-1],
+                output_folder=render_dir,
+                output_file="page",
+                fmt="png",
+                paths_only=True,
+                thread_count=PDF_RENDER_THREADS
+            )
+            # pdf2image returns the batch in page order
+            for page, rendered_path in zip(batch, rendered):
+                os.replace(rendered_path, slide_path(page))
+                img_paths[page] = slide_path(page)
+                slide_cache.put_image(page_cache_key(source_hash, page), img_paths[page])
+                if on_page:
+                    on_page(img_paths[page])
     
-    print(f"Converted PDF '{pdf_path}' to {len(img_paths)} slide images in '{slides_dir}'")
-    return img_paths
+    print(f"Converted PDF '{pdf_path}' to {len(img_paths)} slide images in '{slides_dir}' ({cached_count} from cache)")
+    return [img_paths[page] for page in sorted(img_paths)]
 
 def convert_ppt_to_images(ppt_path: str, slides_dir: str) -> list:
     """
@@ -454,14 +915,26 @@ def convert_ppt_to_images(ppt_path: str, slides_dir: str) -> list:
         return []
 
 
+SLIDE_IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff')
+
+def _natural_key(filename: str):
+    # slide_2.png before slide_10.png
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', filename)]
+
+def list_slide_images(slides_dir: str) -> List[str]:
+    # slide image paths in slide order
+    if not slides_dir or not os.path.isdir(slides_dir):
+        return []
+    filenames = [f for f in os.listdir(slides_dir) if f.lower().endswith(SLIDE_IMAGE_EXTENSIONS)]
+    return [os.path.join(slides_dir, f) for f in sorted(filenames, key=_natural_key)]
+
 def process_slides(slides_dir: str):
 
     # Process slide images using OCR to extract text
     # Returns: Dictionary mapping slide_id -> extracted text
     
     try:
-        import pytesseract
-        from PIL import Image
+        import pytesseract  # noqa: F401 - the pool processes need it, fail here if it is missing
         import os
         
         # # Set Tesseract path for Windows
@@ -471,47 +944,34 @@ def process_slides(slides_dir: str):
             print(f"Slides directory not found: {slides_dir}")
             return {}
         
-        slide_files = [f for f in os.listdir(slides_dir) 
-                      if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff'))]
+        slide_paths = list_slide_images(slides_dir)
         
-        if not slide_files:
+        if not slide_paths:
             print("No slide images found")
             return {}
         
-        print(f"Processing {len(slide_files)} slide images with OCR...")
+        print(f"Processing {len(slide_paths)} slide images with OCR...")
         
         slide_texts = {}
         
-        for i, slide_file in enumerate(sorted(slide_files)):
-            slide_path = os.path.join(slides_dir, slide_file)
+        # pages are recognized in parallel, the results still arrive in slide order
+        for i, (slide_path, text) in enumerate(iter_ocr(slide_paths)):
             text_path = os.path.join(slides_dir, f"slide_{i+1}.txt")
             slide_id = f"slide_{i+1}"
             
-            try:
-                # Open and process image with Tesseract
-                image = Image.open(slide_path)
-                
-                # Extract text using OCR
-                text = pytesseract.image_to_string(image, config='--psm 6')
-                text = text.strip()
-                
-                # Save extracted text
-                with open(text_path, 'w', encoding='utf-8') as f:
-                    f.write(text)
-                
-                slide_texts[slide_id] = text
-                
-                print(f"Slide {i+1}: Extracted {len(text)} characters")
-                if text:
-                    print(f"  Preview: {text[:100]}...")
-                
-            except Exception as e:
-                print(f"Error processing slide {slide_file}: {str(e)}")
-                # Create empty text file for failed slides
-                with open(text_path, 'w', encoding='utf-8') as f:
-                    f.write("")
-                
-                slide_texts[slide_id] = ""
+            if text is None:
+                # failed slides get an empty text file
+                text = ""
+            
+            # Save extracted text
+            with open(text_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            
+            slide_texts[slide_id] = text
+            
+            print(f"Slide {i+1}: Extracted {len(text)} characters")
+            if text:
+                print(f"  Preview: {text[:100]}...")
         
         return slide_texts
         
@@ -522,102 +982,164 @@ def process_slides(slides_dir: str):
         print(f"Error in slide processing: {str(e)}")
         return []
 
-def link_slides_to_transcript(slide_texts: Dict[str, str], transcript_segments: List[Dict]) -> Dict:
+LINK_MIN_SCORE = 60
+# phrases x segments scored per cdist call, bounds the score matrix at ~64MB of float32
+LINK_MAX_CELLS = 16_000_000
+# "aligned" = slides keep their order in time (monotonic alignment over all slides at once),
+# "independent" = every slide goes to its own best segment
+SLIDE_LINKING_MODE = os.getenv("CONTEXTCLIP_SLIDE_LINKING", "aligned")
+
+def _clean_for_matching(text: str) -> str:
+    text = re.sub(r'[^\w\s]', '', text)  # Remove punctuation
+    return re.sub(r'\s+', ' ', text).strip().lower()  # Normalize whitespace
+
+def _slide_phrases(slide_text: str) -> List[str]:
+    # lines are split before the whitespace is normalized, otherwise the whole slide ends up as one phrase
+    phrases = [_clean_for_matching(line) for line in slide_text.splitlines()]
+    return [phrase for phrase in phrases if len(phrase) >= 5]
+
+def _slide_similarity(slide_phrases: List[List[str]], segment_texts: List[str]):
+    # slides x segments matrix, a cell is the best partial_ratio of any phrase of the slide against the segment
+    # (0 below LINK_MIN_SCORE). phrases of several slides go through one cdist call on every core
+    import numpy as np
+    from rapidfuzz import fuzz, process
+    
+    similarity = np.zeros((len(slide_phrases), len(segment_texts)), dtype=np.float32)
+    max_rows = max(1, LINK_MAX_CELLS // max(1, len(segment_texts)))
+    
+    def score(batch):
+        phrases = [phrase for _, slide in batch for phrase in slide]
+        scores = process.cdist(phrases, segment_texts, scorer=fuzz.partial_ratio, score_cutoff=LINK_MIN_SCORE, workers=-1)
+        row = 0
+        for slide_index, slide in batch:
+            similarity[slide_index] = scores[row:row + len(slide)].max(axis=0)
+            row += len(slide)
+    
+    batch, batch_rows = [], 0
+    for slide_index, phrases in enumerate(slide_phrases):
+        if not phrases:
+            continue
+        if batch and batch_rows + len(phrases) > max_rows:
+            score(batch)
+            batch, batch_rows = [], 0
+        batch.append((slide_index, phrases))
+        batch_rows += len(phrases)
+    if batch:
+        score(batch)
+    return similarity
+
+def align_slides(similarity) -> List[Optional[int]]:
+    # monotonic alignment: the segment index of every slide (None = skipped) such that linked slides appear in
+    # slide order in time and the summed similarity of the links is as high as possible
+    # M[j] = best total of the slides so far with all of them at segments <= j. slide i either stays unlinked
+    # (M unchanged) or goes to segment j on top of M[j], a running max over j keeps it monotonic
+    # O(slides x segments) time, and the back pointers are O(slides x segments) int32 + bool
+    import numpy as np
+    
+    slide_count, segment_count = similarity.shape
+    if slide_count == 0 or segment_count == 0:
+        return [None] * slide_count
+    positions = np.arange(segment_count, dtype=np.int32)
+    best = np.zeros(segment_count, dtype=np.float64)
+    back = np.empty((slide_count, segment_count), dtype=np.int32)
+    took = np.empty((slide_count, segment_count), dtype=bool)
+    
+    for i in range(slide_count):
+        scores = similarity[i]
+        take = np.where(scores > LINK_MIN_SCORE, best + scores, -np.inf)
+        took[i] = take > best
+        values = np.maximum(best, take)
+        best = np.maximum.accumulate(values)
+        # where the running max was reached
+        back[i] = np.maximum.accumulate(np.where(values == best, positions, 0))
+    
+    assignment: List[Optional[int]] = [None] * slide_count
+    j = segment_count - 1
+    for i in range(slide_count - 1, -1, -1):
+        j = int(back[i, j])
+        if took[i, j]:
+            assignment[i] = j
+    return assignment
+
+def link_slides_to_transcript(slide_texts: Dict[str, str], transcript_segments: List[Dict], mode: Optional[str] = None) -> Dict:
     """
     Link slides to transcript timestamps using fuzzy matching
     """
     try:
         from rapidfuzz import fuzz, process
-        import re
         
         if not slide_texts or not transcript_segments:
             return {}
         
-        print(f"Linking {len(slide_texts)} slides to {len(transcript_segments)} transcript segments...")
+        mode = mode or SLIDE_LINKING_MODE
+        print(f"Linking {len(slide_texts)} slides to {len(transcript_segments)} transcript segments ({mode})...")
         
-        # Prepare transcript text for matching
-        transcript_text_segments = []
+        # Prepare transcript text for matching, segments are referred to by index from here on
+        # (matching by text picked the wrong segment when the same sentence was said twice)
+        segment_texts = []
+        segments = []
         for segment in transcript_segments:
-            # Clean text for better matching
-            text = segment.get('text', '').strip()
-            text = re.sub(r'\s+', ' ', text)  # Normalize whitespace
-            text = re.sub(r'[^\w\s]', '', text)  # Remove punctuation
-            
+            text = _clean_for_matching(segment.get('text', ''))
             if text:
-                transcript_text_segments.append({
-                    'text': text.lower(),
-                    'timestamp': segment.get('start', 0.0),
-                    'end': segment.get('end', 0.0),
-                    'original_text': segment.get('text', '')
-                })
+                segment_texts.append(text)
+                segments.append(segment)
         
-        if not transcript_text_segments:
+        if not segment_texts:
             print("No valid transcript segments for matching")
             return {}
         
+        slide_ids = list(slide_texts.keys())
+        slide_phrases = [_slide_phrases(slide_texts[slide_id]) for slide_id in slide_ids]
+        similarity = _slide_similarity(slide_phrases, segment_texts)
+        
+        if mode == "independent":
+            # argmax takes the first of equal scores, i.e. the earliest segment
+            assignment = [
+                int(row.argmax()) if row.max() > LINK_MIN_SCORE else None
+                for row in similarity
+            ]
+        else:
+            assignment = align_slides(similarity)
+        
+        # a slide is on screen from its segment until the next linked slide starts
+        linked = sorted((index, i) for i, index in enumerate(assignment) if index is not None)
+        range_ends = {}
+        for (index, i), following in zip(linked, linked[1:] + [None]):
+            if following is not None:
+                range_ends[i] = segments[following[0]].get('start', 0.0)
+            else:
+                range_ends[i] = segments[-1].get('end', 0.0)
+        
         slide_links = {}
         
-        for slide_id, slide_text in slide_texts.items():
+        for i, slide_id in enumerate(slide_ids):
+            slide_text = slide_texts[slide_id]
             if not slide_text.strip():
                 print(f"Slide {slide_id}: No text found, skipping")
                 continue
             
-            # Clean slide text for matching
-            slide_text_clean = re.sub(r'\s+', ' ', slide_text)
-            slide_text_clean = re.sub(r'[^\w\s]', '', slide_text_clean).lower()
-            
-            # Split slide text into phrases for better matching
-            slide_phrases = [phrase.strip() for phrase in slide_text_clean.split('\n') 
-                           if len(phrase.strip()) > 3]
-            
-            best_matches = []
-            
-            # Try to match each phrase
-            for phrase in slide_phrases[:5]:  # Limit to first 5 phrases
-                if len(phrase) < 5:  # Skip very short phrases
-                    continue
-                
-                # Find best matching transcript segment
-                matches = process.extract(
-                    phrase,
-                    [seg['text'] for seg in transcript_text_segments],
-                    scorer=fuzz.partial_ratio,
-                    limit=3
-                )
-                
-                # Consider matches with score > 60
-                for match in matches:
-                    match_text, score, _ = match  # rapidfuzz returns (text, score, index)
-                    if score > 60:
-                        # Find the corresponding segment
-                        for seg in transcript_text_segments:
-                            if seg['text'] == match_text:
-                                best_matches.append({
-                                    'score': score,
-                                    'timestamp': seg['timestamp'],
-                                    'end': seg['end'],
-                                    'phrase': phrase,
-                                    'matched_text': seg['original_text']
-                                })
-                                break
-            
-            if best_matches:
-                # Choose the match with highest score
-                best_match = max(best_matches, key=lambda x: x['score'])
+            if assignment[i] is not None:
+                segment = segments[assignment[i]]
+                score = float(similarity[i, assignment[i]])
+                # which phrase made the match, only looked up for the chosen cell
+                phrase = process.extractOne(segment_texts[assignment[i]], slide_phrases[i], scorer=fuzz.partial_ratio)[0]
                 
                 slide_links[slide_id] = {
-                    'timestamp': best_match['timestamp'],
-                    'end_timestamp': best_match['end'],
-                    'confidence_score': best_match['score'],
-                    'matched_phrase': best_match['phrase'],
-                    'matched_transcript': best_match['matched_text'],
+                    'timestamp': segment.get('start', 0.0),
+                    'end_timestamp': segment.get('end', 0.0),
+                    'range_start': segment.get('start', 0.0),
+                    'range_end': max(range_ends[i], segment.get('end', 0.0)),
+                    'confidence_score': score,
+                    'matched_phrase': phrase,
+                    'matched_transcript': segment.get('text', ''),
+                    'speaker': segment.get('speaker'),
                     'slide_text_preview': slide_text[:200]
                 }
                 
-                print(f"Slide {slide_id}: Linked to {best_match['timestamp']:.1f}s "
-                      f"(confidence: {best_match['score']:.1f})")
-                print(f"  Phrase: '{best_match['phrase'][:50]}...'")
-                print(f"  Matched: '{best_match['matched_text'][:50]}...'")
+                print(f"Slide {slide_id}: Linked to {slide_links[slide_id]['timestamp']:.1f}s "
+                      f"(confidence: {score:.1f})")
+                print(f"  Phrase: '{phrase[:50]}...'")
+                print(f"  Matched: '{segment.get('text', '')[:50]}...'")
             else:
                 print(f"Slide {slide_id}: No good matches found")
                 # Store with no timestamp but keep the text
@@ -637,14 +1159,12 @@ def link_slides_to_transcript(slide_texts: Dict[str, str], transcript_segments:
         return {}
 
 def generate_embeddings(text: str):
-    """Stub for embedding generation"""
-    # TODO: Implement sentence-transformers embeddings
-    pass
+    """Embedding of one text, the pipeline embeds whole transcripts in batches (run_embeddings)"""
+    return semantic_index.embed_texts([text])[0]
 
 def index_in_faiss(embeddings, metadata):
-    """Stub for FAISS indexing"""
-    # TODO: Implement FAISS vector indexing
-    pass
+    """Adds embeddings to the FAISS index, metadata = the search_index document ids of the rows"""
+    return semantic_index.update_job([], metadata, embeddings)
 
 
 
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# the app reads its settings at import, so the test database has to be set before anything imports it
+_tmp_dir = tempfile.mkdtemp(prefix="contextclip-tests-")
+os.environ.setdefault("CONTEXTCLIP_DATABASE_URL", f"sqlite:///{os.path.join(_tmp_dir, 'contextclip.db')}")
+os.environ.setdefault("CONTEXTCLIP_SEARCH_DB", os.path.join(_tmp_dir, "contextclip_search.db"))
+os.environ.setdefault("CONTEXTCLIP_VECTOR_INDEX", os.path.join(_tmp_dir, "contextclip_vectors.faiss"))
+os.environ.setdefault("CONTEXTCLIP_WORKERS", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,41 @@
+import struct
+import wave
+
+from app import audio
+
+
+def write_pcm_wav(path, seconds: float, sample_rate: int = 16000) -> None:
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(b"\0\0" * int(seconds * sample_rate))
+
+
+def write_compressed_wav(path, data_size: int) -> None:
+    # wav container around mp3 data (format 0x55), the header size says nothing about the duration
+    fmt = struct.pack("<HHIIHH", 0x55, 1, 16000, 2000, 1, 0)
+    body = b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt + b"data" + struct.pack("<I", data_size) + b"\xff" * data_size
+    with open(path, "wb") as f:
+        f.write(b"RIFF" + struct.pack("<I", len(body)) + body)
+
+
+def test_pcm_wav_duration_from_header(tmp_path, monkeypatch):
+    path = tmp_path / "speech.wav"
+    write_pcm_wav(path, 2.5)
+    monkeypatch.setattr(audio, "probe_audio", lambda p: None)
+    assert audio.audio_duration(str(path)) == 2.5
+
+
+def test_compressed_wav_duration_from_ffprobe(tmp_path, monkeypatch):
+    path = tmp_path / "speech.wav"
+    write_compressed_wav(path, 4000)
+    monkeypatch.setattr(audio, "probe_audio", lambda p: {"duration": 16.0})
+    assert audio.audio_duration(str(path)) == 16.0
+
+
+def test_other_formats_duration_from_ffprobe(tmp_path, monkeypatch):
+    path = tmp_path / "speech.m4a"
+    path.write_bytes(b"\0\0\0\x20ftypM4A ")
+    monkeypatch.setattr(audio, "probe_audio", lambda p: {"duration": 61.5})
+    assert audio.audio_duration(str(path)) == 61.5
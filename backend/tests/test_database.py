@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app import database
+
+
+def test_sqlite_engine_has_a_sized_pool_and_wal(tmp_path):
+    engine = database.make_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    try:
+        assert isinstance(engine.pool, QueuePool)
+        assert engine.pool.size() == database.DB_POOL_SIZE
+        with engine.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+    finally:
+        engine.dispose()
+
+
+def test_async_sqlite_engine_has_a_sized_pool(tmp_path):
+    pytest.importorskip("aiosqlite")
+    engine = database.make_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}")
+
+    async def journal_mode():
+        async with engine.connect() as conn:
+            return (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+
+    try:
+        assert isinstance(engine.pool, AsyncAdaptedQueuePool)
+        assert engine.pool.size() == database.DB_POOL_SIZE
+        assert asyncio.run(journal_mode()) == "wal"
+    finally:
+        asyncio.run(engine.dispose())
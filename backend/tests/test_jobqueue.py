@@ -0,0 +1,51 @@
+import asyncio
+import threading
+
+from app import jobqueue, workers
+from app.database import SessionLocal, Job, create_tables
+
+
+def test_job_timeout_fails_the_job(tmp_path, monkeypatch):
+    # a job that never finishes is stopped after JOB_TIMEOUT_SECONDS and marked as failed, not left processing
+    monkeypatch.chdir(tmp_path)
+    create_tables()
+    monkeypatch.setenv("CONTEXTCLIP_WARMUP_MODELS", "0")
+    monkeypatch.setattr(jobqueue, "JOB_TIMEOUT_SECONDS", 0.5)
+
+    stop_event = threading.Event()
+    cancelled = threading.Event()
+
+    async def never_ending_job(job_id):
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            stop_event.set()
+            raise
+
+    monkeypatch.setattr(workers, "process_job", never_ending_job)
+
+    db = SessionLocal()
+    try:
+        job = Job(status="pending")
+        db.add(job)
+        db.commit()
+        jobqueue.enqueue_job(db, job)
+        job_id = job.id
+    finally:
+        db.close()
+
+    worker = threading.Thread(target=jobqueue.run_worker, args=("test-worker", stop_event))
+    worker.start()
+    worker.join(10)
+    stop_event.set()
+    worker.join()
+
+    assert cancelled.is_set()
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        assert job.status == "error"
+        assert job.claimed_by is None
+    finally:
+        db.close()
@@ -0,0 +1,39 @@
+from concurrent.futures import Future
+
+import pytest
+
+from app import ocr
+
+
+class PendingPool:
+    # stands in for the ocr process pool, nothing ever runs
+    def submit(self, fn, *args):
+        return Future()
+
+
+@pytest.fixture
+def pending_pool(monkeypatch):
+    monkeypatch.setattr(ocr, "_get_pool", lambda: PendingPool())
+    monkeypatch.setattr(ocr.slide_cache, "get_text", lambda key: None)
+    monkeypatch.setattr(ocr, "_prefetched", {})
+
+
+def rendered_page(tmp_path, job_id, page):
+    images_dir = tmp_path / "storage" / job_id / "slides" / "images"
+    images_dir.mkdir(parents=True, exist_ok=True)
+    path = images_dir / f"slide_{page}.png"
+    path.write_bytes(f"{job_id} page {page}".encode())
+    return str(path)
+
+
+def test_job_end_drops_its_unused_prefetches(tmp_path, pending_pool):
+    # job-a rendered two pages and never reached its ocr stage, job-b is still running
+    for page in (1, 2):
+        ocr.prefetch_ocr(rendered_page(tmp_path, "job-a", page))
+    ocr.prefetch_ocr(rendered_page(tmp_path, "job-ab", 1))
+    futures_a = [future for key, future in ocr._prefetched.items() if "/job-a/" in key[0]]
+
+    assert ocr.discard_prefetched(str(tmp_path / "storage" / "job-a")) == 2
+    assert all(future.cancelled() for future in futures_a)
+    # a job whose id starts the same way keeps its pages
+    assert [key[0] for key in ocr._prefetched] == [rendered_page(tmp_path, "job-ab", 1)]
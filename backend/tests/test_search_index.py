@@ -0,0 +1,68 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from app import search_index, semantic_index
+
+
+@pytest.fixture
+def fresh_indexes(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_index, "SEARCH_DB_PATH", str(tmp_path / "search.db"))
+    monkeypatch.setattr(search_index, "_schema_ready", False)
+    monkeypatch.setattr(semantic_index, "VECTOR_INDEX_PATH", str(tmp_path / "vectors.faiss"))
+    return tmp_path
+
+
+def segments(*texts):
+    return [{"kind": "segment", "speaker": "SPEAKER_00", "start": float(i), "end": float(i + 1), "ref": None, "text": text}
+            for i, text in enumerate(texts)]
+
+
+def test_removed_job_ids_are_not_reused(fresh_indexes):
+    search_index.index_job("first", None, segments("budget review", "hiring plan"))
+    first_ids = search_index.document_ids("first")
+    search_index.remove_job("first")
+
+    search_index.index_job("second", None, segments("roadmap", "budget cuts"))
+    second_ids = search_index.document_ids("second")
+
+    assert min(second_ids) > max(first_ids)
+    assert search_index.get_documents(first_ids) == {}
+
+
+def test_remove_job_drops_its_vectors(fresh_indexes):
+    pytest.importorskip("faiss")
+    rng = np.random.default_rng(0)
+    for job_id in ("first", "second"):
+        search_index.index_job(job_id, None, segments("a", "b", "c"))
+        ids = search_index.document_ids(job_id, kind="segment")
+        semantic_index.update_job([], ids, rng.standard_normal((len(ids), 8)).astype(np.float32))
+
+    search_index.remove_job("first")
+
+    import faiss
+    index = faiss.read_index(semantic_index.VECTOR_INDEX_PATH)
+    assert index.ntotal == 3
+    remaining = set(faiss.vector_to_array(index.id_map).tolist())
+    assert remaining == set(search_index.document_ids("second"))
+
+
+def test_old_documents_table_is_migrated(fresh_indexes):
+    # a search db from before the ids were autoincrement, its rows (and their fts entries) are kept
+    conn = sqlite3.connect(search_index.SEARCH_DB_PATH)
+    conn.executescript(search_index.SCHEMA.replace("INTEGER PRIMARY KEY AUTOINCREMENT", "INTEGER PRIMARY KEY"))
+    conn.execute("INSERT INTO documents (job_id, kind, text) VALUES ('old', 'segment', 'quarterly budget')")
+    conn.commit()
+    conn.close()
+
+    conn = search_index.connect()
+    try:
+        sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'documents'").fetchone()["sql"]
+        assert "AUTOINCREMENT" in sql
+    finally:
+        conn.close()
+
+    assert [row["job_id"] for row in search_index.search_documents('"budget"*', 10)] == ["old"]
+    search_index.index_job("new", None, segments("budget again"))
+    assert {row["job_id"] for row in search_index.search_documents('"budget"*', 10)} == {"old", "new"}
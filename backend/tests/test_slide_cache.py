@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from app import slide_cache
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(slide_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(slide_cache, "CACHE_ENABLED", True)
+    return tmp_path
+
+
+def write_image(path, size):
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG" + b"\0" * (size - 4))
+
+
+def test_trim_leaves_images_linked_into_jobs(cache_dir):
+    # two 1MB pages a job links to and one the cache alone holds, the limit is 1.5MB
+    job_dir = cache_dir / "job"
+    job_dir.mkdir()
+    for page in range(2):
+        write_image(job_dir / f"slide_{page}.png", 1024 * 1024)
+        slide_cache.put_image(f"page-{page}", str(job_dir / f"slide_{page}.png"))
+    orphan = cache_dir / "orphan.png"
+    write_image(orphan, 1024 * 1024)
+    slide_cache.put_image("orphan", str(orphan))
+    os.remove(orphan)
+
+    slide_cache.trim(max_mb=1.5)
+
+    # only the cache's own 1MB counted, nothing to evict
+    assert slide_cache.has_image("page-0") and slide_cache.has_image("page-1") and slide_cache.has_image("orphan")
+
+    # the job is deleted, its pages are the cache's alone now
+    for page in range(2):
+        os.remove(job_dir / f"slide_{page}.png")
+    os.utime(slide_cache._entry_path("images", "orphan", ".png"), (0, 0))
+    slide_cache.trim(max_mb=1.5)
+
+    assert not slide_cache.has_image("orphan")
+    assert sum(slide_cache.has_image(f"page-{page}") for page in range(2)) == 1
@@ -0,0 +1,98 @@
+import types
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("transformers")
+
+from app import summarize  # noqa: E402
+
+
+class FakeOpenAI:
+    # records which key every completion was made with
+    calls = []
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        FakeOpenAI.calls.append(self.api_key)
+        message = types.SimpleNamespace(content='{"meeting_summary": ["ok"], "action_items": []}')
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    module = types.SimpleNamespace(OpenAI=FakeOpenAI)
+    monkeypatch.setattr(summarize, "openai", module, raising=False)
+    monkeypatch.setattr(summarize, "OPEAI_AVAILABLE", True)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    FakeOpenAI.calls = []
+    return module
+
+
+def test_request_keys_stay_with_their_request(fake_openai):
+    summarizer = summarize.MeetingSummarizer(model_type="openai", open_ai_key="server-key")
+
+    summarizer._generate_with_openai("prompt", open_ai_key="key-of-a")
+    summarizer._generate_with_openai("prompt")
+    summarizer._generate_with_openai("prompt", open_ai_key="key-of-b")
+
+    assert FakeOpenAI.calls == ["key-of-a", "server-key", "key-of-b"]
+    # nothing was left on the module for the next request
+    assert not hasattr(fake_openai, "api_key")
+
+
+def test_no_key_falls_back_to_mock_summary(fake_openai):
+    summarizer = summarize.MeetingSummarizer(model_type="openai")
+    response = summarizer._generate_with_openai("[0:01] SPEAKER_00: We agreed to ship the release on Friday.")
+    assert FakeOpenAI.calls == []
+    assert "ship the release" in response
+
+
+class FakeBart:
+    # summarization pipeline that remembers the length limits of every call
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, max_length, min_length, **kwargs):
+        self.calls.append((len(texts), max_length, min_length))
+        return [{"summary_text": "The team reviewed the budget and agreed on the next steps."} for _ in texts]
+
+
+def bart_summarizer():
+    summarizer = summarize.MeetingSummarizer.__new__(summarize.MeetingSummarizer)
+    summarizer.model_type = "huggingface"
+    summarizer.model_type_pipeline = "summarization"
+    summarizer.generator = FakeBart()
+    return summarizer
+
+
+def meeting(sentences):
+    return pd.DataFrame({
+        "start": [float(i) for i in range(len(sentences))],
+        "end": [float(i + 1) for i in range(len(sentences))],
+        "speaker": ["SPEAKER_00"] * len(sentences),
+        "text": sentences
+    })
+
+
+def test_single_window_gets_one_full_length_pass():
+    summarizer = bart_summarizer()
+    summarizer._summarize_map_reduce_bart([meeting(["We went through the quarterly budget in detail."] * 60)])
+
+    # no short map summary, straight to the final length (50-80% of the input, capped at 400-600)
+    assert len(summarizer.generator.calls) == 1
+    _, max_length, min_length = summarizer.generator.calls[0]
+    assert min_length >= 50 and max_length > summarize.MAP_SUMMARY_TOKENS
+
+
+def test_several_windows_are_mapped_then_summarized():
+    summarizer = bart_summarizer()
+    window = meeting(["We went through the quarterly budget in detail."] * 60)
+    summarizer._summarize_map_reduce_bart([window, window])
+
+    (map_count, map_max, _), (final_count, _, final_min) = summarizer.generator.calls
+    assert map_count == 2 and map_max <= summarize.MAP_SUMMARY_TOKENS
+    assert final_count == 1 and final_min >= 50
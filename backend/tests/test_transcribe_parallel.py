@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from app.transcribe_parallel import find_chunk_boundaries
+
+
+SAMPLE_RATE = 16000
+
+
+def speech_with_pauses(seconds: float, pause_every: float, pause_seconds: float = 0.5) -> np.ndarray:
+    # noise ("speech") with a silent gap every pause_every seconds
+    rng = np.random.default_rng(0)
+    samples = (rng.standard_normal(int(seconds * SAMPLE_RATE)) * 8000).astype(np.int16)
+    for start in np.arange(pause_every, seconds, pause_every):
+        samples[int(start * SAMPLE_RATE):int((start + pause_seconds) * SAMPLE_RATE)] = 0
+    return samples
+
+
+def test_short_target_cuts_forward_in_pauses():
+    # target far below the default 30s search window: the window shrinks to a quarter of the target
+    samples = speech_with_pauses(60, pause_every=4)
+    bounds = find_chunk_boundaries(samples, target_seconds=4, sample_rate=SAMPLE_RATE)
+
+    assert bounds[0][0] == 0 and bounds[-1][1] == len(samples)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(bounds, bounds[1:]))
+    assert all(end > start for start, end in bounds)
+    for start, end in bounds[:-1]:
+        assert 3 * SAMPLE_RATE <= end - start <= 5 * SAMPLE_RATE
+        # cut inside a pause
+        assert not samples[end:end + 160].any()
+
+
+def test_tiny_target_terminates():
+    samples = speech_with_pauses(5, pause_every=1)
+    bounds = find_chunk_boundaries(samples, target_seconds=0.01, sample_rate=SAMPLE_RATE)
+    assert bounds[-1][1] == len(samples)
+    assert all(end > start for start, end in bounds)
+
+
+def test_rejects_non_positive_target():
+    with pytest.raises(ValueError):
+        find_chunk_boundaries(speech_with_pauses(10, pause_every=2), target_seconds=0, sample_rate=SAMPLE_RATE)
@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+from app import uploads
+
+
+@pytest.mark.parametrize("client_name", [".upload.json", "../.upload.json", ".upload.json.tmp", "dir/.upload.json"])
+def test_reserved_filename_does_not_replace_the_state(tmp_path, client_name):
+    media_dir = str(tmp_path / "media")
+    state = uploads.init_upload(media_dir, client_name, 10)
+
+    assert state["filename"].startswith("media")
+    assert os.path.basename(state["media_path"]) == state["filename"]
+    # the state is still readable json and the media file has its own size
+    assert uploads.load_upload_state(media_dir) == state
+    assert os.path.getsize(state["media_path"]) == 10
+
+
+@pytest.mark.parametrize("client_name, expected", [("talk.mp4", "talk.mp4"), ("a/b/talk.mp4", "talk.mp4"), ("", "media"), ("..", "media")])
+def test_media_filename(client_name, expected):
+    assert uploads.media_filename(client_name) == expected
+
+
+def test_parallel_parts_keep_every_range(tmp_path):
+    # every part records its range at the same time, none may be lost
+    from concurrent.futures import ThreadPoolExecutor
+
+    media_dir = str(tmp_path / "media")
+    part_size, parts = 10, 200
+    uploads.init_upload(media_dir, "talk.mp4", part_size * parts)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: uploads.record_received_range(media_dir, i * part_size, (i + 1) * part_size), range(parts)))
+
+    state = uploads.load_upload_state(media_dir)
+    assert state["received"] == [[0, part_size * parts]]
+    assert uploads.is_complete(state)
+
+    uploads.finish_upload(media_dir)
+    assert os.listdir(media_dir) == ["talk.mp4"]
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from app import workers
+from app.database import SessionLocal, Job, create_tables
+
+
+@pytest.fixture
+def job_factory(tmp_path, monkeypatch):
+    # jobs with a media file and nothing else, storage/ lives in tmp_path
+    monkeypatch.chdir(tmp_path)
+    create_tables()
+
+    def make_job() -> str:
+        db = SessionLocal()
+        try:
+            job = Job(status="processing")
+            db.add(job)
+            db.commit()
+            media_dir = tmp_path / "storage" / job.id / "media"
+            media_dir.mkdir(parents=True)
+            media_path = media_dir / "meeting.wav"
+            media_path.write_bytes(b"not really audio")
+            job.media_path = str(media_path.relative_to(tmp_path))
+            db.commit()
+            return job.id
+        finally:
+            db.close()
+
+    return make_job
+
+
+def job_status(job_id: str) -> str:
+    db = SessionLocal()
+    try:
+        return db.get(Job, job_id).status
+    finally:
+        db.close()
+
+
+def test_cancelled_job_does_not_block_next_job(job_factory, monkeypatch):
+    # the first job is stuck in transcription (think whisper on a long recording) when it is cancelled,
+    # the thread cant be stopped, but the next job must not wait for it
+    release = threading.Event()
+    stuck = threading.Event()
+
+    def fake_transcription(audio_path, job_id, transcript_path):
+        if job_id == stuck_job:
+            stuck.set()
+            release.wait(30)
+        with open(transcript_path, "w") as f:
+            json.dump({"segments": [{"start": 0.0, "end": 1.0, "speaker": "SPEAKER_00", "text": "hello"}]}, f)
+
+    async def fake_preprocess(input_path, job_id, on_progress=None):
+        return input_path
+
+    monkeypatch.setattr(workers, "run_transcription", fake_transcription)
+    monkeypatch.setattr(workers, "preprocess_audio", fake_preprocess)
+    monkeypatch.setattr(workers.semantic_index, "is_available", lambda: False)
+    monkeypatch.setattr(workers, "index_job_for_search", lambda *args: None)
+
+    stuck_job = job_factory()
+    next_job = job_factory()
+
+    try:
+        # like run_worker: a loop per job, cancelled from outside once the stage is running
+        loop = asyncio.new_event_loop()
+        task = loop.create_task(workers.process_job(stuck_job))
+        loop.run_until_complete(asyncio.wait([task], timeout=0.1))
+        assert loop.run_until_complete(loop.run_in_executor(None, stuck.wait, 10))
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            loop.run_until_complete(task)
+        loop.close()
+
+        started = time.monotonic()
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(asyncio.wait_for(workers.process_job(next_job), timeout=10))
+        loop.close()
+
+        assert job_status(next_job) == "done"
+        assert time.monotonic() - started < 10
+        # the cancelled jobs transcription is still running when the next job finished
+        assert not release.is_set()
+    finally:
+        release.set()
@@ -28,6 +28,8 @@ interface JobStatus {
   job_id: string;
   status: 'queued' | 'processing' | 'completed' | 'failed';
   message?: string;
+  stage?: string | null;
+  progress?: number;
 }
 
 const Upload = () => {
@@ -72,33 +74,34 @@ const Upload = () => {
     e.preventDefault();
     setDragActive(false);
   };
-  const pollJobStatus = async (jobId: string) => {
+  const pollJobStatus = (jobId: string) => {
+    // one server-sent event stream per job instead of polling GET /job/{id}
     setPolling(true);
-    const pollInterval = setInterval(async () => {
-      try {
-        const response = await fetch(`http://localhost:8000/job/${jobId}`);
-        if (response.ok) {
-          const jobData = await response.json();
-          setJobStatus(jobData);
-          if (jobData.status === 'completed') {
-            clearInterval(pollInterval);
-            setPolling(false);
-            setTimeout(() => {
-              router.push(`/results/${jobId}`);
-            }, 2000);
-          } else if (jobData.status === 'failed') {
-            clearInterval(pollInterval);
-            setPolling(false);
-          }
-        }
-      } catch (error) {
-        console.error('Error polling job status:', error);
+    const events = new EventSource(`http://localhost:8000/job/${jobId}/events`);
+    const onEvent = (e: MessageEvent) => {
+      const data = JSON.parse(e.data);
+      setJobStatus(prev => ({ ...(prev ?? { job_id: jobId, status: 'queued' }), ...data }));
+      if (e.type !== 'status') return;
+      if (data.status === 'done' || data.status === 'completed') {
+        events.close();
+        setPolling(false);
+        setTimeout(() => {
+          router.push(`/results/${jobId}`);
+        }, 2000);
+      } else if (['error', 'failed', 'cancelled'].includes(data.status)) {
+        events.close();
+        setPolling(false);
       }
-    }, 2000);
-    setTimeout(() => {
-      clearInterval(pollInterval);
-      setPolling(false);
-    }, 300000);
+    };
+    for (const type of ['status', 'stage', 'progress']) {
+      events.addEventListener(type, onEvent as EventListener);
+    }
+    // EventSource reconnects on its own after network errors, the stream starts with the current status again
+    events.onerror = () => {
+      if (events.readyState === EventSource.CLOSED) {
+        setPolling(false);
+      }
+    };
   };
   const handleUpload = async () => {
     if (!files.media) {